@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timedelta
+
+# Content-addressed backups:
+#   backups/objects/ab/abcdef...   one blob per unique file content (sha256)
+#   backups/manifests/<ts>.json    which blob each data file had at that moment
+#   backups/LATEST                 name of the newest manifest
+
+# (bucket size, how far back) pairs: keep the newest snapshot in each hour for
+# a day, then the newest in each day for a month.
+RETENTION = (
+    (timedelta(hours=1), timedelta(days=1)),
+    (timedelta(days=1), timedelta(days=30)),
+)
+KEEP_LAST = 5
+
+_TS_FORMAT = "%Y%m%d_%H%M%S_%f"
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _objects_dir(backup_dir: str) -> str:
+    return os.path.join(backup_dir, "objects")
+
+
+def _manifests_dir(backup_dir: str) -> str:
+    return os.path.join(backup_dir, "manifests")
+
+
+def _blob_path(backup_dir: str, digest: str) -> str:
+    return os.path.join(_objects_dir(backup_dir), digest[:2], digest)
+
+
+def _hash_file(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def read_manifest(backup_dir: str, name: str | None = None) -> dict | None:
+    if name is None:
+        latest = os.path.join(backup_dir, "LATEST")
+        if not os.path.exists(latest):
+            return None
+        with open(latest, "r", encoding="utf-8") as f:
+            name = f.read().strip()
+    path = os.path.join(_manifests_dir(backup_dir), name)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_atomic(path: str, text: str) -> None:
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(path + ".tmp", path)
+
+
+def snapshot(data_dir: str, backup_dir: str, fnames: list[str], changed: list[str] | None = None) -> list[str]:
+    """Record the current data files as a new manifest; returns the paths created.
+
+    Only ``fnames`` (paths relative to ``data_dir``) are examined; entries of
+    the previous manifest for other files are carried over as they are.
+    Examined files whose size and mtime match the previous manifest are not
+    read again unless listed in ``changed``.
+    """
+    os.makedirs(_manifests_dir(backup_dir), exist_ok=True)
+    prev = read_manifest(backup_dir) or {"files": {}}
+    files: dict = {k: v for k, v in prev["files"].items() if k not in fnames}
+    created: list[str] = []
+
+    for fname in fnames:
+        src = os.path.join(data_dir, fname)
+        if not os.path.exists(src):
+            continue
+        st = os.stat(src)
+        old = prev["files"].get(fname)
+        if old and old["size"] == st.st_size and old["mtime_ns"] == st.st_mtime_ns and (changed is None or fname not in changed):
+            files[fname] = old
+            continue
+        digest = _hash_file(src)
+        blob = _blob_path(backup_dir, digest)
+        if not os.path.exists(blob):
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            shutil.copyfile(src, blob + ".tmp")
+            os.replace(blob + ".tmp", blob)
+            created.append(blob)
+        files[fname] = {"hash": digest, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+    if not files or {k: v["hash"] for k, v in files.items()} == {k: v["hash"] for k, v in prev["files"].items()}:
+        return created
+
+    now = datetime.now()
+    name = now.strftime(_TS_FORMAT) + ".json"
+    manifest_path = os.path.join(_manifests_dir(backup_dir), name)
+    _write_atomic(manifest_path, json.dumps({"created": now.isoformat(), "files": files}, indent=2))
+    _write_atomic(os.path.join(backup_dir, "LATEST"), name)
+    created.append(manifest_path)
+
+    prune(backup_dir, now=now)
+    return created
+
+
+def restore(backup_dir: str, data_dir: str, name: str | None = None) -> list[str]:
+    manifest = read_manifest(backup_dir, name)
+    if not manifest:
+        return []
+    restored = []
+    for fname, entry in manifest["files"].items():
+        dst = os.path.join(data_dir, fname)
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        shutil.copyfile(_blob_path(backup_dir, entry["hash"]), dst + ".tmp")
+        os.replace(dst + ".tmp", dst)
+        restored.append(fname)
+    return restored
+
+
+def prune(backup_dir: str, retention=RETENTION, keep_last: int = KEEP_LAST, now: datetime | None = None) -> list[str]:
+    """Drop manifests outside the retention policy, then unreferenced blobs."""
+    now = now or datetime.now()
+    mdir = _manifests_dir(backup_dir)
+    names = sorted((n for n in os.listdir(mdir) if n.endswith(".json")), reverse=True)
+
+    keep = set(names[:keep_last])
+    for bucket, horizon in retention:
+        seen = set()
+        for n in names:
+            created = datetime.strptime(n[:-5], _TS_FORMAT)
+            if now - created > horizon:
+                break
+            slot = (created - _EPOCH) // bucket  # local wall-clock buckets
+            if slot not in seen:
+                seen.add(slot)
+                keep.add(n)
+
+    removed = [n for n in names if n not in keep]
+    if not removed:
+        return []
+    for n in removed:
+        os.remove(os.path.join(mdir, n))
+
+    live = set()
+    for n in keep:
+        live.update(e["hash"] for e in read_manifest(backup_dir, n)["files"].values())
+    odir = _objects_dir(backup_dir)
+    for sub in os.listdir(odir):
+        for digest in os.listdir(os.path.join(odir, sub)):
+            if digest not in live:
+                os.remove(os.path.join(odir, sub, digest))
+    return removed
@@ -0,0 +1,201 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+import cache
+import main as app
+import synthetic
+from storage import load_state, save_state, backup_state, close_state, migrate_to_sharded, STORAGE_MODES
+from workouts import log_workout, weekly_workout_summary, personal_records, detect_and_flag_prs, acute_chronic_ratio
+from nutrition import daily_calorie_summary, macro_breakdown
+from metrics import metrics_summary, goal_progress, metric_history, moving_average
+
+# Times the storage paths and every summary against synthetic data and prints
+# JSON. Feed an earlier run to --compare to flag regressions:
+#
+#   python benchmark.py --sizes 1e3,1e5 --out before.json
+#   python benchmark.py --sizes 1e3,1e5 --compare before.json
+
+DEFAULT_SIZES = "1e3,1e4,1e5"
+REGRESSION_THRESHOLD = 1.25  # median slower than this factor counts
+
+
+def _time(fn, repeat: int) -> dict:
+    runs = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        runs.append(time.perf_counter() - t0)
+    return {"first": runs[0], "min": min(runs), "median": statistics.median(runs), "runs": len(runs)}
+
+
+def _quiet(fn):
+    def run():
+        with contextlib.redirect_stdout(io.StringIO()):
+            fn()
+    return run
+
+
+# Run in a fresh interpreter so the imports are really cold; prints the
+# seconds spent importing main and then in main.open_state.
+_STARTUP_SCRIPT = """
+import json, sys, time
+t0 = time.perf_counter()
+import main
+t1 = time.perf_counter()
+main.BASE_DIR, main.STORAGE_MODE, main.WARM_START = sys.argv[1], sys.argv[2], sys.argv[3] == "1"
+main.open_state()
+print(json.dumps([t1 - t0, time.perf_counter() - t1]))
+"""
+
+
+def _startup(base: str, mode: str, warm: bool, repeat: int) -> dict:
+    """import_main and open_state timings of a fresh process, shaped like _time's."""
+    here = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", _STARTUP_SCRIPT, base, mode, "1" if warm else "0"],
+                             cwd=here, capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(out))
+    return {
+        part: {"first": times[0], "min": min(times), "median": statistics.median(times), "runs": len(times)}
+        for part, times in (("import_main", [r[0] for r in runs]), ("open_state", [r[1] for r in runs]))
+    }
+
+
+def bench_size(size: int, repeat: int, mode: str = "json", end: str = "2025-01-01") -> list[dict]:
+    plain = synthetic.generate_records(size, end=end)
+    n_records = sum(len(c) for c in plain[1:])
+    results = []
+
+    def record(op: str, fn=None, times: int = repeat, seconds: dict | None = None) -> None:
+        results.append({"size": size, "records": n_records, "op": op, "seconds": seconds or _time(fn, times)})
+
+    # Summaries are timed doing the work; the *_cached op shows a cache hit.
+    was_enabled = cache.cache_info()["enabled"]
+    cache.set_enabled(False)
+    try:
+        _bench_collections(plain, mode, end, record, repeat)
+    finally:
+        cache.set_enabled(was_enabled)
+    return results
+
+
+def _bench_collections(plain: tuple, mode: str, end: str, record, repeat: int) -> None:
+    with tempfile.TemporaryDirectory() as base:
+        # Plain lists always count as changed, so this is a full JSON write.
+        record("save_state", lambda: save_state(base, *plain))
+        record("backup_state", lambda: backup_state(base, os.path.join(base, "backups")))
+        if mode == "sharded":
+            migrate_to_sharded(base)  # the other modes take the JSON files over on their first load
+        record("load_state", lambda: close_state(*load_state(base, mode)))
+        cold = _startup(base, mode, False, repeat)
+        load_state(base, mode, warm_start=True)  # writes the warm-start cache
+        warm = _startup(base, mode, True, repeat)
+        record("startup_import", seconds=cold["import_main"])
+        record("startup_cold", seconds=cold["open_state"])
+        record("startup_warm", seconds=warm["open_state"])
+        users, workouts, meals, metrics = load_state(base, mode)
+        uid = users[0]["id"]
+        if mode == "sharded":
+            app.load_user_shard(base, uid, workouts, meals, metrics)
+        if not workouts:
+            raise RuntimeError(f"No workouts loaded in {mode} mode; the summaries would time empty lists.")
+
+        def save_one_change() -> None:
+            log_workout(workouts, {"user_id": uid, "date": end, "type": "cardio", "duration_min": 20, "exercises": []})
+            save_state(base, users, workouts, meals, metrics, mode)
+
+        record("save_state_one_change", save_one_change)
+
+        last = date.fromisoformat(end)
+        week = (last - timedelta(days=last.weekday())).isoformat()
+        month = ((last - timedelta(days=30)).isoformat(), end)
+        user_ws = [w for w in workouts if w.get("user_id") == uid]
+        probe = next((w for w in reversed(user_ws) if w.get("type") == "strength"), user_ws[-1])
+        weights = [e["value"] for e in metrics if e.get("user_id") == uid and e.get("type") == "weight_kg"]
+
+        record("weekly_workout_summary", lambda: weekly_workout_summary(workouts, uid, week))
+        record("acute_chronic_ratio", lambda: acute_chronic_ratio(workouts, uid, end))
+        record("personal_records", lambda: personal_records(workouts, uid))
+        record("detect_and_flag_prs", lambda: detect_and_flag_prs(workouts, uid, probe))
+        record("daily_calorie_summary", lambda: daily_calorie_summary(meals, uid, end))
+        record("macro_breakdown", lambda: macro_breakdown(meals, uid, month))
+        record("metrics_summary", lambda: metrics_summary(metrics, uid, "weight_kg", month))
+        record("goal_progress", lambda: goal_progress(users, metrics, uid))
+        record("metric_history", lambda: metric_history(metrics, uid, "weight_kg", last=21))
+        record("moving_average", lambda: moving_average(weights, 7))
+        record("dashboard", _quiet(lambda: app.dashboard(users[0], users, workouts, meals, metrics)))
+        cache.set_enabled(True)
+        record("metrics_summary_cached", lambda: metrics_summary(metrics, uid, "weight_kg", month))
+        cache.set_enabled(False)
+        close_state(users, workouts, meals, metrics)
+
+
+def compare(current: dict, baseline: dict, threshold: float = REGRESSION_THRESHOLD) -> list[dict]:
+    before = {(r["size"], r["op"]): r["seconds"]["median"] for r in baseline["results"]}
+    out = []
+    for r in current["results"]:
+        old = before.get((r["size"], r["op"]))
+        if old:
+            ratio = r["seconds"]["median"] / old
+            if ratio > threshold:
+                out.append({"size": r["size"], "op": r["op"], "before": old, "after": r["seconds"]["median"], "ratio": round(ratio, 2)})
+    return out
+
+
+def run(sizes: list[int], repeat: int = 5, mode: str = "json") -> dict:
+    results = []
+    for size in sizes:
+        results += bench_size(size, repeat, mode)
+    return {
+        "meta": {
+            "created": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "mode": mode,
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark storage and summary functions on synthetic data.")
+    parser.add_argument("--sizes", default=DEFAULT_SIZES, help="comma-separated record counts, e.g. 1e3,1e6")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--mode", choices=STORAGE_MODES, default="json")
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    parser.add_argument("--compare", help="earlier JSON report; exit 1 if anything got slower")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    report = run([int(float(s)) for s in args.sizes.split(",")], args.repeat, args.mode)
+    regressions = []
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        report["regressions"] = regressions
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
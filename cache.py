@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+import itertools
+import os
+from collections import OrderedDict
+from datetime import date
+from functools import wraps
+
+from records import TrackedList
+
+# Memoizes the summary functions. A result is keyed on the function, its
+# arguments and, for each collection it reads, a version counter for the
+# user the call is about; every emit() touching that user's records bumps
+# it, so nothing stale is ever returned. Plain lists are never cached since
+# nobody tells us when they change. Results are shared between hits, the
+# way functools.lru_cache shares them, so callers must not mutate them.
+#
+# FITNESS_CACHE=0 (or set_enabled(False)) turns caching off.
+CACHE_SIZE = 1024
+
+_enabled = os.environ.get("FITNESS_CACHE", "1") != "0"
+_entries: OrderedDict = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "uncached": 0}
+_epochs = itertools.count()
+
+
+class Versions:
+    """Per-user change counters for one collection, kept current by emit().
+
+    Lives in the collection's ``indexes``, so a bulk change that drops the
+    indexes also drops every counter; the replacement gets a fresh epoch and
+    old cache keys can never match again.
+    """
+
+    def __init__(self, owner_field: str):
+        self.epoch = next(_epochs)
+        self._field = owner_field
+        self._counts: dict = {}
+        self._owner: dict = {}  # record id -> user it was filed under
+
+    def build(self, items) -> Versions:
+        for r in items:
+            self._owner[r.get("id")] = r.get(self._field)
+        return self
+
+    def update(self, op: str, record: dict) -> None:
+        rid = record.get("id")
+        # An update can move a record to another user; both have changed.
+        for uid in {self._owner.pop(rid, None), record.get(self._field)}:
+            self._counts[uid] = self._counts.get(uid, 0) + 1
+        if op != "del":
+            self._owner[rid] = record.get(self._field)
+
+    def version(self, user_id) -> tuple[int, int]:
+        return self.epoch, self._counts.get(user_id, 0)
+
+
+def versions(items: TrackedList) -> Versions:
+    ix = items.indexes.get("versions")
+    if ix is None:
+        ix = items.indexes["versions"] = Versions("id" if items.name == "users" else "user_id").build(items)
+    return ix
+
+
+def cached(n_collections: int = 1, daily: bool = False):
+    """Cache a summary whose first ``n_collections`` arguments are the
+    collections it reads, followed by ``user_id``. ``daily`` adds today's
+    date to the key, for functions that default to "up to today"."""
+
+    def wrap(fn):
+        @wraps(fn)
+        def call(*args, **kwargs):
+            colls = args[:n_collections]
+            if not _enabled or len(colls) < n_collections or not all(isinstance(c, TrackedList) for c in colls):
+                _stats["uncached"] += 1
+                return fn(*args, **kwargs)
+            user_id = args[n_collections] if len(args) > n_collections else kwargs.get("user_id")
+            key = (
+                fn,
+                tuple(versions(c).version(user_id) for c in colls),
+                args[n_collections:],
+                tuple(sorted(kwargs.items())) if kwargs else (),
+                date.today() if daily else None,
+            )
+            try:
+                out = _entries[key]
+            except KeyError:
+                pass
+            except TypeError:  # unhashable argument
+                _stats["uncached"] += 1
+                return fn(*args, **kwargs)
+            else:
+                _entries.move_to_end(key)
+                _stats["hits"] += 1
+                return out
+
+            _stats["misses"] += 1
+            out = _entries[key] = fn(*args, **kwargs)
+            if len(_entries) > CACHE_SIZE:
+                _entries.popitem(last=False)
+                _stats["evictions"] += 1
+            return out
+
+        call.uncached = fn
+        return call
+
+    return wrap
+
+
+def set_enabled(flag: bool) -> None:
+    global _enabled
+    _enabled = bool(flag)
+    if not _enabled:
+        _entries.clear()
+
+
+def cache_clear() -> None:
+    _entries.clear()
+    for k in _stats:
+        _stats[k] = 0
+
+
+def cache_info() -> dict:
+    return {**_stats, "size": len(_entries), "maxsize": CACHE_SIZE, "enabled": _enabled}
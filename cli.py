@@ -0,0 +1,331 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shlex
+import sys
+from datetime import date, datetime, timedelta
+
+import instrument
+from records import find_record, is_dirty
+from storage import (
+    STORAGE_MODES,
+    load_state,
+    save_state,
+    load_user_shard,
+    validate_workout_entry,
+    validate_meal_entry,
+    validate_metric_entry,
+    prevent_duplicate,
+    UNIQUE_KEYS,
+)
+from workouts import (
+    log_workout,
+    detect_and_flag_prs,
+    weekly_workout_summary,
+    monthly_workout_summary,
+    workout_range_summary,
+    personal_records,
+    exercise_records,
+)
+from nutrition import log_meal, macro_breakdown
+from metrics import log_metric, goal_progress
+
+# Non-interactive front end: `python main.py <command> ...` (or cli.py).
+# Every command prints JSON. `batch` runs many commands from a file or stdin
+# against one load_state and one save_state:
+#
+#   python main.py log-metric --user a@b.c --type weight_kg --value 81.5
+#   python main.py summary weekly --user a@b.c --week-start 2025-01-06
+#   python main.py batch ops.jsonl
+#
+# A batch line is a JSON object ({"op": "log-meal", "user": "a@b.c",
+# "json": {...}}; "op" may carry a sub-command, e.g. "summary weekly"),
+# a JSON array of arguments, or a shell-style command line.
+
+DEFAULT_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+COLLECTION_ARGS = {"workouts": "workouts", "nutrition": "meals", "metrics": "metrics"}
+# action="append" options; a batch line may give a JSON list for these.
+REPEATABLE = ("exercise", "item")
+
+
+class _State:
+    def __init__(self, base_dir: str, mode: str):
+        self.base_dir, self.mode = base_dir, mode
+        self.users, self.workouts, self.meals, self.metrics = load_state(base_dir, mode)
+        self._by_email = None
+
+    def user(self, ref: str) -> dict:
+        u = find_record(self.users, ref)
+        if u is None:
+            if self._by_email is None:
+                self._by_email = {x.get("email"): x for x in self.users}
+            u = self._by_email.get((ref or "").strip().lower())
+        if u is None:
+            raise ValueError(f"User not found: {ref}")
+        load_user_shard(self.base_dir, u["id"], self.workouts, self.meals, self.metrics)
+        return u
+
+    def dirty(self) -> bool:
+        return any(is_dirty(c) for c in (self.users, self.workouts, self.meals, self.metrics))
+
+
+def _entry(args, fields: dict) -> dict:
+    entry = {k: v for k, v in fields.items() if v is not None}
+    if args.json:
+        entry.update(json.loads(args.json) if isinstance(args.json, str) else args.json)
+    return entry
+
+
+def _json_arg(s: str):
+    try:
+        return json.loads(s)
+    except ValueError as exc:
+        raise argparse.ArgumentTypeError(f"not valid JSON: {s}") from exc
+
+
+def _item(s: str) -> dict:
+    if s.startswith("{"):
+        return _json_arg(s)
+    name, _, grams = s.rpartition(":")
+    try:
+        return {"name": name, "grams": float(grams)} if name else {"name": s}
+    except ValueError:
+        return {"name": s}
+
+
+def cmd_log_workout(st: _State, args) -> dict:
+    user = st.user(args.user)
+    entry = _entry(args, {
+        "date": args.date, "type": args.type, "duration_min": args.duration,
+        "exercises": args.exercise or [], "notes": args.notes or "", "allow_future": args.allow_future,
+    })
+    entry["user_id"] = user["id"]
+    if not validate_workout_entry({"id": "tmp", **entry}):
+        raise ValueError("Invalid workout entry.")
+    if prevent_duplicate(st.workouts, UNIQUE_KEYS["workouts"], entry):
+        raise ValueError("Duplicate workout (same date & type).")
+    w = log_workout(st.workouts, entry)
+    detect_and_flag_prs(st.workouts, user["id"], w)
+    return w
+
+
+def cmd_log_meal(st: _State, args) -> dict:
+    user = st.user(args.user)
+    macros = {"protein_g": args.protein, "carbs_g": args.carbs, "fat_g": args.fat}
+    entry = _entry(args, {
+        "timestamp": args.timestamp, "meal_type": args.meal_type, "items": args.item or [],
+        "calories": args.calories, "macros": macros, "allow_future": args.allow_future,
+    })
+    entry["user_id"] = user["id"]
+    if not validate_meal_entry({"id": "tmp", **entry}):
+        raise ValueError("Invalid meal entry.")
+    if prevent_duplicate(st.meals, UNIQUE_KEYS["nutrition"], entry):
+        raise ValueError("Duplicate meal (same timestamp & type).")
+    return log_meal(st.meals, entry)
+
+
+def cmd_log_metric(st: _State, args) -> dict:
+    user = st.user(args.user)
+    entry = _entry(args, {"date": args.date, "type": args.type, "value": args.value, "allow_future": args.allow_future})
+    entry["user_id"] = user["id"]
+    if entry.get("type") == "mood" and isinstance(entry.get("value"), (int, float)):
+        entry["value"] = max(1, min(10, entry["value"]))
+    if not validate_metric_entry({"id": "tmp", **entry}):
+        raise ValueError("Invalid metric entry.")
+    if prevent_duplicate(st.metrics, UNIQUE_KEYS["metrics"], entry):
+        raise ValueError("Duplicate metric (same date & type).")
+    return log_metric(st.metrics, entry)
+
+
+def cmd_summary(st: _State, args) -> dict:
+    uid = st.user(args.user)["id"]
+    if args.kind == "weekly":
+        today = date.today()
+        start = args.week_start or (today - timedelta(days=today.weekday())).isoformat()
+        return weekly_workout_summary(st.workouts, uid, start)
+    if args.kind == "monthly":
+        return monthly_workout_summary(st.workouts, uid, args.month or date.today().strftime("%Y-%m"))
+    if not (args.start and args.end):
+        raise ValueError("summary range needs --start and --end.")
+    return workout_range_summary(st.workouts, uid, (args.start, args.end))
+
+
+def cmd_prs(st: _State, args) -> dict:
+    uid = st.user(args.user)["id"]
+    return exercise_records(st.workouts, uid) if args.per_exercise else personal_records(st.workouts, uid)
+
+
+def cmd_macros(st: _State, args) -> dict:
+    return macro_breakdown(st.meals, st.user(args.user)["id"], (args.start, args.end))
+
+
+def cmd_goal_progress(st: _State, args) -> dict:
+    return goal_progress(st.users, st.metrics, st.user(args.user)["id"])
+
+
+def cmd_export(st: _State, args) -> dict:
+    uid = st.user(args.user)["id"]
+    out = {}
+    for key in args.collections.split(","):
+        if key not in COLLECTION_ARGS:
+            raise ValueError(f"Unknown collection: {key}")
+        out[key] = [r for r in getattr(st, COLLECTION_ARGS[key]) if r.get("user_id") == uid]
+    return out
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="main.py", description="Batch interface to the fitness tracker; prints JSON.")
+    parser.add_argument("--base-dir", default=DEFAULT_BASE_DIR)
+    parser.add_argument("--mode", choices=STORAGE_MODES, default=os.environ.get("FITNESS_STORAGE", "json"))
+    parser.add_argument("--dry-run", action="store_true", help="run everything but do not save")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="run under cProfile and save the stats to FILE ('-' prints the top entries to stderr)")
+    parser.add_argument("--stats", choices=("json", "prometheus"),
+                        help="time the storage and summary calls and print the counters to stderr")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def command(name: str, fn, help: str) -> argparse.ArgumentParser:
+        p = sub.add_parser(name, help=help)
+        p.add_argument("--user", required=True, help="user id or email")
+        p.set_defaults(fn=fn)
+        return p
+
+    p = command("log-workout", cmd_log_workout, "log a workout")
+    p.add_argument("--date", default=date.today().isoformat())
+    p.add_argument("--type", choices=("strength", "cardio", "flexibility"))
+    p.add_argument("--duration", type=float, help="minutes")
+    p.add_argument("--exercise", type=_json_arg, action="append", help='JSON object, repeatable: {"name": "Squat", "weight_kg": 100}')
+    p.add_argument("--notes")
+    p.add_argument("--allow-future", action="store_true")
+    p.add_argument("--json", help="the entry as a JSON object; overrides the flags")
+
+    p = command("log-meal", cmd_log_meal, "log a meal")
+    p.add_argument("--timestamp", default=datetime.now().strftime("%Y-%m-%d %H:%M"), help="YYYY-MM-DD HH:MM")
+    p.add_argument("--meal-type", choices=("breakfast", "lunch", "dinner", "snack"))
+    p.add_argument("--calories", type=float)
+    p.add_argument("--protein", type=float, default=0.0)
+    p.add_argument("--carbs", type=float, default=0.0)
+    p.add_argument("--fat", type=float, default=0.0)
+    p.add_argument("--item", type=_item, action="append", help="NAME:GRAMS or a JSON object, repeatable")
+    p.add_argument("--allow-future", action="store_true")
+    p.add_argument("--json", help="the entry as a JSON object; overrides the flags")
+
+    p = command("log-metric", cmd_log_metric, "log a health metric")
+    p.add_argument("--date", default=date.today().isoformat())
+    p.add_argument("--type")
+    p.add_argument("--value", type=float)
+    p.add_argument("--allow-future", action="store_true")
+    p.add_argument("--json", help="the entry as a JSON object; overrides the flags")
+
+    p = command("summary", cmd_summary, "workout totals for a week, month or date range")
+    p.add_argument("kind", choices=("weekly", "monthly", "range"))
+    p.add_argument("--week-start", help="YYYY-MM-DD (default: this Monday)")
+    p.add_argument("--month", help="YYYY-MM (default: this month)")
+    p.add_argument("--start")
+    p.add_argument("--end")
+
+    p = command("prs", cmd_prs, "personal records")
+    p.add_argument("--per-exercise", action="store_true")
+
+    p = command("macros", cmd_macros, "macro breakdown for a date range")
+    p.add_argument("--start", required=True)
+    p.add_argument("--end", required=True)
+
+    command("goal-progress", cmd_goal_progress, "progress toward the weight goal")
+
+    p = command("export", cmd_export, "the user's records as JSON")
+    p.add_argument("--collections", default="workouts,nutrition,metrics")
+
+    p = sub.add_parser("batch", help="run one command per line from a file or stdin")
+    p.add_argument("file", nargs="?", default="-")
+    p.add_argument("--stop-on-error", action="store_true")
+    return parser
+
+
+def _line_argv(line: str) -> list[str]:
+    if line[:1] not in "[{":
+        return shlex.split(line)
+    op = json.loads(line)
+    if isinstance(op, list):
+        return [str(x) for x in op]
+    argv = str(op.pop("op")).split()
+    for k, v in op.items():
+        flag = "--" + k.replace("_", "-")
+        if v is True:
+            argv.append(flag)
+        elif v not in (False, None):
+            for x in v if k in REPEATABLE and isinstance(v, list) else [v]:
+                argv += [flag, x if isinstance(x, str) else json.dumps(x)]
+    return argv
+
+
+def _run(parser: argparse.ArgumentParser, st: _State, argv: list[str]):
+    # argparse prints usage, errors and --help itself; keep that text off
+    # the JSON output and report it as the line's error instead.
+    text = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(text), contextlib.redirect_stderr(text):
+            args = parser.parse_args(argv)
+    except SystemExit as exc:
+        lines = text.getvalue().strip().splitlines() or [f"Bad arguments: {shlex.join(argv)}"]
+        # An error is its last line ("main.py log-metric: error: ..."); --help is all of it.
+        raise ValueError(lines[-1] if exc.code else "\n".join(lines)) from None
+    if args.command == "batch":
+        raise ValueError("batch cannot be nested.")
+    return args.fn(st, args)
+
+
+def _print(obj, **kw) -> None:
+    print(json.dumps(obj, ensure_ascii=False, default=str, **kw))
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.stats:
+        instrument.enable()
+    if args.profile:
+        code = instrument.profile(_execute, parser, args, out=None if args.profile == "-" else args.profile)
+    else:
+        code = _execute(parser, args)
+    if args.stats:
+        print(instrument.dump(args.stats), file=sys.stderr)
+    return code
+
+
+def _execute(parser: argparse.ArgumentParser, args) -> int:
+    st = _State(args.base_dir, args.mode)
+    failed = 0
+
+    if args.command == "batch":
+        f = sys.stdin if args.file == "-" else open(args.file, "r", encoding="utf-8")
+        with f:
+            for n, line in enumerate(f, 1):
+                line = line.strip()
+                if not line or line.startswith("#"):
+                    continue
+                try:
+                    _print({"line": n, "ok": True, "result": _run(parser, st, _line_argv(line))})
+                except (ValueError, TypeError, KeyError) as exc:
+                    failed += 1
+                    _print({"line": n, "ok": False, "error": str(exc)})
+                    if args.stop_on_error:
+                        break
+    else:
+        try:
+            _print(args.fn(st, args), indent=2)
+        except (ValueError, TypeError, KeyError) as exc:
+            failed += 1
+            _print({"error": str(exc)})
+
+    if st.dirty() and not args.dry_run:
+        save_state(st.base_dir, st.users, st.workouts, st.meals, st.metrics, st.mode)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
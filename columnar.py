@@ -0,0 +1,163 @@
+from __future__ import annotations
+
+from datetime import date
+
+try:
+    import numpy as np
+except ImportError:  # optional; metrics fall back to the date index
+    np = None
+
+import instrument
+from dates import day_ordinal
+from records import TrackedList
+
+# datetime64[D] counts days from 1970-01-01.
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_INITIAL_CAPACITY = 16
+# Below this many values a plain loop beats numpy's per-call overhead.
+VECTORIZE_MIN = 64
+
+
+def _value(record: dict) -> float | None:
+    try:
+        return float(record.get("value"))
+    except (TypeError, ValueError):
+        return None
+
+
+class Series:
+    """One user's entries of one metric type as parallel numpy arrays.
+
+    Sorted by (day, seq), where seq is the order entries were first indexed,
+    so ties come out the way a stable sort of the list would leave them.
+    Appending in date order is amortized O(1); anything else shifts the tail.
+    """
+
+    def __init__(self):
+        self._days = np.empty(_INITIAL_CAPACITY, dtype="datetime64[D]")
+        self._values = np.empty(_INITIAL_CAPACITY, dtype=np.float64)
+        self._seqs = np.empty(_INITIAL_CAPACITY, dtype=np.int64)
+        self.n = 0
+
+    def __len__(self) -> int:
+        return self.n
+
+    @property
+    def days(self):
+        return self._days[: self.n]
+
+    @property
+    def values(self):
+        return self._values[: self.n]
+
+    def _grow(self) -> None:
+        cap = 2 * len(self._days)
+        for name in ("_days", "_values", "_seqs"):
+            old = getattr(self, name)
+            new = np.empty(cap, dtype=old.dtype)
+            new[: self.n] = old[: self.n]
+            setattr(self, name, new)
+
+    def _position(self, day, seq: int) -> int:
+        days = self.days
+        lo = int(np.searchsorted(days, day, "left"))
+        hi = int(np.searchsorted(days, day, "right"))
+        return lo + int(np.searchsorted(self._seqs[lo:hi], seq))
+
+    def insert(self, day, seq: int, value: float) -> None:
+        n = self.n
+        if n == len(self._days):
+            self._grow()
+        if n and (self._days[n - 1] > day or (self._days[n - 1] == day and self._seqs[n - 1] > seq)):
+            i = self._position(day, seq)
+            for arr in (self._days, self._values, self._seqs):
+                arr[i + 1 : n + 1] = arr[i:n]
+        else:
+            i = n
+        self._days[i], self._values[i], self._seqs[i] = day, value, seq
+        self.n = n + 1
+
+    def remove(self, day, seq: int) -> None:
+        i, n = self._position(day, seq), self.n
+        for arr in (self._days, self._values, self._seqs):
+            arr[i : n - 1] = arr[i + 1 : n]
+        self.n = n - 1
+
+    def index_since(self, days: int) -> int:
+        """Position of the first entry no more than ``days`` before the last."""
+        d = self.days
+        return int(np.searchsorted(d, d[-1] - days))
+
+    def between(self, start: date, end: date) -> tuple:
+        """Day and value views for ``start <= day <= end``."""
+        days = self.days
+        i = int(np.searchsorted(days, np.datetime64(start, "D"), "left"))
+        j = int(np.searchsorted(days, np.datetime64(end, "D"), "right"))
+        return days[i:j], self.values[i:j]
+
+
+class MetricColumns:
+    """Metric values partitioned by (user_id, type), kept as sorted Series.
+
+    Entries whose date or value does not parse are left out, as the summaries
+    skip them anyway.
+    """
+
+    def __init__(self):
+        self._series: dict = {}
+        self._where: dict = {}  # id -> (partition, day, seq)
+        self._seq = 0
+
+    def build(self, items) -> MetricColumns:
+        for r in items:
+            self.update("put", r)
+        return self
+
+    def update(self, op: str, record: dict) -> None:
+        rid = record.get("id")
+        old = self._where.pop(rid, None)
+        seq = self._seq
+        if old is not None:
+            part, day, seq = old
+            self._series[part].remove(day, seq)
+        if op == "del":
+            return
+
+        ordinal, value = day_ordinal(record.get("date", "")), _value(record)
+        if ordinal is None or value is None:
+            return
+        if old is None:
+            self._seq += 1
+        part = (record.get("user_id"), record.get("type"))
+        day = np.datetime64(ordinal - _EPOCH_ORDINAL, "D")
+        self._series.setdefault(part, Series()).insert(day, seq, value)
+        self._where[rid] = (part, day, seq)
+
+    def series(self, part) -> Series | None:
+        s = self._series.get(part)
+        return s if s is not None and len(s) else None
+
+
+def metric_columns(items: list) -> MetricColumns | None:
+    """The metrics collection's columnar index, built on first use.
+
+    None without numpy or for anything but a TrackedList of metrics.
+    """
+    if np is None or not isinstance(items, TrackedList) or items.name != "metrics":
+        return None
+    ix = items.indexes.get("columns")
+    if ix is None:
+        instrument.scanned(len(items))
+        ix = items.indexes["columns"] = MetricColumns().build(items)
+    return ix
+
+
+def to_dates(days) -> list[date]:
+    return days.astype(object).tolist()
+
+
+def moving_average(values, window: int):
+    """Trailing mean over up to ``window`` values, as a float64 array."""
+    v = np.asarray(values, dtype=np.float64)
+    sums = np.convolve(v, np.ones(window))[: len(v)]
+    return sums / np.minimum(np.arange(1, len(v) + 1), window)
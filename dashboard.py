@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+from datetime import date
+
+from dates import day_ordinal
+from metrics import goal_progress
+from nutrition import daily_calorie_summary
+from records import TrackedList
+
+
+class WorkoutActivity:
+    """Each user's workouts by date and the latest day they worked out.
+
+    Kept current by emit(), so a put or delete is O(1); only deleting the
+    last workout on a user's latest day looks over that user's days again.
+    ``on`` matches the date string exactly, as a scan comparing it with
+    today's date would, and returns the day's workouts in list order.
+    """
+
+    def __init__(self):
+        self._by_date: dict = {}  # (user_id, date string) -> {id: workout}
+        self._days: dict = {}  # user_id -> {day ordinal: workout count}
+        self._last: dict = {}  # user_id -> latest day ordinal
+        self._where: dict = {}  # id -> (user_id, date string, day ordinal or None)
+        self._items = None
+
+    def build(self, items) -> WorkoutActivity:
+        self._items = items
+        for w in items:
+            self.update("put", w)
+        return self
+
+    def update(self, op: str, w: dict) -> None:
+        wid = w.get("id")
+        uid, ds = w.get("user_id"), w.get("date", "")
+        old = self._where.pop(wid, None)
+        # A workout changed in place keeps its spot among the day's workouts.
+        moved = op == "del" or old is None or old[:2] != (uid, ds)
+        if old is not None:
+            self._remove(wid, *old, unlist=moved)
+        if op == "del":
+            return
+
+        day = day_ordinal(ds)
+        self._where[wid] = (uid, ds, day)
+        if moved:
+            try:
+                self._by_date.setdefault((uid, ds), {})[wid] = w
+            except TypeError:  # unhashable date; it can never be today
+                pass
+        if day is not None:
+            days = self._days.setdefault(uid, {})
+            days[day] = days.get(day, 0) + 1
+            if uid not in self._last or day > self._last[uid]:
+                self._last[uid] = day
+
+    def _remove(self, wid, uid, ds, day, unlist: bool = True) -> None:
+        if unlist:
+            try:
+                on_day = self._by_date[(uid, ds)]
+            except (KeyError, TypeError):
+                pass
+            else:
+                del on_day[wid]
+                if not on_day:
+                    del self._by_date[(uid, ds)]
+        if day is None:
+            return
+        days = self._days[uid]
+        days[day] -= 1
+        if days[day]:
+            return
+        del days[day]
+        if not days:
+            del self._days[uid], self._last[uid]
+        elif self._last[uid] == day:
+            self._last[uid] = max(days)
+
+    def on(self, user_id, date_str: str) -> list[dict]:
+        todays = list(self._by_date.get((user_id, date_str), {}).values())
+        # A workout moved onto the day was appended to its bucket; order by
+        # list slot so the result matches a scan.
+        pos = getattr(self._items, "_pos", None)
+        if pos is not None and len(todays) > 1:
+            todays.sort(key=lambda w: pos.get(w.get("id"), -1))
+        return todays
+
+    def last_day(self, user_id) -> date | None:
+        day = self._last.get(user_id)
+        return None if day is None else date.fromordinal(day)
+
+
+def workout_activity(workouts: list) -> WorkoutActivity | None:
+    """The collection's per-user activity index, built on first use; None for plain lists."""
+    if not isinstance(workouts, TrackedList):
+        return None
+    ix = workouts.indexes.get("activity")
+    if ix is None:
+        ix = workouts.indexes["activity"] = WorkoutActivity().build(workouts)
+    return ix
+
+
+def _scan_activity(workouts: list, user_id: str, today: str) -> tuple[list, date | None]:
+    todays, last = [], None
+    for w in workouts:
+        if w.get("user_id") != user_id:
+            continue
+        if w.get("date") == today:
+            todays.append(w)
+        day = day_ordinal(w.get("date", ""))
+        if day is not None and (last is None or day > last):
+            last = day
+    return todays, None if last is None else date.fromordinal(last)
+
+
+def dashboard_model(user: dict, users: list, workouts: list, meals: list, metrics: list, today: date | None = None) -> dict:
+    """Everything main.dashboard shows for ``user``.
+
+    Today's workouts and the last workout day come from the activity index,
+    today's calories from the nutrition rollups and goal progress from the
+    metric indexes (all behind the summary cache), so none of it rereads the
+    user's history. Plain lists are scanned instead.
+    """
+    today_s = (today or date.today()).strftime("%Y-%m-%d")
+    ix = workout_activity(workouts)
+    if ix is not None:
+        todays, last = ix.on(user["id"], today_s), ix.last_day(user["id"])
+    else:
+        todays, last = _scan_activity(workouts, user["id"], today_s)
+
+    try:
+        goal = goal_progress(users, metrics, user["id"])
+    except Exception:
+        goal = None
+    return {
+        "date": today_s,
+        "todays_workouts": todays,
+        "last_workout_date": last,
+        "calories": daily_calorie_summary(meals, user["id"], today_s),
+        "daily_calorie_goal": user.get("goal", {}).get("daily_calorie_goal"),
+        "goal_progress": goal,
+    }
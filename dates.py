@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import re
+from datetime import date, datetime
+from functools import lru_cache
+
+# strptime is slow and the same few thousand date strings come up over and
+# over, so every date parse in the app goes through these bounded caches.
+# Failures are not cached; they raise ValueError/TypeError like strptime.
+CACHE_SIZE = 8192
+
+# Zero-padded input (nearly all of it) takes fromisoformat, many times faster
+# than strptime and identical on these exact shapes; anything else, such as
+# "2025-1-5", still goes through strptime.
+_ISO_DATE = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}")
+_ISO_MINUTE = re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_date(s: str) -> date:
+    if isinstance(s, str) and _ISO_DATE.fullmatch(s):
+        return date.fromisoformat(s)
+    return datetime.strptime(s, "%Y-%m-%d").date()
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def parse_datetime(s: str) -> datetime:
+    if isinstance(s, str) and _ISO_MINUTE.fullmatch(s):
+        return datetime.fromisoformat(s)
+    return datetime.strptime(s, "%Y-%m-%d %H:%M")
+
+
+def day_ordinal(s) -> int | None:
+    try:
+        return parse_date(s).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+def timestamp_ordinal(s) -> int | None:
+    try:
+        return parse_datetime(s).toordinal()
+    except (TypeError, ValueError):
+        return None
+
+
+def minute_of_day(s) -> int | None:
+    try:
+        ts = parse_datetime(s)
+    except (TypeError, ValueError):
+        return None
+    return ts.hour * 60 + ts.minute
+
+
+def cache_info() -> dict:
+    return {"date": parse_date.cache_info()._asdict(), "datetime": parse_datetime.cache_info()._asdict()}
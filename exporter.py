@@ -0,0 +1,299 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import math
+import os
+import struct
+import sys
+import time
+from array import array
+from datetime import date
+
+from dates import day_ordinal, minute_of_day, parse_date, timestamp_ordinal
+from indexes import meal_day
+from storage import STORAGE_MODES, iter_collection
+
+# Streaming export of workouts, meals or metrics to CSV, NDJSON or a compact
+# columnar file. Records come straight off the storage files one at a time,
+# so memory stays flat however big the export is:
+#
+#   python exporter.py metrics --format csv --out weights.csv --user you@example.com
+#   python exporter.py workouts --format columnar --out workouts.ftc --start 2024-01-01
+#
+# CSV uses the columns importer.py reads, so an export can be imported again.
+
+KINDS = ("workouts", "nutrition", "metrics")
+FORMATS = ("csv", "ndjson", "columnar")
+BLOCK_ROWS = 65_536
+
+# Columnar file: MAGIC, a length-prefixed JSON header naming the columns,
+# then blocks of up to BLOCK_ROWS rows, each a uint32 row count followed by
+# one array per column, and a zero row count at the end. All little-endian.
+#   date    int32 day ordinal (date.toordinal), 0 when missing
+#   minute  int64 ordinal * 1440 + minute of day, 0 when missing
+#   num     float64, NaN when missing
+#   str     dictionary encoded: uint32 entry count, each entry a uint32 byte
+#           length and UTF-8 bytes, then int32 codes (-1 when missing);
+#           the dictionary is per block
+#   json    as str, holding the value as JSON text
+MAGIC = b"FTCOL1\n"
+
+
+def _macro(name: str):
+    return lambda r: (r.get("macros") or {}).get(name)
+
+
+def _field(name: str):
+    return lambda r: r.get(name)
+
+
+def _columns(*specs) -> tuple:
+    # (name, kind) or (name, kind, getter); the getter defaults to record[name]
+    return tuple((s[0], s[1], s[2] if len(s) > 2 else _field(s[0])) for s in specs)
+
+
+COLUMNS = {
+    "workouts": _columns(
+        ("id", "str"), ("user_id", "str"), ("date", "date"), ("type", "str"), ("duration_min", "num"),
+        ("exercises", "json"), ("notes", "str"), ("pr_flags", "json"),
+    ),
+    "nutrition": _columns(
+        ("id", "str"), ("user_id", "str"), ("timestamp", "minute"), ("meal_type", "str"), ("calories", "num"),
+        ("protein_g", "num", _macro("protein_g")), ("carbs_g", "num", _macro("carbs_g")), ("fat_g", "num", _macro("fat_g")),
+        ("items", "json"),
+    ),
+    "metrics": _columns(("id", "str"), ("user_id", "str"), ("date", "date"), ("type", "str"), ("value", "num")),
+}
+
+_DAY = {
+    "workouts": lambda w: day_ordinal(w.get("date", "")),
+    "nutrition": meal_day,
+    "metrics": lambda e: day_ordinal(e.get("date", "")),
+}
+
+
+def iter_records(base_dir: str, kind: str, mode: str = "json", user_id: str | None = None,
+                 start: str | None = None, end: str | None = None):
+    """Yield one collection's records, optionally for one user and ``start <= day <= end``.
+
+    With a date range, records whose date does not parse are left out.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown kind: {kind}")
+    lo = parse_date(start).toordinal() if start else None
+    hi = parse_date(end).toordinal() if end else None
+    day = _DAY[kind]
+    for r in iter_collection(base_dir, kind, mode, user_id):
+        if user_id is not None and r.get("user_id") != user_id:
+            continue
+        if lo is not None or hi is not None:
+            d = day(r)
+            if d is None or (lo is not None and d < lo) or (hi is not None and d > hi):
+                continue
+        yield r
+
+
+def _num(v) -> float | None:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _text(kind: str, v) -> str | None:
+    if v is None:
+        return None
+    return json.dumps(v, ensure_ascii=False) if kind == "json" else v if isinstance(v, str) else str(v)
+
+
+def write_ndjson(records, f) -> int:
+    n = 0
+    for r in records:
+        f.write(json.dumps(r, ensure_ascii=False) + "\n")
+        n += 1
+    return n
+
+
+def write_csv(kind: str, records, f) -> int:
+    cols = COLUMNS[kind]
+    w = csv.writer(f)
+    w.writerow([name for name, _, _ in cols])
+    n = 0
+    for r in records:
+        w.writerow([_text(ckind, get(r)) for _, ckind, get in cols])
+        n += 1
+    return n
+
+
+def _le(arr: array) -> bytes:
+    if sys.byteorder == "big":
+        arr = array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes()
+
+
+def _encode_column(ckind: str, values: list) -> bytes:
+    if ckind == "date":
+        return _le(array("i", (day_ordinal(v) or 0 for v in values)))
+    if ckind == "minute":
+        out = array("q")
+        for v in values:
+            d = timestamp_ordinal(v)
+            out.append(d * 1440 + minute_of_day(v) if d is not None else 0)
+        return _le(out)
+    if ckind == "num":
+        return _le(array("d", (math.nan if (x := _num(v)) is None else x for v in values)))
+
+    codes, table = array("i"), {}
+    for v in values:
+        s = _text(ckind, v)
+        codes.append(-1 if s is None else table.setdefault(s, len(table)))
+    parts = [struct.pack("<I", len(table))]
+    for s in table:
+        b = s.encode("utf-8")
+        parts += [struct.pack("<I", len(b)), b]
+    parts.append(_le(codes))
+    return b"".join(parts)
+
+
+def write_columnar(kind: str, records, f, block_rows: int = BLOCK_ROWS) -> int:
+    cols = COLUMNS[kind]
+    header = json.dumps({"kind": kind, "columns": [[name, ckind] for name, ckind, _ in cols]}).encode("utf-8")
+    f.write(MAGIC + struct.pack("<I", len(header)) + header)
+
+    def flush(block: list) -> None:
+        f.write(struct.pack("<I", len(block)))
+        for i, (_, ckind, _) in enumerate(cols):
+            f.write(_encode_column(ckind, [row[i] for row in block]))
+
+    n, block = 0, []
+    for r in records:
+        block.append([get(r) for _, _, get in cols])
+        n += 1
+        if len(block) >= block_rows:
+            flush(block)
+            block = []
+    if block:
+        flush(block)
+    f.write(struct.pack("<I", 0))
+    return n
+
+
+def _read_exact(f, size: int) -> bytes:
+    b = f.read(size)
+    if len(b) != size:
+        raise ValueError("Truncated columnar file.")
+    return b
+
+
+def _read_array(f, typecode: str, count: int) -> array:
+    arr = array(typecode)
+    arr.frombytes(_read_exact(f, arr.itemsize * count))
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr
+
+
+def _decode_column(f, ckind: str, rows: int) -> list:
+    if ckind == "date":
+        return [date.fromordinal(d).isoformat() if d else None for d in _read_array(f, "i", rows)]
+    if ckind == "minute":
+        out = []
+        for v in _read_array(f, "q", rows):
+            d, m = divmod(v, 1440)
+            out.append(f"{date.fromordinal(d).isoformat()} {m // 60:02d}:{m % 60:02d}" if v else None)
+        return out
+    if ckind == "num":
+        return [None if math.isnan(x) else x for x in _read_array(f, "d", rows)]
+
+    (size,) = struct.unpack("<I", _read_exact(f, 4))
+    table = []
+    for _ in range(size):
+        (length,) = struct.unpack("<I", _read_exact(f, 4))
+        s = _read_exact(f, length).decode("utf-8")
+        table.append(json.loads(s) if ckind == "json" else s)
+    return [None if c < 0 else table[c] for c in _read_array(f, "i", rows)]
+
+
+def read_columnar(path: str):
+    """Yield the rows of a columnar export as flat dicts, one block in memory at a time."""
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"Not a columnar export: {path}")
+        (length,) = struct.unpack("<I", _read_exact(f, 4))
+        cols = json.loads(_read_exact(f, length))["columns"]
+        while True:
+            (rows,) = struct.unpack("<I", _read_exact(f, 4))
+            if not rows:
+                return
+            data = [_decode_column(f, ckind, rows) for _, ckind in cols]
+            for i in range(rows):
+                yield {name: data[c][i] for c, (name, _) in enumerate(cols)}
+
+
+def export(base_dir: str, kind: str, out: str, fmt: str, mode: str = "json", user_id: str | None = None,
+           start: str | None = None, end: str | None = None) -> dict:
+    """Stream one collection to ``out`` ("-" is stdout for csv/ndjson); returns a report."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format: {fmt}")
+    records = iter_records(base_dir, kind, mode, user_id, start, end)
+    t0 = time.perf_counter()
+    if fmt == "columnar":
+        if out == "-":
+            raise ValueError("The columnar format needs --out.")
+        with open(out, "wb") as f:
+            n = write_columnar(kind, records, f)
+    else:
+        f = sys.stdout if out == "-" else open(out, "w", encoding="utf-8", newline="")
+        try:
+            n = write_csv(kind, records, f) if fmt == "csv" else write_ndjson(records, f)
+        finally:
+            if f is not sys.stdout:
+                f.close()
+    seconds = time.perf_counter() - t0
+    return {
+        "kind": kind, "format": fmt, "records": n,
+        "bytes": os.path.getsize(out) if out != "-" else None,
+        "seconds": round(seconds, 3),
+    }
+
+
+def find_user_id(base_dir: str, ref: str, mode: str = "json") -> str | None:
+    email = ref.strip().lower()
+    for u in iter_collection(base_dir, "users", mode):
+        if u.get("id") == ref or u.get("email") == email:
+            return u["id"]
+    return None
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Stream fitness tracker data out as CSV, NDJSON or columnar.")
+    parser.add_argument("kind", choices=KINDS)
+    parser.add_argument("--format", choices=FORMATS, default="ndjson")
+    parser.add_argument("--out", default="-", help="output file (default: stdout; columnar needs a file)")
+    parser.add_argument("--user", help="only this user's records (id or email)")
+    parser.add_argument("--start", help="YYYY-MM-DD, inclusive")
+    parser.add_argument("--end", help="YYYY-MM-DD, inclusive")
+    parser.add_argument("--base-dir", default=os.path.dirname(os.path.abspath(__file__)))
+    parser.add_argument("--mode", choices=STORAGE_MODES, default=os.environ.get("FITNESS_STORAGE", "json"))
+    args = parser.parse_args(argv)
+
+    user_id = None
+    if args.user:
+        user_id = find_user_id(args.base_dir, args.user, args.mode)
+        if user_id is None:
+            print(json.dumps({"error": f"User not found: {args.user}"}), file=sys.stderr)
+            return 1
+    try:
+        report = export(args.base_dir, args.kind, args.out, args.format, args.mode, user_id, args.start, args.end)
+    except ValueError as exc:
+        print(json.dumps({"error": str(exc)}), file=sys.stderr)
+        return 1
+    print(json.dumps(report, indent=2), file=sys.stderr if args.out == "-" else sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+from __future__ import annotations
+
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+from dates import parse_date, parse_datetime
+from indexes import unique_index
+from records import find_record
+from storage import (
+    STORAGE_MODES,
+    UNIQUE_KEYS,
+    load_state,
+    save_state,
+    load_user_shard,
+    validate_workout_entry,
+    validate_meal_entry,
+    validate_metric_entry,
+)
+from workouts import log_workout, detect_and_flag_prs
+from nutrition import log_meal
+from metrics import log_metric
+
+# Bulk import of CSV or NDJSON exports into workouts, meals or metrics.
+# Rows are read lazily and converted/validated in chunks on a process pool;
+# the main process only deduplicates (same keys main checks) and logs them,
+# saving every ``batch_size`` accepted records.
+#
+#   python importer.py metrics watch_export.csv --user you@example.com
+#
+# CSV columns are the record's fields. Nested values (exercises, items,
+# macros) may be JSON in a column; macros may also come as protein_g,
+# carbs_g and fat_g columns.
+
+KINDS = ("workouts", "nutrition", "metrics")
+CHUNK_SIZE = 2000
+BATCH_SIZE = 50_000
+MAX_REPORTED_REJECTIONS = 1000
+
+_REQUIRED = {
+    "workouts": ("user_id", "date", "type", "duration_min"),
+    "nutrition": ("user_id", "timestamp", "meal_type", "calories"),
+    "metrics": ("user_id", "date", "type", "value"),
+}
+_NUMBERS = {
+    "workouts": ("duration_min",),
+    "nutrition": ("calories", "protein_g", "carbs_g", "fat_g"),
+    "metrics": ("value",),
+}
+_VALIDATORS = {"workouts": validate_workout_entry, "nutrition": validate_meal_entry, "metrics": validate_metric_entry}
+_LOGGERS = {"workouts": log_workout, "nutrition": log_meal, "metrics": log_metric}
+
+
+def read_rows(path: str, fmt: str | None = None):
+    """Yield (line number, row) from a CSV or NDJSON file, one at a time.
+
+    CSV rows come out as dicts; NDJSON lines stay text so the JSON parsing
+    happens on the pool along with validation.
+    """
+    fmt = fmt or ("csv" if path.lower().endswith(".csv") else "ndjson")
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, {k: v for k, v in row.items() if k and v not in ("", None)}
+        elif fmt == "ndjson":
+            for n, line in enumerate(f, 1):
+                if line.strip():
+                    yield n, line
+        else:
+            raise ValueError(f"Unknown format: {fmt}")
+
+
+def _json_field(v):
+    return json.loads(v) if isinstance(v, str) else v
+
+
+def _to_record(kind: str, row, user_id: str | None) -> dict:
+    if isinstance(row, str):
+        try:
+            row = json.loads(row)
+        except ValueError:
+            row = None
+        if not isinstance(row, dict):
+            raise ValueError("not a JSON object")
+    r = dict(row)
+    if user_id is not None:
+        r["user_id"] = user_id
+    if "user_id" in r and not isinstance(r["user_id"], str):
+        raise ValueError("user_id is not a string")
+    for k in _NUMBERS[kind]:
+        if k in r:
+            try:
+                r[k] = float(r[k])
+            except (TypeError, ValueError):
+                raise ValueError(f"{k} is not a number") from None
+    try:
+        if kind == "workouts":
+            r["exercises"] = _json_field(r.get("exercises") or [])
+        elif kind == "nutrition":
+            r["items"] = _json_field(r.get("items") or [])
+            macros = _json_field(r.get("macros") or {})
+    except ValueError:
+        raise ValueError("nested field is not valid JSON") from None
+    if kind == "nutrition":
+        if not isinstance(macros, dict):
+            raise ValueError("macros is not an object")
+        for k in ("protein_g", "carbs_g", "fat_g"):
+            macros.setdefault(k, r.pop(k, 0.0))
+        r["macros"] = macros
+    if isinstance(r.get("allow_future"), str):
+        r["allow_future"] = r["allow_future"].strip().lower() in ("1", "true", "yes")
+    return r
+
+
+def _reason(kind: str, r: dict) -> str:
+    missing = [k for k in _REQUIRED[kind] if k not in r]
+    if missing:
+        return "missing " + ", ".join(missing)
+    try:
+        when = parse_datetime(r["timestamp"]).date() if kind == "nutrition" else parse_date(r["date"])
+    except (TypeError, ValueError):
+        return "bad " + ("timestamp" if kind == "nutrition" else "date")
+    if when > date.today() and not r.get("allow_future"):
+        return "date in the future"
+    return f"rejected by validate_{'meal' if kind == 'nutrition' else kind.rstrip('s')}_entry"
+
+
+def validate_chunk(kind: str, chunk: list, user_id: str | None = None) -> list:
+    """[(line, record or None, reason or None)] for a chunk of (line, row); runs in the pool."""
+    out = []
+    validate = _VALIDATORS[kind]
+    for n, row in chunk:
+        try:
+            r = _to_record(kind, row, user_id)
+        except ValueError as exc:
+            out.append((n, None, str(exc)))
+            continue
+        if validate({"id": "tmp", **r}):
+            out.append((n, r, None))
+        else:
+            out.append((n, None, _reason(kind, r)))
+    return out
+
+
+def _chunks(rows, size: int):
+    chunk = []
+    for item in rows:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _validated(kind: str, rows, user_id: str | None, workers: int):
+    # Yields validated chunks in file order with at most 2 * workers chunks
+    # in flight, so memory stays bounded however long the file is.
+    if workers <= 1:
+        for chunk in _chunks(rows, CHUNK_SIZE):
+            yield validate_chunk(kind, chunk, user_id)
+        return
+    with ProcessPoolExecutor(workers) as pool:
+        pending = deque()
+        for chunk in _chunks(rows, CHUNK_SIZE):
+            pending.append(pool.submit(validate_chunk, kind, chunk, user_id))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def import_rows(kind: str, rows, users: list, items: list, user_id: str | None = None, workers: int = 1,
+                batch_size: int = BATCH_SIZE, commit=None, on_user=None) -> dict:
+    """Validate, deduplicate and log ``rows`` into ``items``; returns a report.
+
+    Imported workouts get their PR flags as they are logged, in file order.
+
+    ``commit()`` is called after every ``batch_size`` accepted records and at
+    the end; ``on_user(user_id)`` the first time each user turns up (sharded
+    mode loads the user's records there so duplicates are seen).
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown kind: {kind}")
+    keys = UNIQUE_KEYS[kind]
+    seen = None if unique_index(items, keys) is not None else {tuple(r.get(k) for k in keys) for r in items}
+    known_users: dict = {}
+    log = _LOGGERS[kind]
+    report = {"kind": kind, "rows": 0, "imported": 0, "duplicates": 0, "rejected": 0, "rejections": []}
+    pending = 0
+    t0 = time.perf_counter()
+
+    def reject(n: int, reason: str) -> None:
+        report["rejected"] += 1
+        if len(report["rejections"]) < MAX_REPORTED_REJECTIONS:
+            report["rejections"].append({"row": n, "reason": reason})
+
+    for chunk in _validated(kind, rows, user_id, workers):
+        for n, r, reason in chunk:
+            report["rows"] += 1
+            if r is None:
+                reject(n, reason)
+                continue
+            uid = r["user_id"]
+            if uid not in known_users:
+                known_users[uid] = find_record(users, uid) is not None
+                if known_users[uid] and on_user is not None:
+                    on_user(uid)
+            if not known_users[uid]:
+                reject(n, f"unknown user {uid}")
+                continue
+            if r.get("id") and find_record(items, r["id"]) is not None:
+                report["duplicates"] += 1
+                continue
+            if seen is not None:
+                key = tuple(r.get(k) for k in keys)
+                if key in seen:
+                    report["duplicates"] += 1
+                    continue
+                seen.add(key)
+            elif r in unique_index(items, keys):  # looked up each time: loading a shard rebuilds it
+                report["duplicates"] += 1
+                continue
+
+            w = log(items, r)
+            if kind == "workouts":  # flagged against what is logged so far, as main does
+                detect_and_flag_prs(items, uid, w)
+            report["imported"] += 1
+            pending += 1
+            if commit is not None and pending >= batch_size:
+                commit()
+                pending = 0
+
+    if commit is not None and pending:
+        commit()
+    seconds = time.perf_counter() - t0
+    report["seconds"] = round(seconds, 3)
+    report["records_per_second"] = round(report["rows"] / seconds) if seconds else None
+    if len(report["rejections"]) < report["rejected"]:
+        report["rejections_truncated"] = True
+    return report
+
+
+def default_workers() -> int:
+    return max(1, min(4, os.cpu_count() or 1))
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Bulk import CSV or NDJSON into the fitness tracker data.")
+    parser.add_argument("kind", choices=KINDS)
+    parser.add_argument("file")
+    parser.add_argument("--format", choices=("csv", "ndjson"))
+    parser.add_argument("--user", help="id or email to assign every row to (exports without a user_id column)")
+    parser.add_argument("--workers", type=int, default=default_workers(), help="validation processes; 1 validates inline")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="save after this many imported records")
+    parser.add_argument("--base-dir", default=os.path.dirname(os.path.abspath(__file__)))
+    parser.add_argument("--mode", choices=STORAGE_MODES, default=os.environ.get("FITNESS_STORAGE", "json"))
+    args = parser.parse_args(argv)
+
+    users, workouts, meals, metrics = load_state(args.base_dir, args.mode)
+    user_id = None
+    if args.user:
+        u = find_record(users, args.user) or next((x for x in users if x.get("email") == args.user.strip().lower()), None)
+        if u is None:
+            print(json.dumps({"error": f"User not found: {args.user}"}))
+            return 1
+        user_id = u["id"]
+
+    items = {"workouts": workouts, "nutrition": meals, "metrics": metrics}[args.kind]
+    report = import_rows(
+        args.kind, read_rows(args.file, args.format), users, items, user_id, args.workers, args.batch_size,
+        commit=lambda: save_state(args.base_dir, users, workouts, meals, metrics, args.mode),
+        on_user=lambda uid: load_user_shard(args.base_dir, uid, workouts, meals, metrics),
+    )
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
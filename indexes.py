@@ -0,0 +1,266 @@
+from __future__ import annotations
+
+from bisect import bisect_left, bisect_right, insort
+from datetime import date as _date
+
+import instrument
+from dates import day_ordinal, minute_of_day, parse_datetime, timestamp_ordinal
+from records import TrackedList
+
+MEAL_TYPES = ("breakfast", "lunch", "dinner", "snack")
+
+
+def meal_day(m: dict) -> int | None:
+    # The full timestamp when it parses (what macro_breakdown uses), else its
+    # date part (enough for daily_calorie_summary's prefix match).
+    ts = m.get("timestamp", "")
+    day = timestamp_ordinal(ts)
+    return day if day is not None else day_ordinal(ts[:10] if isinstance(ts, str) else None)
+
+
+class DateIndex:
+    """Records grouped by a partition key and kept sorted by day ordinal.
+
+    Day ordinals (and the optional within-day key, minute of day for meals)
+    are parsed once when a record is indexed. Ties stay in insertion order, so
+    a range read matches what a scan followed by a stable sort would give.
+    """
+
+    def __init__(self, partition, day, within=None):
+        self._partition = partition
+        self._day = day
+        self._within = within or (lambda r: 0)
+        self._parts: dict = {}  # partition -> ([(day, within, seq)], [record])
+        self._where: dict = {}  # id -> (partition, key)
+        self._seq = 0
+
+    def build(self, items) -> DateIndex:
+        for r in items:
+            self.update("put", r)
+        return self
+
+    def update(self, op: str, record: dict) -> None:
+        rid = record.get("id")
+        old = self._where.pop(rid, None)
+        seq = self._seq
+        if old is not None:
+            part, key = old
+            keys, recs = self._parts[part]
+            i = bisect_left(keys, key)
+            del keys[i], recs[i]
+            seq = key[-1]
+        if op == "del":
+            return
+
+        part, day = self._partition(record), self._day(record)
+        if day is None:
+            return
+        if old is None:
+            self._seq += 1
+        key = (day, self._within(record) or 0, seq)
+        keys, recs = self._parts.setdefault(part, ([], []))
+        i = bisect_left(keys, key)
+        keys.insert(i, key)
+        recs.insert(i, record)
+        self._where[rid] = (part, key)
+
+    def range(self, part, lo: int, hi: int) -> list[dict]:
+        """Records of ``part`` with ``lo <= day < hi``, in day order."""
+        keys, recs = self._parts.get(part, ((), ()))
+        return recs[bisect_left(keys, (lo,)) : bisect_left(keys, (hi,))]
+
+    def all(self, part) -> list[dict]:
+        return list(self._parts.get(part, ((), ()))[1])
+
+    def entries(self, part) -> tuple:
+        """The sorted (keys, records) lists of ``part`` themselves; do not modify them."""
+        return self._parts.get(part, ((), ()))
+
+
+_DATE_INDEXES = {
+    "workouts": (lambda w: w.get("user_id"), lambda w: day_ordinal(w.get("date", ""))),
+    "nutrition": (lambda m: m.get("user_id"), meal_day, lambda m: minute_of_day(m.get("timestamp", ""))),
+    "metrics": (lambda e: (e.get("user_id"), e.get("type")), lambda e: day_ordinal(e.get("date", ""))),
+}
+
+
+def date_index(items: list) -> DateIndex | None:
+    """The collection's (partition, day) index, built on first use; None for plain lists."""
+    if not isinstance(items, TrackedList) or items.name not in _DATE_INDEXES:
+        return None
+    ix = items.indexes.get("date")
+    if ix is None:
+        instrument.scanned(len(items))
+        ix = items.indexes["date"] = DateIndex(*_DATE_INDEXES[items.name]).build(items)
+    return ix
+
+
+class UniqueIndex:
+    """Counts of composite key values, for O(1) duplicate checks."""
+
+    def __init__(self, keys):
+        self.keys = tuple(keys)
+        self._counts: dict = {}
+        self._where: dict = {}  # id -> key value
+
+    def key(self, record: dict) -> tuple:
+        return tuple(record.get(k) for k in self.keys)
+
+    def build(self, items) -> UniqueIndex:
+        for r in items:
+            self.update("put", r)
+        return self
+
+    def update(self, op: str, record: dict) -> None:
+        rid = record.get("id")
+        old = self._where.pop(rid, None)
+        if old is not None:
+            self._counts[old] -= 1
+            if not self._counts[old]:
+                del self._counts[old]
+        if op == "del":
+            return
+        k = self.key(record)
+        self._counts[k] = self._counts.get(k, 0) + 1
+        self._where[rid] = k
+
+    def __contains__(self, candidate: dict) -> bool:
+        return self.key(candidate) in self._counts
+
+
+def unique_index(items: list, keys) -> UniqueIndex | None:
+    """A UniqueIndex over ``keys``, built on first use; None for plain lists."""
+    if not isinstance(items, TrackedList):
+        return None
+    name = ("unique",) + tuple(keys)
+    ix = items.indexes.get(name)
+    if ix is None:
+        ix = items.indexes[name] = UniqueIndex(keys).build(items)
+    return ix
+
+
+def _num(v) -> float:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _contribution(m: dict) -> list | None:
+    # [user_id, day, calories, protein, carbs, fat, meal_type, in_daily, timed]
+    # in_daily: what daily_calorie_summary's prefix match counts;
+    # timed: what macro_breakdown counts (the timestamp fully parses).
+    day = meal_day(m)
+    if day is None:
+        return None
+    ts = m.get("timestamp", "")
+    macros = m.get("macros") or {}
+    try:
+        parse_datetime(ts)
+        timed = True
+    except (TypeError, ValueError):
+        timed = False
+    return [
+        m.get("user_id"), day, _num(m.get("calories", 0)),
+        _num(macros.get("protein_g", 0)), _num(macros.get("carbs_g", 0)), _num(macros.get("fat_g", 0)),
+        m.get("meal_type"), ts.startswith(_date.fromordinal(day).isoformat()), timed,
+    ]
+
+
+class NutritionRollups:
+    """Per (user_id, day) totals, kept up to date one meal at a time.
+
+    Each bucket holds its meals' contributions and totals recomputed from
+    them on every change (a day has a handful of meals), so deletes never
+    leave float residue behind. Days are kept sorted per user so a date range
+    is a slice.
+    """
+
+    def __init__(self):
+        self._meals: dict = {}  # meal id -> contribution
+        self._buckets: dict = {}  # (user_id, day) -> {"members": {id: contribution}, "totals": {...}}
+        self._days: dict = {}  # user_id -> sorted days with a bucket
+
+    def build(self, items) -> NutritionRollups:
+        for m in items:
+            self.update("put", m)
+        return self
+
+    def update(self, op: str, m: dict) -> None:
+        mid = m.get("id")
+        old = self._meals.pop(mid, None)
+        if old is not None:
+            self._remove(mid, old)
+        if op == "del":
+            return
+        c = _contribution(m)
+        if c is not None:
+            self._add(mid, c)
+
+    def _add(self, mid, c: list) -> None:
+        self._meals[mid] = c
+        key = (c[0], c[1])
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = {"members": {}, "totals": None}
+            insort(self._days.setdefault(c[0], []), c[1])
+        bucket["members"][mid] = c
+        bucket["totals"] = _totals(bucket["members"].values())
+
+    def _remove(self, mid, c: list) -> None:
+        key = (c[0], c[1])
+        bucket = self._buckets[key]
+        del bucket["members"][mid]
+        if bucket["members"]:
+            bucket["totals"] = _totals(bucket["members"].values())
+            return
+        del self._buckets[key]
+        days = self._days[c[0]]
+        del days[bisect_left(days, c[1])]
+
+    def day(self, user_id, day: int) -> dict | None:
+        bucket = self._buckets.get((user_id, day))
+        return bucket["totals"] if bucket else None
+
+    def days(self, user_id, lo: int, hi: int) -> list[dict]:
+        """Totals for each day with meals in ``lo <= day <= hi``."""
+        days = self._days.get(user_id, [])
+        return [self._buckets[(user_id, d)]["totals"] for d in days[bisect_left(days, lo) : bisect_right(days, hi)]]
+
+    def to_json(self) -> dict:
+        return {"meals": self._meals}
+
+    @classmethod
+    def from_json(cls, data: dict) -> NutritionRollups:
+        self = cls()
+        for mid, c in data["meals"].items():
+            self._add(mid, c)
+        return self
+
+
+def _totals(members) -> dict:
+    calories = 0.0
+    by_type = dict.fromkeys(MEAL_TYPES, 0.0)
+    macro = [0.0, 0.0, 0.0, 0.0]
+    for _, _, cal, p, c, f, mt, in_daily, timed in members:
+        if in_daily:
+            calories += cal
+            if mt in by_type:
+                by_type[mt] += cal
+        if timed:
+            macro[0] += cal
+            macro[1] += p
+            macro[2] += c
+            macro[3] += f
+    return {"calories": calories, "by_meal_type": by_type, "macros": macro}
+
+
+def meal_rollups(meals: list) -> NutritionRollups | None:
+    """The collection's per-day rollups, built on first use; None for plain lists."""
+    if not isinstance(meals, TrackedList) or meals.name != "nutrition":
+        return None
+    ix = meals.indexes.get("rollups")
+    if ix is None:
+        instrument.scanned(len(meals))
+        ix = meals.indexes["rollups"] = NutritionRollups().build(meals)
+    return ix
@@ -0,0 +1,245 @@
+from __future__ import annotations
+
+import json
+import logging
+import math
+import os
+import sys
+import threading
+import time
+from functools import wraps
+
+# Opt-in counters for the storage functions and the summaries. Each
+# @timed() function records its call count, a latency histogram, the
+# records it looked at and the bytes it read or wrote. Those last two are
+# reported from inside with scanned(), read()/wrote(), and also count
+# toward every timed call they happen under: load_state's bytes include
+# those of its _read_json calls.
+#
+# Off by default. FITNESS_INSTRUMENT=1 (or enable()) turns it on;
+# FITNESS_SLOW_MS=<ms> also logs every call slower than that on the
+# "fitness.slow" logger. While off, a timed function costs one flag check.
+# Dumps: as_json() and prometheus().
+
+BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, math.inf)  # seconds
+
+log = logging.getLogger("fitness.slow")
+
+
+def _env_slow_ms() -> float | None:
+    raw = os.environ.get("FITNESS_SLOW_MS", "")
+    try:
+        return float(raw or 0) or None
+    except ValueError:
+        log.warning("FITNESS_SLOW_MS=%r is not a number of milliseconds; not logging slow calls.", raw)
+        return None
+
+
+_enabled = os.environ.get("FITNESS_INSTRUMENT", "0") != "0"
+_slow_ms = _env_slow_ms()
+_ops: dict = {}
+_local = threading.local()
+
+
+class OpStats:
+    __slots__ = ("calls", "errors", "seconds", "max_seconds", "buckets", "scanned", "bytes_read", "bytes_written")
+
+    def __init__(self):
+        self.calls = self.errors = self.scanned = self.bytes_read = self.bytes_written = 0
+        self.seconds = self.max_seconds = 0.0
+        self.buckets = [0] * len(BUCKETS)
+
+    def to_json(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "total_ms": round(self.seconds * 1000, 3),
+            "mean_ms": round(self.seconds * 1000 / self.calls, 3) if self.calls else None,
+            "max_ms": round(self.max_seconds * 1000, 3),
+            "histogram_ms": {("inf" if b == math.inf else f"{b * 1000:g}"): n for b, n in zip(BUCKETS, self.buckets)},
+            "records_scanned": self.scanned,
+            "bytes_read": self.bytes_read,
+            "bytes_written": self.bytes_written,
+        }
+
+
+class _Frame:
+    __slots__ = ("scanned", "bytes_read", "bytes_written")
+
+    def __init__(self):
+        self.scanned = self.bytes_read = self.bytes_written = 0
+
+
+def _stack() -> list:
+    try:
+        return _local.stack
+    except AttributeError:
+        _local.stack = []
+        return _local.stack
+
+
+def _observe(label: str, fn, args, kwargs):
+    stack = _stack()
+    frame = _Frame()
+    stack.append(frame)
+    failed = True
+    t0 = time.perf_counter()
+    try:
+        out = fn(*args, **kwargs)
+        failed = False
+        return out
+    finally:
+        elapsed = time.perf_counter() - t0
+        stack.pop()
+        if stack:  # an enclosing timed call did this work too
+            parent = stack[-1]
+            parent.scanned += frame.scanned
+            parent.bytes_read += frame.bytes_read
+            parent.bytes_written += frame.bytes_written
+        op = _ops.get(label)
+        if op is None:
+            op = _ops[label] = OpStats()
+        op.calls += 1
+        op.errors += failed
+        op.seconds += elapsed
+        op.max_seconds = max(op.max_seconds, elapsed)
+        op.buckets[next(i for i, b in enumerate(BUCKETS) if elapsed <= b)] += 1
+        op.scanned += frame.scanned
+        op.bytes_read += frame.bytes_read
+        op.bytes_written += frame.bytes_written
+        if _slow_ms is not None and elapsed * 1000 >= _slow_ms:
+            log.warning("slow: %s took %.1f ms (scanned %d records, read %d B, wrote %d B)",
+                        label, elapsed * 1000, frame.scanned, frame.bytes_read, frame.bytes_written)
+
+
+def timed(name: str | None = None):
+    """Record calls of the decorated function under ``name`` (default module.function)."""
+
+    def wrap(fn):
+        label = name or f"{fn.__module__}.{fn.__name__}"
+
+        @wraps(fn)
+        def call(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            return _observe(label, fn, args, kwargs)
+
+        return call
+
+    return wrap
+
+
+def scanned(n: int) -> None:
+    """Count ``n`` records looked at by the innermost timed call."""
+    if _enabled:
+        stack = _stack()
+        if stack:
+            stack[-1].scanned += n
+
+
+def read(n: int) -> None:
+    if _enabled:
+        stack = _stack()
+        if stack:
+            stack[-1].bytes_read += n
+
+
+def wrote(n: int) -> None:
+    if _enabled:
+        stack = _stack()
+        if stack:
+            stack[-1].bytes_written += n
+
+
+def read_file(path: str) -> None:
+    """read() the size of ``path``; stats it only while enabled."""
+    if _enabled and _stack():
+        read(_size(path))
+
+
+def wrote_file(path: str) -> None:
+    if _enabled and _stack():
+        wrote(_size(path))
+
+
+def _size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def enable(slow_ms: float | None = None) -> None:
+    global _enabled, _slow_ms
+    _enabled = True
+    if slow_ms is not None:
+        _slow_ms = slow_ms or None
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def reset() -> None:
+    _ops.clear()
+
+
+def as_json() -> dict:
+    return {"enabled": _enabled, "slow_ms": _slow_ms, "ops": {k: _ops[k].to_json() for k in sorted(_ops)}}
+
+
+def prometheus() -> str:
+    """The counters in the Prometheus text exposition format."""
+    ops = sorted(_ops.items())
+    out = [
+        "# HELP fitness_op_seconds Time spent in each instrumented operation.",
+        "# TYPE fitness_op_seconds histogram",
+    ]
+    for label, op in ops:
+        total = 0
+        for b, n in zip(BUCKETS, op.buckets):
+            total += n
+            le = "+Inf" if b == math.inf else f"{b:g}"
+            out.append(f'fitness_op_seconds_bucket{{op="{label}",le="{le}"}} {total}')
+        out.append(f'fitness_op_seconds_sum{{op="{label}"}} {op.seconds:.9f}')
+        out.append(f'fitness_op_seconds_count{{op="{label}"}} {op.calls}')
+    for metric, attr, help_text in (
+        ("fitness_op_errors_total", "errors", "Calls that raised."),
+        ("fitness_records_scanned_total", "scanned", "Records looked at."),
+        ("fitness_bytes_read_total", "bytes_read", "Bytes read from data files."),
+        ("fitness_bytes_written_total", "bytes_written", "Bytes written to data and backup files."),
+    ):
+        out += [f"# HELP {metric} {help_text}", f"# TYPE {metric} counter"]
+        out += [f'{metric}{{op="{label}"}} {getattr(op, attr)}' for label, op in ops]
+    return "\n".join(out) + "\n"
+
+
+def profile(fn, *args, out: str | None = None, top: int = 25, **kwargs):
+    """Run ``fn`` under cProfile and return its result.
+
+    The stats are saved to ``out`` as a pstats file, or without one the
+    ``top`` entries by cumulative time are printed to stderr.
+    """
+    import cProfile
+    import io
+    import pstats
+
+    prof = cProfile.Profile()
+    try:
+        return prof.runcall(fn, *args, **kwargs)
+    finally:
+        if out:
+            prof.dump_stats(out)
+        else:
+            buf = io.StringIO()
+            pstats.Stats(prof, stream=buf).sort_stats("cumulative").print_stats(top)
+            print(buf.getvalue(), file=sys.stderr)
+
+
+def dump(fmt: str = "json") -> str:
+    return prometheus() if fmt == "prometheus" else json.dumps(as_json(), indent=2)
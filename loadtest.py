@@ -0,0 +1,205 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+
+import synthetic
+from storage import STORAGE_MODES, save_state, migrate_to_sharded, json_to_snapshot
+
+# Load test for server.py: N concurrent keep-alive clients, each logged in as
+# one of the synthetic users, send a mix of summary reads and metric writes.
+# Without --url it seeds a temporary data directory and starts its own
+# server on a free port:
+#
+#   python loadtest.py --users 50 --concurrency 64 --requests 20000 --mode journal
+#   python loadtest.py --url http://127.0.0.1:8080 --requests 5000
+#
+# Prints a JSON report: requests/sec and p50/p99/max latency, overall and
+# for reads and writes separately.
+
+END = "2025-01-01"
+READS = (
+    "/summary/weekly?week_start=2024-12-23",
+    "/summary/monthly?month=2024-12",
+    "/dashboard",
+    "/calories?date=2024-12-31",
+    "/macros?start=2024-12-01&end=2024-12-31",
+    "/metrics/summary?type=weight_kg&start=2024-06-01&end=2024-12-31",
+    "/goal-progress",
+    "/prs",
+    "/load?end=2024-12-31",
+)
+
+
+class Client:
+    """One keep-alive HTTP/1.1 connection speaking JSON."""
+
+    def __init__(self, host: str, port: int):
+        self.host, self.port = host, port
+        self.token: str | None = None
+        self._reader = self._writer = None
+
+    async def connect(self) -> Client:
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        return self
+
+    async def request(self, method: str, path: str, body=None) -> tuple[int, object]:
+        payload = json.dumps(body).encode("utf-8") if body is not None else b""
+        head = f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Length: {len(payload)}\r\n"
+        if self.token:
+            head += f"Authorization: Bearer {self.token}\r\n"
+        self._writer.write((head + "\r\n").encode("latin-1") + payload)
+        await self._writer.drain()
+
+        status = int((await self._reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self._reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            k, _, v = line.decode("latin-1").partition(":")
+            if k.strip().lower() == "content-length":
+                length = int(v)
+        data = await self._reader.readexactly(length) if length else b""
+        return status, json.loads(data) if data else None
+
+    async def login(self, email: str, pin: str) -> dict:
+        status, out = await self.request("POST", "/login", {"email": email, "pin": pin})
+        if status != 200:
+            raise RuntimeError(f"Login failed for {email}: {out}")
+        self.token = out["token"]
+        return out["user"]
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            await self._writer.wait_closed()
+
+
+def _percentile(sorted_ms: list, p: float) -> float | None:
+    if not sorted_ms:
+        return None
+    return round(sorted_ms[min(len(sorted_ms) - 1, int(p / 100 * len(sorted_ms)))], 3)
+
+
+def _latency(ms: list) -> dict:
+    ms = sorted(ms)
+    return {"count": len(ms), "p50_ms": _percentile(ms, 50), "p99_ms": _percentile(ms, 99),
+            "max_ms": round(ms[-1], 3) if ms else None}
+
+
+async def run(url: str, users: int, concurrency: int, requests: int, write_ratio: float, seed: int = 0) -> dict:
+    parts = urlsplit(url)
+    rng = random.Random(seed)
+    sent = itertools.count()
+    days = itertools.count(1)  # each write gets its own date, so none is a duplicate
+    last = date.fromisoformat(END) - timedelta(days=1)
+    times = {"read": [], "write": []}
+    errors: dict = {}
+
+    async def worker(n: int) -> None:
+        client = await Client(parts.hostname, parts.port).connect()
+        try:
+            await client.login(f"user{n % users}@example.com", "1234")
+            while next(sent) < requests:
+                if rng.random() < write_ratio:
+                    kind, method, path = "write", "POST", "/metrics"
+                    body = {"date": (last - timedelta(days=next(days))).isoformat(), "type": "water_l",
+                            "value": round(rng.uniform(1, 4), 1)}
+                else:
+                    kind, method, path, body = "read", "GET", rng.choice(READS), None
+                t0 = time.perf_counter()
+                status, out = await client.request(method, path, body)
+                times[kind].append((time.perf_counter() - t0) * 1000)
+                if status >= 400:
+                    key = f"{status} {method} {path.split('?')[0]}"
+                    errors[key] = errors.get(key, 0) + 1
+        finally:
+            await client.close()
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker(n) for n in range(concurrency)))
+    seconds = time.perf_counter() - t0
+
+    probe = await Client(parts.hostname, parts.port).connect()
+    _, health = await probe.request("GET", "/health")
+    await probe.close()
+    total = len(times["read"]) + len(times["write"])
+    return {
+        "url": url, "concurrency": concurrency, "requests": total, "seconds": round(seconds, 3),
+        "requests_per_sec": round(total / seconds, 1) if seconds else None,
+        **_latency(times["read"] + times["write"]),
+        "read": _latency(times["read"]), "write": _latency(times["write"]),
+        "errors": errors, "server": health,
+    }
+
+
+def start_local(base_dir: str, users: int, years: float, mode: str, commit_delay: float) -> tuple[subprocess.Popen, str]:
+    """Seed ``base_dir`` with synthetic data and start server.py on a free port."""
+    save_state(base_dir, *synthetic.generate(users=users, years=years, end=END))
+    if mode == "sharded":
+        migrate_to_sharded(base_dir)
+    elif mode == "snapshot":
+        json_to_snapshot(base_dir)
+    here = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(here, "server.py"), "--port", "0", "--base-dir", base_dir, "--mode", mode,
+         "--commit-delay", str(commit_delay)],
+        stdout=subprocess.PIPE, text=True,
+    )
+    line = proc.stdout.readline()
+    if not line:
+        proc.wait()
+        raise RuntimeError("server.py exited before it started listening.")
+    return proc, json.loads(line)["listening"]
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Load-test server.py; prints latency percentiles and requests/sec.")
+    parser.add_argument("--url", help="an already running server (its users must be the synthetic ones)")
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--years", type=float, default=1.0, help="history per synthetic user")
+    parser.add_argument("--mode", choices=STORAGE_MODES, default="journal")
+    parser.add_argument("--commit-delay", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--write-ratio", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    proc = None
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.url
+        if url is None:
+            proc, url = start_local(tmp, args.users, args.years, args.mode, args.commit_delay)
+        try:
+            report = asyncio.run(run(url, args.users, args.concurrency, args.requests, args.write_ratio, args.seed))
+        finally:
+            if proc is not None:
+                proc.terminate()
+                proc.wait()
+    if args.url is None:
+        report["mode"] = args.mode
+
+    text = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,31 +1,83 @@
 from __future__ import annotations
 
+import importlib
 import os
-from datetime import date, datetime
+import sys
+from datetime import date, timedelta
 
+from dates import parse_date, parse_datetime
 from storage import (
     load_state,
     save_state,
+    close_state,
     restore_latest_backup,
+    load_user_shard,
     validate_workout_entry,
     validate_meal_entry,
     validate_metric_entry,
     prevent_duplicate,
+    UNIQUE_KEYS,
 )
+from records import is_dirty
 from profiles import register_user, authenticate_user, update_goal
-from workouts import (
+
+
+def _deferred(module: str, *names: str) -> tuple:
+    """Stand-ins for ``from module import names`` that import it on first call.
+
+    The analytics modules (and numpy behind metrics) are not needed to show
+    the first menu, so they load when a menu first uses them.
+    """
+    def stand_in(name: str):
+        def call(*args, **kwargs):
+            return getattr(importlib.import_module(module), name)(*args, **kwargs)
+
+        call.__name__ = call.__qualname__ = name
+        return call
+
+    return tuple(stand_in(name) for name in names)
+
+
+(
     log_workout,
     update_workout,
     delete_workout,
     weekly_workout_summary,
     personal_records,
+    exercise_records,
     detect_and_flag_prs,
+    monthly_workout_summary,
+    rolling_load,
+    acute_chronic_ratio,
+) = _deferred(
+    "workouts", "log_workout", "update_workout", "delete_workout", "weekly_workout_summary", "personal_records",
+    "exercise_records", "detect_and_flag_prs", "monthly_workout_summary", "rolling_load", "acute_chronic_ratio",
+)
+log_meal, update_meal, delete_meal, daily_calorie_summary, macro_breakdown = _deferred(
+    "nutrition", "log_meal", "update_meal", "delete_meal", "daily_calorie_summary", "macro_breakdown",
+)
+log_metric, metrics_summary, goal_progress, metric_history, moving_average, generate_ascii_chart = _deferred(
+    "metrics", "log_metric", "metrics_summary", "goal_progress", "metric_history", "moving_average", "generate_ascii_chart",
 )
-from nutrition import log_meal, update_meal, delete_meal, daily_calorie_summary, macro_breakdown
-from metrics import log_metric, metrics_summary, goal_progress, moving_average, generate_ascii_chart
+(dashboard_model,) = _deferred("dashboard", "dashboard_model")
 
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# One of storage.STORAGE_MODES.
+STORAGE_MODE = os.environ.get("FITNESS_STORAGE", "json")
+# Start from the pickled copy of the data while the JSON files are unchanged
+# (json and journal modes).
+WARM_START = os.environ.get("FITNESS_WARM_START", "0") != "0"
+
+
+def open_state() -> tuple[list, list, list, list]:
+    return load_state(BASE_DIR, STORAGE_MODE, warm_start=WARM_START)
+
+
+def persist_state(users: list, workouts: list, meals: list, metrics: list) -> None:
+    # The warm-start cache is rebuilt from the files by the next start, not
+    # from this process's copy: collections it did not save may be stale.
+    save_state(BASE_DIR, users, workouts, meals, metrics, STORAGE_MODE)
 
 
 def prompt(msg: str) -> str:
@@ -68,7 +120,7 @@ def prompt_date(msg: str) -> str:
     while True:
         s = prompt(msg + " (YYYY-MM-DD): ")
         try:
-            datetime.strptime(s, "%Y-%m-%d")
+            parse_date(s)
             return s
         except ValueError:
             print("Invalid date format. Use YYYY-MM-DD.")
@@ -78,63 +130,55 @@ def prompt_timestamp(msg: str) -> str:
     while True:
         s = prompt(msg + " (YYYY-MM-DD HH:MM): ")
         try:
-            datetime.strptime(s, "%Y-%m-%d %H:%M")
+            parse_datetime(s)
             return s
         except ValueError:
             print("Invalid timestamp format. Use YYYY-MM-DD HH:MM.")
 
 
+def has_unsaved_changes(users: list, workouts: list, meals: list, metrics: list) -> bool:
+    return any(is_dirty(items) for items in (users, workouts, meals, metrics))
+
+
 def divider() -> None:
     print("-" * 60)
 
 
 def dashboard(user: dict, users: list, workouts: list, meals: list, metrics: list) -> None:
+    model = dashboard_model(user, users, workouts, meals, metrics)
     divider()
-    today = date.today().strftime("%Y-%m-%d")
-    print(f"Dashboard — {user['name']} ({today})")
+    print(f"Dashboard — {user['name']} ({model['date']})")
     divider()
 
-    todays_ws = [w for w in workouts if w.get("user_id") == user["id"] and w.get("date") == today]
+    todays_ws = model["todays_workouts"]
     print(f"Workouts today: {len(todays_ws)}")
     if todays_ws:
         for w in todays_ws:
             print(f" - {w.get('type')} {w.get('duration_min')} min | PRs: {len(w.get('pr_flags', []))}")
+    elif model["last_workout_date"] is not None:
+        if (date.today() - model["last_workout_date"]).days >= 3:
+            print("Reminder: No workout recorded for 3+ days.")
     else:
-        recent = []
-        for w in workouts:
-            if w.get("user_id") != user["id"]:
-                continue
-            try:
-                d = datetime.strptime(w.get("date", ""), "%Y-%m-%d").date()
-                recent.append(d)
-            except Exception:
-                pass
-        if recent:
-            last = max(recent)
-            if (date.today() - last).days >= 3:
-                print("Reminder: No workout recorded for 3+ days.")
-        else:
-            print("Reminder: No workouts logged yet.")
+        print("Reminder: No workouts logged yet.")
 
-    cal = daily_calorie_summary(meals, user["id"], today)
+    cal = model["calories"]
     print(f"Calories today: {cal['total_calories']}")
 
-    goal_cals = user.get("goal", {}).get("daily_calorie_goal")
+    goal_cals = model["daily_calorie_goal"]
     if goal_cals:
         diff = cal["total_calories"] - float(goal_cals)
         status = "surplus" if diff > 0 else "deficit"
         print(f"Calorie goal: {goal_cals} → {abs(diff):.1f} {status}")
 
-    try:
-        gp = goal_progress(users, metrics, user["id"])
-        if gp.get("progress_pct") is not None:
-            print(f"Goal progress: {gp['progress_pct']}% (target {gp.get('target_weight_kg')} kg)")
-            if gp.get("projected_end_date"):
-                print(f"Projected completion: {gp['projected_end_date']}")
-        else:
-            print(f"Goal progress: {gp.get('message', 'N/A')}")
-    except Exception:
+    gp = model["goal_progress"]
+    if gp is None:
         print("Goal progress: N/A")
+    elif gp.get("progress_pct") is not None:
+        print(f"Goal progress: {gp['progress_pct']}% (target {gp.get('target_weight_kg')} kg)")
+        if gp.get("projected_end_date"):
+            print(f"Projected completion: {gp['projected_end_date']}")
+    else:
+        print(f"Goal progress: {gp.get('message', 'N/A')}")
 
     divider()
 
@@ -211,6 +255,8 @@ def workout_menu(workouts: list, user: dict) -> None:
         print("3) Delete workout")
         print("4) Weekly summary")
         print("5) Personal records")
+        print("6) Records per exercise / distance")
+        print("7) Training load (12 months + acute:chronic ratio)")
         print("0) Back")
         choice = prompt("> ")
 
@@ -251,7 +297,7 @@ def workout_menu(workouts: list, user: dict) -> None:
             if not validate_workout_entry({"id": "tmp", **workout_data}):
                 print("❌ Invalid workout entry.")
                 continue
-            if prevent_duplicate(workouts, ["user_id", "date", "type"], workout_data):
+            if prevent_duplicate(workouts, UNIQUE_KEYS["workouts"], workout_data):
                 print("❌ Duplicate workout (same date & type).")
                 continue
 
@@ -288,6 +334,21 @@ def workout_menu(workouts: list, user: dict) -> None:
         elif choice == "5":
             print(personal_records(workouts, user["id"]))
 
+        elif choice == "6":
+            print(exercise_records(workouts, user["id"]))
+
+        elif choice == "7":
+            months = []
+            m = date.today().replace(day=1)
+            for _ in range(12):
+                months.insert(0, m.strftime("%Y-%m"))
+                m = (m - timedelta(days=1)).replace(day=1)
+            loads = [monthly_workout_summary(workouts, user["id"], mo)["intensity_score"] for mo in months]
+            print("Monthly load:", dict(zip(months, loads)))
+            print("Chart:", generate_ascii_chart(loads))
+            print(rolling_load(workouts, user["id"]))
+            print(acute_chronic_ratio(workouts, user["id"]))
+
         elif choice == "0":
             return
         else:
@@ -337,7 +398,7 @@ def nutrition_menu(meals: list, user: dict) -> None:
             if not validate_meal_entry({"id": "tmp", **meal_data}):
                 print("❌ Invalid meal entry.")
                 continue
-            if prevent_duplicate(meals, ["user_id", "timestamp", "meal_type"], meal_data):
+            if prevent_duplicate(meals, UNIQUE_KEYS["nutrition"], meal_data):
                 print("❌ Duplicate meal (same timestamp & type).")
                 continue
 
@@ -400,7 +461,7 @@ def metrics_menu(metrics: list, users: list, user: dict) -> None:
             if not validate_metric_entry({"id": "tmp", **entry}):
                 print("❌ Invalid metric entry.")
                 continue
-            if prevent_duplicate(metrics, ["user_id", "date", "type"], entry):
+            if prevent_duplicate(metrics, UNIQUE_KEYS["metrics"], entry):
                 print("❌ Duplicate metric (same date & type).")
                 continue
 
@@ -414,21 +475,13 @@ def metrics_menu(metrics: list, users: list, user: dict) -> None:
             print(metrics_summary(metrics, user["id"], mtype, (start, end)))
 
         elif choice == "3":
-            weights = []
-            for e in metrics:
-                if e.get("user_id") == user["id"] and e.get("type") == "weight_kg":
-                    try:
-                        dt = datetime.strptime(e.get("date", ""), "%Y-%m-%d").date()
-                        weights.append((dt, float(e.get("value"))))
-                    except Exception:
-                        pass
-            weights.sort(key=lambda x: x[0])
+            weights = metric_history(metrics, user["id"], "weight_kg", last=21)
             if not weights:
                 print("No weight data.")
                 continue
 
-            vals = [v for _, v in weights][-21:]
-            ma = moving_average(vals, 7)
+            vals = [v for _, v in weights]
+            ma = moving_average(vals, 7, dates=[d for d, _ in weights])
             print("Weight values:", [round(x, 2) for x in vals])
             print("7-day MA:", [round(x, 2) for x in ma])
             print("Chart:", generate_ascii_chart(ma))
@@ -465,7 +518,7 @@ def list_user_entries(workouts: list, meals: list, metrics: list, user_id: str)
 
 
 def main() -> None:
-    users, workouts, meals, metrics = load_state(BASE_DIR)
+    users, workouts, meals, metrics = open_state()
     current_user = None
     unsaved = False
 
@@ -482,19 +535,24 @@ def main() -> None:
             u = register_flow(users)
             if u:
                 current_user = u
+                load_user_shard(BASE_DIR, u["id"], workouts, meals, metrics)
                 unsaved = True
         elif choice == "2":
             u = login_flow(users)
             if u:
                 current_user = u
+                load_user_shard(BASE_DIR, u["id"], workouts, meals, metrics)
         elif choice == "3":
+            # In sqlite mode this drops changes left unsaved at logout; an
+            # open write transaction would lock out the reload.
+            close_state(users, workouts, meals, metrics)
             ok = restore_latest_backup(BASE_DIR, os.path.join(BASE_DIR, "backups"))
             print("✅ Restored." if ok else "No backups found.")
-            users, workouts, meals, metrics = load_state(BASE_DIR)
+            users, workouts, meals, metrics = open_state()
             unsaved = False
         elif choice == "0":
             if unsaved and prompt("Unsaved changes. Save before exit? (y/n): ").lower() == "y":
-                save_state(BASE_DIR, users, workouts, meals, metrics)
+                persist_state(users, workouts, meals, metrics)
                 print("✅ Saved.")
             print("Bye.")
             return
@@ -516,28 +574,32 @@ def main() -> None:
             c = prompt("> ")
 
             if c == "1":
-                workout_menu(workouts, current_user); unsaved = True
+                workout_menu(workouts, current_user)
+                unsaved = has_unsaved_changes(users, workouts, meals, metrics)
             elif c == "2":
-                nutrition_menu(meals, current_user); unsaved = True
+                nutrition_menu(meals, current_user)
+                unsaved = has_unsaved_changes(users, workouts, meals, metrics)
             elif c == "3":
-                metrics_menu(metrics, users, current_user); unsaved = True
+                metrics_menu(metrics, users, current_user)
+                unsaved = has_unsaved_changes(users, workouts, meals, metrics)
             elif c == "4":
-                goal_menu(users, current_user); unsaved = True
+                goal_menu(users, current_user)
+                unsaved = has_unsaved_changes(users, workouts, meals, metrics)
             elif c == "5":
                 list_user_entries(workouts, meals, metrics, current_user["id"])
             elif c == "6":
-                save_state(BASE_DIR, users, workouts, meals, metrics)
+                persist_state(users, workouts, meals, metrics)
                 unsaved = False
                 print("✅ Saved.")
             elif c == "7":
                 if unsaved and prompt("Unsaved changes. Save before logout? (y/n): ").lower() == "y":
-                    save_state(BASE_DIR, users, workouts, meals, metrics)
+                    persist_state(users, workouts, meals, metrics)
                     unsaved = False
                     print("✅ Saved.")
                 current_user = None
             elif c == "0":
                 if unsaved and prompt("Unsaved changes. Save before exit? (y/n): ").lower() == "y":
-                    save_state(BASE_DIR, users, workouts, meals, metrics)
+                    persist_state(users, workouts, meals, metrics)
                     print("✅ Saved.")
                 return
             else:
@@ -545,4 +607,8 @@ def main() -> None:
 
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        import cli
+
+        sys.exit(cli.main(sys.argv[1:]))
     main()
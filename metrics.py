@@ -1,7 +1,18 @@
 from __future__ import annotations
 
 import uuid
-from datetime import datetime, timedelta
+from bisect import bisect_left
+from datetime import date, timedelta
+
+import columnar
+import instrument
+import rolling
+import sqlite_store
+from cache import cached
+from dates import parse_date
+from indexes import date_index
+from instrument import timed
+from records import emit, find_record
 
 
 def log_metric(metrics: list, metric_data: dict) -> dict:
@@ -9,67 +20,150 @@ def log_metric(metrics: list, metric_data: dict) -> dict:
     entry["id"] = entry.get("id") or str(uuid.uuid4())
     entry.setdefault("allow_future", False)
     metrics.append(entry)
+    emit(metrics, "put", entry)
     return entry
 
 
+@timed()
+@cached()
 def metrics_summary(metrics: list, user_id: str, metric_type: str, period: tuple[str, str]) -> dict:
     start, end = period
-    start_d = datetime.strptime(start, "%Y-%m-%d").date()
-    end_d = datetime.strptime(end, "%Y-%m-%d").date()
+    start_d = parse_date(start)
+    end_d = parse_date(end)
 
-    values = []
-    for e in metrics:
-        if e.get("user_id") != user_id or e.get("type") != metric_type:
-            continue
-        try:
-            d = datetime.strptime(e.get("date", ""), "%Y-%m-%d").date()
-        except Exception:
-            continue
-        if start_d <= d <= end_d:
-            values.append((d, float(e.get("value"))))
+    stats = None
+    db = getattr(metrics, "db", None)
+    cols = None if db is not None else columnar.metric_columns(metrics)
+    if db is not None:
+        rows = sqlite_store.metric_values(db, user_id, metric_type, start_d.isoformat(), end_d.isoformat())
+        values = [(parse_date(d), v) for d, v in rows]
+    elif cols is not None:
+        values = []
+        s = cols.series((user_id, metric_type))
+        if s is not None:
+            days, vals = s.between(start_d, end_d)
+            if len(vals):
+                values = list(zip(columnar.to_dates(days), vals.tolist()))
+                stats = (float(vals.min()), float(vals.max()), float(vals.mean()))
+    else:
+        ix = date_index(metrics)
+        if ix is not None:
+            in_range = ix.range((user_id, metric_type), start_d.toordinal(), end_d.toordinal() + 1)
+            instrument.scanned(len(in_range))
+            values = [(parse_date(e["date"]), float(e.get("value"))) for e in in_range]
+        else:
+            instrument.scanned(len(metrics))
+            values = []
+            for e in metrics:
+                if e.get("user_id") != user_id or e.get("type") != metric_type:
+                    continue
+                try:
+                    d = parse_date(e.get("date", ""))
+                except Exception:
+                    continue
+                if start_d <= d <= end_d:
+                    values.append((d, float(e.get("value"))))
 
-    values.sort(key=lambda x: x[0])
+            values.sort(key=lambda x: x[0])
 
     if not values:
         return {"type": metric_type, "period": {"start": start, "end": end}, "count": 0, "min": None, "max": None, "avg": None, "values": []}
 
-    only = [v for _, v in values]
+    if stats is None:
+        only = [v for _, v in values]
+        stats = (min(only), max(only), sum(only) / len(only))
+    lo, hi, avg = stats
     return {
         "type": metric_type,
         "period": {"start": start, "end": end},
-        "count": len(only),
-        "min": round(min(only), 2),
-        "max": round(max(only), 2),
-        "avg": round(sum(only) / len(only), 2),
+        "count": len(values),
+        "min": round(lo, 2),
+        "max": round(hi, 2),
+        "avg": round(avg, 2),
         "values": [{"date": d.strftime("%Y-%m-%d"), "value": v} for d, v in values],
     }
 
 
-def goal_progress(users: list, metrics: list, user_id: str) -> dict:
-    user = next((u for u in users if u.get("id") == user_id), None)
-    if not user:
-        raise ValueError("User not found.")
-
-    goal = user.get("goal", {})
-    gtype = goal.get("type", "maintenance")
-    target = goal.get("target_weight_kg")
-
+def _weight_scan(metrics: list, user_id: str) -> tuple | None:
+    instrument.scanned(len(metrics))
     weights = []
     for e in metrics:
         if e.get("user_id") == user_id and e.get("type") == "weight_kg":
             try:
-                d = datetime.strptime(e.get("date", ""), "%Y-%m-%d").date()
+                d = parse_date(e.get("date", ""))
                 weights.append((d, float(e.get("value"))))
             except Exception:
                 pass
     weights.sort(key=lambda x: x[0])
-
     if not weights:
-        return {"goal_type": gtype, "message": "No weight data yet.", "progress_pct": None, "projected_end_date": None}
-
-    start_weight = weights[0][1]
-    current_weight = weights[-1][1]
+        return None
     current_date = weights[-1][0]
+    recent = [x for x in weights if x[0] >= (current_date - timedelta(days=14))]
+    return weights[0][1], current_date, weights[-1][1], recent
+
+
+def _weight_inputs(ix, user_id: str) -> tuple | None:
+    """Start weight, current date and weight, and the endpoints of the last 14
+    days, read off the sorted date index without copying the user's history."""
+    keys, recs = ix.entries((user_id, "weight_kg"))
+
+    def weight(i: int) -> float | None:
+        try:
+            return float(recs[i].get("value"))
+        except (TypeError, ValueError):
+            return None
+
+    first = next((i for i in range(len(recs)) if weight(i) is not None), None)
+    if first is None:
+        return None
+    last = next(i for i in range(len(recs) - 1, -1, -1) if weight(i) is not None)
+    current_date = date.fromordinal(keys[last][0])
+    lo = bisect_left(keys, ((current_date - timedelta(days=14)).toordinal(),))
+    since = next(i for i in range(lo, last + 1) if weight(i) is not None)
+    recent = [(date.fromordinal(keys[i][0]), weight(i)) for i in (since, last)] if since < last else []
+    return weight(first), current_date, weight(last), recent
+
+
+@timed()
+@cached(2)
+def goal_progress(users: list, metrics: list, user_id: str) -> dict:
+    user = find_record(users, user_id)
+    if not user:
+        raise ValueError("User not found.")
+
+    goal = user.get("goal", {})
+    gtype = goal.get("type", "maintenance")
+    target = goal.get("target_weight_kg")
+
+    db = getattr(metrics, "db", None)
+    cols = None if db is not None else columnar.metric_columns(metrics)
+    if db is not None:
+        ends = sqlite_store.weight_endpoints(db, user_id)
+        if not ends:
+            return {"goal_type": gtype, "message": "No weight data yet.", "progress_pct": None, "projected_end_date": None}
+        (_, start_weight), (last_s, current_weight) = ends
+        current_date = parse_date(last_s)
+        since = (current_date - timedelta(days=14)).isoformat()
+        recent = [
+            (parse_date(d), v)
+            for d, v in sqlite_store.metric_values(db, user_id, "weight_kg", since, last_s)
+        ]
+    elif cols is not None:
+        s = cols.series((user_id, "weight_kg"))
+        if s is None:
+            return {"goal_type": gtype, "message": "No weight data yet.", "progress_pct": None, "projected_end_date": None}
+        days, vals = s.days, s.values
+        start_weight, current_weight = float(vals[0]), float(vals[-1])
+        current_date = days[-1].item()
+        # Only the endpoints of the last 14 days feed the slope below.
+        i = s.index_since(14)
+        recent = [(days[j].item(), float(vals[j])) for j in (i, len(s) - 1)] if len(s) - i >= 2 else []
+    else:
+        ix = date_index(metrics)
+        ends = _weight_inputs(ix, user_id) if ix is not None else _weight_scan(metrics, user_id)
+        if ends is None:
+            return {"goal_type": gtype, "message": "No weight data yet.", "progress_pct": None, "projected_end_date": None}
+        start_weight, current_date, current_weight, recent = ends
 
     if gtype in ("weight_loss", "muscle_gain") and target:
         target = float(target)
@@ -78,10 +172,9 @@ def goal_progress(users: list, metrics: list, user_id: str) -> dict:
         progress = (done / total_needed * 100) if total_needed else 100.0
         progress = max(0.0, min(100.0, progress))
 
-        last_n = [x for x in weights if x[0] >= (current_date - timedelta(days=14))]
-        if len(last_n) >= 2:
-            days = (last_n[-1][0] - last_n[0][0]).days or 1
-            delta = last_n[-1][1] - last_n[0][1]
+        if len(recent) >= 2:
+            days = (recent[-1][0] - recent[0][0]).days or 1
+            delta = recent[-1][1] - recent[0][1]
             daily = delta / days
         else:
             daily = 0.0
@@ -105,17 +198,52 @@ def goal_progress(users: list, metrics: list, user_id: str) -> dict:
     return {"goal_type": gtype, "message": "Goal type is not weight-based or target not set.", "progress_pct": None, "projected_end_date": None}
 
 
-def moving_average(values: list[float], window: int = 7) -> list[float]:
+@timed()
+def moving_average(values: list[float], window: int = 7, dates: list | None = None) -> list[float]:
+    """Trailing mean over the last ``window`` values, or the last ``window``
+    calendar days when the values' ``dates`` are given (in date order)."""
+    if dates is not None:
+        return rolling.time_sma(zip(dates, values), max(window, 1))
     if window <= 1:
         return values[:]
-    out = []
-    for i in range(len(values)):
-        start = max(0, i - window + 1)
-        chunk = values[start : i + 1]
-        out.append(sum(chunk) / len(chunk))
-    return out
+    if columnar.np is not None and len(values) >= columnar.VECTORIZE_MIN:
+        return columnar.moving_average(values, window).tolist()
+    return rolling.sma(values, window)
+
+
+@timed()
+@cached()
+def metric_history(metrics: list, user_id: str, metric_type: str, last: int | None = None) -> list[tuple]:
+    """(date, value) pairs for one metric in date order, optionally only the ``last`` few."""
+    db = getattr(metrics, "db", None)
+    cols = None if db is not None else columnar.metric_columns(metrics)
+    if db is not None:
+        rows = sqlite_store.metric_values(db, user_id, metric_type, "0000-01-01", "9999-12-31")
+        values = [(parse_date(d), v) for d, v in rows]
+    elif cols is not None:
+        s = cols.series((user_id, metric_type))
+        if s is None:
+            return []
+        days, vals = s.days, s.values
+        if last is not None:
+            days, vals = days[-last:], vals[-last:]
+        return list(zip(columnar.to_dates(days), vals.tolist()))
+    else:
+        ix = date_index(metrics)
+        entries = metrics if ix is None else ix.all((user_id, metric_type))
+        instrument.scanned(len(entries))
+        values = []
+        for e in entries:
+            if e.get("user_id") == user_id and e.get("type") == metric_type:
+                try:
+                    values.append((parse_date(e.get("date", "")), float(e.get("value"))))
+                except Exception:
+                    pass
+        values.sort(key=lambda x: x[0])
+    return values if last is None else values[-last:]
 
 
+@timed()
 def generate_ascii_chart(values: list[float]) -> str:
     if not values:
         return "(no data)"
@@ -1,7 +1,14 @@
 from __future__ import annotations
 
 import uuid
-from datetime import datetime
+
+import instrument
+import sqlite_store
+from cache import cached
+from dates import parse_date, parse_datetime
+from indexes import MEAL_TYPES, meal_rollups
+from instrument import timed
+from records import emit, find_record, remove_record
 
 
 def log_meal(meals: list, meal_data: dict) -> dict:
@@ -9,29 +16,60 @@ def log_meal(meals: list, meal_data: dict) -> dict:
     meal["id"] = meal.get("id") or str(uuid.uuid4())
     meal.setdefault("allow_future", False)
     meals.append(meal)
+    emit(meals, "put", meal)
     return meal
 
 
 def update_meal(meals: list, meal_id: str, updates: dict) -> dict:
-    m = next((x for x in meals if x.get("id") == meal_id), None)
+    m = find_record(meals, meal_id)
     if not m:
         raise ValueError("Meal not found.")
     m.update(updates)
+    emit(meals, "put", m)
     return m
 
 
 def delete_meal(meals: list, meal_id: str) -> bool:
-    idx = next((i for i, x in enumerate(meals) if x.get("id") == meal_id), None)
-    if idx is None:
+    m = remove_record(meals, meal_id)
+    if m is None:
         return False
-    meals.pop(idx)
+    emit(meals, "del", m)
     return True
 
 
+def _canonical_day(s: str) -> int | None:
+    # Only a canonical YYYY-MM-DD prefix can be answered from the day index.
+    try:
+        d = parse_date(s)
+    except (TypeError, ValueError):
+        return None
+    return d.toordinal() if d.isoformat() == s else None
+
+
+@timed()
+@cached()
 def daily_calorie_summary(meals: list, user_id: str, date: str) -> dict:
     total = 0.0
-    by_type = {"breakfast": 0.0, "lunch": 0.0, "dinner": 0.0, "snack": 0.0}
+    by_type = dict.fromkeys(MEAL_TYPES, 0.0)
 
+    db = getattr(meals, "db", None)
+    if db is not None:
+        for mt, cals in sqlite_store.calories_by_meal_type(db, user_id, date).items():
+            total += cals
+            if mt in by_type:
+                by_type[mt] += cals
+        return {"date": date, "total_calories": round(total, 1), "by_meal_type": {k: round(v, 1) for k, v in by_type.items()}}
+
+    rollups = meal_rollups(meals)
+    day = _canonical_day(date) if rollups is not None else None
+    if day is not None:
+        totals = rollups.day(user_id, day)
+        if totals is not None:
+            total = totals["calories"]
+            by_type.update(totals["by_meal_type"])
+        return {"date": date, "total_calories": round(total, 1), "by_meal_type": {k: round(v, 1) for k, v in by_type.items()}}
+
+    instrument.scanned(len(meals))
     for m in meals:
         if m.get("user_id") != user_id:
             continue
@@ -46,29 +84,44 @@ def daily_calorie_summary(meals: list, user_id: str, date: str) -> dict:
     return {"date": date, "total_calories": round(total, 1), "by_meal_type": {k: round(v, 1) for k, v in by_type.items()}}
 
 
+@timed()
+@cached()
 def macro_breakdown(meals: list, user_id: str, date_range: tuple[str, str]) -> dict:
     start, end = date_range
-    start_d = datetime.strptime(start, "%Y-%m-%d").date()
-    end_d = datetime.strptime(end, "%Y-%m-%d").date()
+    start_d = parse_date(start)
+    end_d = parse_date(end)
 
     protein = carbs = fat = calories = 0.0
 
-    for m in meals:
-        if m.get("user_id") != user_id:
-            continue
-        ts = m.get("timestamp", "")
-        try:
-            d = datetime.strptime(ts, "%Y-%m-%d %H:%M").date()
-        except Exception:
-            continue
-        if not (start_d <= d <= end_d):
-            continue
-
-        calories += float(m.get("calories", 0))
-        macros = m.get("macros", {})
-        protein += float(macros.get("protein_g", 0))
-        carbs += float(macros.get("carbs_g", 0))
-        fat += float(macros.get("fat_g", 0))
+    db = getattr(meals, "db", None)
+    rollups = None if db is not None else meal_rollups(meals)
+    if db is not None:
+        calories, protein, carbs, fat = sqlite_store.macro_totals(db, user_id, start_d.isoformat(), end_d.isoformat())
+    elif rollups is not None:
+        for totals in rollups.days(user_id, start_d.toordinal(), end_d.toordinal()):
+            cal, p, c, f = totals["macros"]
+            calories += cal
+            protein += p
+            carbs += c
+            fat += f
+    else:
+        instrument.scanned(len(meals))
+        for m in meals:
+            if m.get("user_id") != user_id:
+                continue
+            ts = m.get("timestamp", "")
+            try:
+                d = parse_datetime(ts).date()
+            except Exception:
+                continue
+            if not (start_d <= d <= end_d):
+                continue
+
+            calories += float(m.get("calories", 0))
+            macros = m.get("macros", {})
+            protein += float(macros.get("protein_g", 0))
+            carbs += float(macros.get("carbs_g", 0))
+            fat += float(macros.get("fat_g", 0))
 
     total_macros = protein + carbs + fat
     pct = {
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
 import uuid
-from datetime import date, datetime
+from datetime import date
+
+from dates import parse_date
+from records import emit, find_record
 
 
 def load_users(path: str) -> list:
@@ -61,6 +64,7 @@ def register_user(users: list, profile: dict) -> dict:
         },
     }
     users.append(user)
+    emit(users, "put", user)
     return user
 
 
@@ -74,7 +78,7 @@ def authenticate_user(users: list, email: str, pin: str) -> dict | None:
 
 
 def update_goal(users: list, user_id: str, goal_data: dict) -> dict:
-    user = next((u for u in users if u.get("id") == user_id), None)
+    user = find_record(users, user_id)
     if not user:
         raise ValueError("User not found.")
 
@@ -86,9 +90,9 @@ def update_goal(users: list, user_id: str, goal_data: dict) -> dict:
     end_date_s = goal_data.get("end_date", user["goal"].get("end_date"))
 
     try:
-        datetime.strptime(start_date_s, "%Y-%m-%d")
+        parse_date(start_date_s)
         if end_date_s:
-            datetime.strptime(end_date_s, "%Y-%m-%d")
+            parse_date(end_date_s)
     except Exception as exc:
         raise ValueError("Dates must be YYYY-MM-DD.") from exc
 
@@ -111,4 +115,5 @@ def update_goal(users: list, user_id: str, goal_data: dict) -> dict:
         "start_date": start_date_s,
         "end_date": end_date_s,
     }
+    emit(users, "put", user)
     return user
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+# Deleted slots hold this until the next compaction so a delete never shifts
+# the rest of the list.
+_TOMBSTONE = object()
+COMPACT_MIN_TOMBSTONES = 64
+
+
+class TrackedList(list):
+    """A collection list that tells its listeners about every mutation.
+
+    ``load_state`` returns these so storage and indexes can follow the
+    ``log_*``/``update_*``/``delete_*`` functions. Plain lists still work
+    everywhere; they just have nobody listening.
+
+    Records are also indexed by ``id``: ``by_id`` is a dict lookup and
+    ``discard`` leaves a tombstone that iteration and ``len`` skip. Anything
+    positional (indexing, slicing, sorting, ...) compacts first, so callers
+    never see a tombstone.
+
+    Secondary indexes in ``indexes`` are kept current by ``emit``. Bulk
+    changes that bypass ``emit`` (``extend``, positional edits) drop them so
+    they are rebuilt on next use.
+    """
+
+    def __init__(self, name: str, items=()):
+        super().__init__(items)
+        self.name = name
+        self.listeners: list = []
+        # ids put or deleted since the last save
+        self.dirty_ids: set = set()
+        self.indexes: dict = {}
+        self._dead = 0
+        self._reindex()
+
+    def _reindex(self) -> None:
+        self._pos = {r.get("id"): i for i, r in enumerate(list.__iter__(self))}
+
+    def compact(self) -> None:
+        if self._dead:
+            list.__setitem__(self, slice(None), [r for r in list.__iter__(self) if r is not _TOMBSTONE])
+            self._dead = 0
+            self._reindex()
+
+    def by_id(self, record_id) -> dict | None:
+        i = self._pos.get(record_id)
+        return None if i is None else list.__getitem__(self, i)
+
+    def discard(self, record_id) -> dict | None:
+        i = self._pos.pop(record_id, None)
+        if i is None:
+            return None
+        record = list.__getitem__(self, i)
+        list.__setitem__(self, i, _TOMBSTONE)
+        self._dead += 1
+        if self._dead >= max(COMPACT_MIN_TOMBSTONES, list.__len__(self) // 4):
+            self.compact()
+        return record
+
+    def append(self, record) -> None:
+        self._pos[record.get("id")] = list.__len__(self)
+        list.append(self, record)
+
+    def extend(self, records) -> None:
+        for r in records:
+            self.append(r)
+        self.indexes.clear()
+
+    def __iadd__(self, records):
+        self.extend(records)
+        return self
+
+    def __iter__(self):
+        if not self._dead:
+            return list.__iter__(self)
+        return (r for r in list.__iter__(self) if r is not _TOMBSTONE)
+
+    def __len__(self) -> int:
+        return list.__len__(self) - self._dead
+
+    def __reversed__(self):
+        self.compact()
+        return list.__reversed__(self)
+
+    def __getitem__(self, i):
+        self.compact()
+        return list.__getitem__(self, i)
+
+    def __eq__(self, other):
+        self.compact()
+        return list.__eq__(self, other)
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def __repr__(self) -> str:
+        self.compact()
+        return list.__repr__(self)
+
+    def copy(self) -> list:
+        return list(self)
+
+
+def _positional(name: str):
+    op = getattr(list, name)
+
+    def method(self, *args, **kwargs):
+        self.compact()
+        out = op(self, *args, **kwargs)
+        self._reindex()
+        self.indexes.clear()
+        return out
+
+    method.__name__ = name
+    return method
+
+
+for _name in ("__setitem__", "__delitem__", "__imul__", "insert", "pop", "remove", "clear", "sort", "reverse"):
+    setattr(TrackedList, _name, _positional(_name))
+
+
+def emit(items: list, op: str, record: dict) -> None:
+    # op is "put" (inserted or changed) or "del"
+    dirty = getattr(items, "dirty_ids", None)
+    if dirty is not None:
+        dirty.add(record.get("id"))
+    for ix in getattr(items, "indexes", {}).values():
+        ix.update(op, record)
+    for fn in getattr(items, "listeners", ()):
+        fn(items.name, op, record)
+
+
+def find_record(items: list, record_id) -> dict | None:
+    if isinstance(items, TrackedList):
+        return items.by_id(record_id)
+    return next((x for x in items if x.get("id") == record_id), None)
+
+
+def remove_record(items: list, record_id) -> dict | None:
+    if isinstance(items, TrackedList):
+        return items.discard(record_id)
+    idx = next((i for i, x in enumerate(items) if x.get("id") == record_id), None)
+    return None if idx is None else items.pop(idx)
+
+
+def is_dirty(items: list) -> bool:
+    # A plain list cannot tell us, so it always counts as changed.
+    return bool(getattr(items, "dirty_ids", True))
+
+
+def mark_clean(*collections: list) -> None:
+    for items in collections:
+        dirty = getattr(items, "dirty_ids", None)
+        if dirty is not None:
+            dirty.clear()
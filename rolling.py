@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import math
+from collections import deque
+
+from dates import parse_date
+
+# Rolling statistics in O(n). Every statistic comes as a one-shot function
+# over a list and as a primed generator you send() one value at a time:
+#
+#   avg = sma_stream(7)
+#   for v in readings:
+#       print(avg.send(v))
+#
+# Count windows cover the last ``window`` values. Time windows take
+# (date, value) pairs in date order and cover the last ``days`` calendar
+# days, the current one included, however many entries that is.
+
+# The running sum is recomputed from the window this often so float error
+# cannot build up over long streams.
+RESYNC_EVERY = 1024
+
+
+def _start(gen):
+    next(gen)
+    return gen
+
+
+def _primed(gen_fn):
+    def start(*args, **kwargs):
+        return _start(gen_fn(*args, **kwargs))
+    start.__name__ = gen_fn.__name__
+    start.__doc__ = gen_fn.__doc__
+    return start
+
+
+def _check_window(window) -> None:
+    if window < 1:
+        raise ValueError("Window must be at least 1.")
+
+
+def _ordinal(d) -> int:
+    return parse_date(d).toordinal() if isinstance(d, str) else d.toordinal()
+
+
+def _mean(window):
+    # Takes (key, value); keeps entries with key > newest key - window.
+    buf = deque()
+    total = 0.0
+    since_resync = 0
+    out = None
+    while True:
+        key, v = yield out
+        buf.append((key, v))
+        total += v
+        while buf[0][0] <= key - window:
+            total -= buf.popleft()[1]
+        since_resync += 1
+        if since_resync >= RESYNC_EVERY:
+            total = math.fsum(x for _, x in buf)
+            since_resync = 0
+        out = total / len(buf)
+
+
+def _extreme(window, keep_min: bool):
+    # Monotonic deque: values only increase (min) or decrease (max) from the
+    # front, so the front is always the answer and each value moves once.
+    buf = deque()
+    out = None
+    while True:
+        key, v = yield out
+        while buf and (buf[-1][1] >= v if keep_min else buf[-1][1] <= v):
+            buf.pop()
+        buf.append((key, v))
+        while buf[0][0] <= key - window:
+            buf.popleft()
+        out = buf[0][1]
+
+
+def _counted(inner):
+    i = 0
+    out = None
+    while True:
+        v = yield out
+        out = inner.send((i, v))
+        i += 1
+
+
+def _dated(inner):
+    last = None
+    out = None
+    while True:
+        d, v = yield out
+        key = _ordinal(d)
+        if last is not None and key < last:
+            raise ValueError("Points must be in date order.")
+        last = key
+        out = inner.send((key, v))
+
+
+@_primed
+def sma_stream(window: int):
+    """Mean of the last ``window`` values sent."""
+    _check_window(window)
+    yield from _counted(_start(_mean(window)))
+
+
+@_primed
+def ewma_stream(alpha: float):
+    """Exponentially weighted mean; the first value seeds it."""
+    if not 0 < alpha <= 1:
+        raise ValueError("Alpha must be in (0, 1].")
+    out = None
+    while True:
+        v = yield out
+        out = v if out is None else alpha * v + (1 - alpha) * out
+
+
+@_primed
+def rolling_min_stream(window: int):
+    _check_window(window)
+    yield from _counted(_start(_extreme(window, True)))
+
+
+@_primed
+def rolling_max_stream(window: int):
+    _check_window(window)
+    yield from _counted(_start(_extreme(window, False)))
+
+
+@_primed
+def time_sma_stream(days: int):
+    """Mean over the last ``days`` calendar days; send (date, value)."""
+    _check_window(days)
+    yield from _dated(_start(_mean(days)))
+
+
+@_primed
+def time_min_stream(days: int):
+    _check_window(days)
+    yield from _dated(_start(_extreme(days, True)))
+
+
+@_primed
+def time_max_stream(days: int):
+    _check_window(days)
+    yield from _dated(_start(_extreme(days, False)))
+
+
+def span_alpha(span: float) -> float:
+    """The alpha that gives an EWMA the same centre of mass as a ``span``-value SMA."""
+    return 2 / (span + 1)
+
+
+def _run(stream, items) -> list:
+    return [stream.send(x) for x in items]
+
+
+def sma(values, window: int) -> list[float]:
+    return _run(sma_stream(window), values)
+
+
+def ewma(values, alpha: float) -> list[float]:
+    return _run(ewma_stream(alpha), values)
+
+
+def rolling_min(values, window: int) -> list:
+    return _run(rolling_min_stream(window), values)
+
+
+def rolling_max(values, window: int) -> list:
+    return _run(rolling_max_stream(window), values)
+
+
+def time_sma(points, days: int) -> list[float]:
+    return _run(time_sma_stream(days), points)
+
+
+def time_min(points, days: int) -> list:
+    return _run(time_min_stream(days), points)
+
+
+def time_max(points, days: int) -> list:
+    return _run(time_max_stream(days), points)
@@ -0,0 +1,502 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import secrets
+import signal
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from functools import partial
+from urllib.parse import parse_qsl, urlsplit
+
+import instrument
+from records import find_record, is_dirty
+from storage import (
+    STORAGE_MODES,
+    close_state,
+    load_state,
+    save_state,
+    load_user_shard,
+    validate_workout_entry,
+    validate_meal_entry,
+    validate_metric_entry,
+    prevent_duplicate,
+    UNIQUE_KEYS,
+)
+from profiles import register_user, authenticate_user, update_goal
+from workouts import (
+    log_workout,
+    update_workout,
+    delete_workout,
+    detect_and_flag_prs,
+    weekly_workout_summary,
+    monthly_workout_summary,
+    workout_range_summary,
+    personal_records,
+    exercise_records,
+    rolling_load,
+    acute_chronic_ratio,
+)
+from nutrition import log_meal, update_meal, delete_meal, daily_calorie_summary, macro_breakdown
+from metrics import log_metric, metrics_summary, goal_progress, metric_history
+from dashboard import dashboard_model
+
+# HTTP/JSON front end on the stdlib alone (asyncio streams, HTTP/1.1 with
+# keep-alive). The data stays loaded in this one process:
+#
+#   python server.py --port 8080 --mode journal
+#
+# Everything that touches the collections, reads and writes alike, runs on
+# one worker thread, so the summaries never hold up the event loop and
+# never see a half-applied change. Writes also go through a single writer
+# task: it takes whatever writes are queued (up to MAX_BATCH), applies them
+# and saves once for all of them (group commit), and only then answers
+# them, so a 2xx on a write means it is on disk.
+#
+# POST /register and /login answer {"user": ..., "token": ...}; every other
+# route wants "Authorization: Bearer <token>" and works on that user's data.
+#
+#   POST   /register, /login              PUT  /goal
+#   POST   /workouts, /meals, /metrics    PATCH, DELETE  /workouts/<id>, /meals/<id>
+#   GET    /summary/weekly?week_start=  /summary/monthly?month=  /summary/range?start=&end=
+#   GET    /prs  /prs/exercises  /load?end=  /calories?date=  /macros?start=&end=
+#   GET    /metrics/summary?type=&start=&end=  /metrics/history?type=&last=
+#   GET    /goal-progress  /dashboard  /health  /stats?format=prometheus
+#
+# /stats dumps instrument's counters (start with FITNESS_INSTRUMENT=1).
+
+DEFAULT_BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PORT = 8080
+MAX_BATCH = 256
+MAX_BODY = 1 << 20
+
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found",
+           405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _encode(obj) -> bytes:
+    return json.dumps(obj, ensure_ascii=False, default=str).encode("utf-8")
+
+
+def _public(user: dict) -> dict:
+    return {k: v for k, v in user.items() if k != "pin"}
+
+
+def _param(query: dict, name: str, default=None):
+    v = query.get(name, default)
+    if v is None:
+        raise ValueError(f"Missing query parameter: {name}")
+    return v
+
+
+class Service:
+    """The loaded collections, the sessions and the writer task behind the routes."""
+
+    def __init__(self, base_dir: str, mode: str = "json", max_batch: int = MAX_BATCH, commit_delay: float = 0.0):
+        if mode not in STORAGE_MODES:
+            raise ValueError(f"Unknown storage mode: {mode}")
+        self.base_dir, self.mode = base_dir, mode
+        self.max_batch, self.commit_delay = max_batch, commit_delay
+        self.sessions: dict = {}  # token -> user id; only changed on the state thread
+        self.stats = {"reads": 0, "writes": 0, "commits": 0}
+        self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fitness-state")
+        self._queue: asyncio.Queue | None = None
+        self._writer: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        state = await self._call(load_state, self.base_dir, self.mode)
+        self.users, self.workouts, self.meals, self.metrics = state
+        self._queue = asyncio.Queue()
+        self._writer = asyncio.create_task(self._write_loop())
+
+    async def close(self) -> None:
+        """Finish the queued writes (and their save), then stop."""
+        if self._writer is not None:
+            self._queue.put_nowait(None)
+            await self._writer
+            self._writer = None
+            await self._call(close_state, self.users, self.workouts, self.meals, self.metrics)
+        self._pool.shutdown()
+
+    def _call(self, fn, *args):
+        return asyncio.get_running_loop().run_in_executor(self._pool, partial(fn, *args))
+
+    async def read(self, fn, *args) -> bytes:
+        # Encoded on the state thread too, before a later write can change the result.
+        self.stats["reads"] += 1
+        return await self._call(lambda: _encode(fn(self, *args)))
+
+    async def write(self, fn, *args) -> bytes:
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((partial(fn, self, *args), fut))
+        return await fut
+
+    async def _write_loop(self) -> None:
+        while True:
+            item = await self._queue.get()
+            if item is None:
+                return
+            if self.commit_delay:
+                await asyncio.sleep(self.commit_delay)
+            batch, stop = [item], False
+            while len(batch) < self.max_batch and not self._queue.empty():
+                item = self._queue.get_nowait()
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+
+            try:
+                outcomes = await self._call(self._apply, [fn for fn, _ in batch])
+            except Exception as exc:  # no future may be left waiting
+                outcomes = [(False, HTTPError(500, f"{type(exc).__name__}: {exc}"))] * len(batch)
+            for (_, fut), (ok, value) in zip(batch, outcomes):
+                if fut.done():  # the client went away
+                    continue
+                if ok:
+                    fut.set_result(value)
+                else:
+                    fut.set_exception(value)
+            if stop:
+                return
+
+    def _apply(self, ops: list) -> list:
+        # State thread: run one batch of writes, then save them together.
+        out = []
+        for op in ops:
+            try:
+                out.append((True, _encode(op())))
+            except Exception as exc:
+                out.append((False, exc))
+        self.stats["writes"] += len(ops)
+        if self.dirty():
+            try:
+                save_state(self.base_dir, self.users, self.workouts, self.meals, self.metrics, self.mode)
+            except Exception as exc:  # answered as a 500; the writer keeps going and retries with the next batch
+                failed = HTTPError(500, f"Save failed: {type(exc).__name__}: {exc}")
+                out = [(False, failed) if ok else (ok, value) for ok, value in out]
+            self.stats["commits"] += 1
+        return out
+
+    def dirty(self) -> bool:
+        return any(is_dirty(c) for c in (self.users, self.workouts, self.meals, self.metrics))
+
+    def login(self, user: dict) -> dict:
+        load_user_shard(self.base_dir, user["id"], self.workouts, self.meals, self.metrics)
+        token = secrets.token_urlsafe(24)
+        self.sessions[token] = user["id"]
+        return {"user": _public(user), "token": token}
+
+    def owned(self, items: list, user_id: str, record_id: str, what: str) -> dict:
+        rec = find_record(items, record_id)
+        if rec is None or rec.get("user_id") != user_id:
+            raise HTTPError(404, f"{what} not found.")
+        return rec
+
+    # --- HTTP -----------------------------------------------------------------
+
+    async def dispatch(self, method: str, target: str, headers: dict, body: bytes) -> tuple[int, bytes]:
+        url = urlsplit(target)
+        try:
+            if url.path == "/health":
+                return 200, _encode({"ok": True, "mode": self.mode, **self.stats})
+            if url.path == "/stats":
+                # Dumped on the state thread, which is the one adding to the counters.
+                fmt = dict(parse_qsl(url.query)).get("format", "json")
+                return 200, (await self._call(instrument.dump, fmt)).encode("utf-8")
+            route, params = _match(method, url.path)
+            uid = None
+            if route.auth:
+                scheme, _, token = headers.get("authorization", "").partition(" ")
+                uid = self.sessions.get(token) if scheme.lower() == "bearer" else None
+                if uid is None:
+                    raise HTTPError(401, "Log in first.")
+            payload = json.loads(body) if body else {}
+            if not isinstance(payload, dict):
+                raise ValueError("The body must be a JSON object.")
+            query = dict(parse_qsl(url.query))
+            run = self.write if route.write else self.read
+            return route.status, await run(route.fn, uid, params, query, payload)
+        except HTTPError as exc:
+            return exc.status, _encode({"error": str(exc)})
+        except (ValueError, TypeError, KeyError) as exc:
+            return 400, _encode({"error": str(exc)})
+        except Exception as exc:
+            return 500, _encode({"error": f"{type(exc).__name__}: {exc}"})
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                line = await reader.readline()
+                if not line.strip():
+                    break
+                headers = {}
+                while True:
+                    h = await reader.readline()
+                    if h in (b"\r\n", b"\n", b""):
+                        break
+                    k, _, v = h.decode("latin-1").partition(":")
+                    headers[k.strip().lower()] = v.strip()
+                try:
+                    method, target, version = line.decode("latin-1").split()
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    _respond(writer, 400, _encode({"error": "Malformed request."}), False)
+                    break
+                if length > MAX_BODY:
+                    _respond(writer, 413, _encode({"error": "Body too large."}), False)
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self.dispatch(method.upper(), target, headers, body)
+                conn = headers.get("connection", "").lower()
+                keep = conn == "keep-alive" if version == "HTTP/1.0" else conn != "close"
+                text = target.startswith("/stats") and "format=prometheus" in target
+                _respond(writer, status, payload, keep, "text/plain; version=0.0.4" if text else "application/json")
+                await writer.drain()
+                if not keep:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def _respond(writer: asyncio.StreamWriter, status: int, payload: bytes, keep: bool,
+             content_type: str = "application/json") -> None:
+    head = (
+        f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}\r\n"
+        f"Content-Type: {content_type}\r\nContent-Length: {len(payload)}\r\n"
+        f"Connection: {'keep-alive' if keep else 'close'}\r\n\r\n"
+    )
+    writer.write(head.encode("latin-1") + payload)
+
+
+# --- routes -------------------------------------------------------------------
+# Each takes (service, caller's user id, path params, query, JSON body) and
+# runs on the state thread.
+
+def api_register(svc: Service, uid, params, query, body) -> dict:
+    return svc.login(register_user(svc.users, body))
+
+
+def api_login(svc: Service, uid, params, query, body) -> dict:
+    user = authenticate_user(svc.users, body.get("email"), body.get("pin"))
+    if user is None:
+        raise HTTPError(401, "Invalid credentials.")
+    return svc.login(user)
+
+
+def api_goal(svc: Service, uid, params, query, body) -> dict:
+    return _public(update_goal(svc.users, uid, body))
+
+
+def api_log_workout(svc: Service, uid, params, query, body) -> dict:
+    entry = {"notes": "", "exercises": [], "allow_future": False, **body, "user_id": uid}
+    entry.pop("id", None)
+    if not validate_workout_entry({"id": "tmp", **entry}):
+        raise ValueError("Invalid workout entry.")
+    if prevent_duplicate(svc.workouts, UNIQUE_KEYS["workouts"], entry):
+        raise ValueError("Duplicate workout (same date & type).")
+    w = log_workout(svc.workouts, entry)
+    detect_and_flag_prs(svc.workouts, uid, w)
+    return w
+
+
+def api_log_meal(svc: Service, uid, params, query, body) -> dict:
+    entry = {"items": [], "macros": {}, "allow_future": False, **body, "user_id": uid}
+    entry.pop("id", None)
+    if not validate_meal_entry({"id": "tmp", **entry}):
+        raise ValueError("Invalid meal entry.")
+    if prevent_duplicate(svc.meals, UNIQUE_KEYS["nutrition"], entry):
+        raise ValueError("Duplicate meal (same timestamp & type).")
+    return log_meal(svc.meals, entry)
+
+
+def api_log_metric(svc: Service, uid, params, query, body) -> dict:
+    entry = {"allow_future": False, **body, "user_id": uid}
+    entry.pop("id", None)
+    if entry.get("type") == "mood" and isinstance(entry.get("value"), (int, float)):
+        entry["value"] = max(1, min(10, entry["value"]))
+    if not validate_metric_entry({"id": "tmp", **entry}):
+        raise ValueError("Invalid metric entry.")
+    if prevent_duplicate(svc.metrics, UNIQUE_KEYS["metrics"], entry):
+        raise ValueError("Duplicate metric (same date & type).")
+    return log_metric(svc.metrics, entry)
+
+
+def _updates(body: dict) -> dict:
+    return {k: v for k, v in body.items() if k not in ("id", "user_id")}
+
+
+def api_update_workout(svc: Service, uid, params, query, body) -> dict:
+    w = svc.owned(svc.workouts, uid, params["id"], "Workout")
+    updates = _updates(body)
+    if not validate_workout_entry({**w, **updates}):
+        raise ValueError("Invalid workout entry.")
+    return update_workout(svc.workouts, w["id"], updates)
+
+
+def api_update_meal(svc: Service, uid, params, query, body) -> dict:
+    m = svc.owned(svc.meals, uid, params["id"], "Meal")
+    updates = _updates(body)
+    if not validate_meal_entry({**m, **updates}):
+        raise ValueError("Invalid meal entry.")
+    return update_meal(svc.meals, m["id"], updates)
+
+
+def api_delete_workout(svc: Service, uid, params, query, body) -> dict:
+    return {"deleted": delete_workout(svc.workouts, svc.owned(svc.workouts, uid, params["id"], "Workout")["id"])}
+
+
+def api_delete_meal(svc: Service, uid, params, query, body) -> dict:
+    return {"deleted": delete_meal(svc.meals, svc.owned(svc.meals, uid, params["id"], "Meal")["id"])}
+
+
+def api_weekly(svc: Service, uid, params, query, body) -> dict:
+    today = date.today()
+    start = query.get("week_start") or (today - timedelta(days=today.weekday())).isoformat()
+    return weekly_workout_summary(svc.workouts, uid, start)
+
+
+def api_monthly(svc: Service, uid, params, query, body) -> dict:
+    return monthly_workout_summary(svc.workouts, uid, query.get("month") or date.today().strftime("%Y-%m"))
+
+
+def api_range(svc: Service, uid, params, query, body) -> dict:
+    return workout_range_summary(svc.workouts, uid, (_param(query, "start"), _param(query, "end")))
+
+
+def api_prs(svc: Service, uid, params, query, body) -> dict:
+    return personal_records(svc.workouts, uid)
+
+
+def api_exercise_records(svc: Service, uid, params, query, body) -> dict:
+    return exercise_records(svc.workouts, uid)
+
+
+def api_load(svc: Service, uid, params, query, body) -> dict:
+    end = query.get("end")
+    return {"rolling": rolling_load(svc.workouts, uid, end), "acwr": acute_chronic_ratio(svc.workouts, uid, end)}
+
+
+def api_calories(svc: Service, uid, params, query, body) -> dict:
+    return daily_calorie_summary(svc.meals, uid, query.get("date") or date.today().isoformat())
+
+
+def api_macros(svc: Service, uid, params, query, body) -> dict:
+    return macro_breakdown(svc.meals, uid, (_param(query, "start"), _param(query, "end")))
+
+
+def api_metrics_summary(svc: Service, uid, params, query, body) -> dict:
+    period = (_param(query, "start"), _param(query, "end"))
+    return metrics_summary(svc.metrics, uid, _param(query, "type"), period)
+
+
+def api_metric_history(svc: Service, uid, params, query, body) -> list:
+    last = query.get("last")
+    return metric_history(svc.metrics, uid, _param(query, "type"), int(last) if last else None)
+
+
+def api_goal_progress(svc: Service, uid, params, query, body) -> dict:
+    return goal_progress(svc.users, svc.metrics, uid)
+
+
+def api_dashboard(svc: Service, uid, params, query, body) -> dict:
+    user = find_record(svc.users, uid)
+    if user is None:
+        raise HTTPError(404, "User not found.")
+    return dashboard_model(user, svc.users, svc.workouts, svc.meals, svc.metrics)
+
+
+class _Route:
+    def __init__(self, method: str, path: str, fn, write: bool = False, auth: bool = True, status: int = 200):
+        self.method, self.fn, self.write, self.auth, self.status = method, fn, write, auth, status
+        self.pattern = re.compile("^" + re.sub(r"<(\w+)>", r"(?P<\1>[^/]+)", path) + "$")
+
+
+ROUTES = [
+    _Route("POST", "/register", api_register, write=True, auth=False, status=201),
+    _Route("POST", "/login", api_login, auth=False),
+    _Route("PUT", "/goal", api_goal, write=True),
+    _Route("POST", "/workouts", api_log_workout, write=True, status=201),
+    _Route("PATCH", "/workouts/<id>", api_update_workout, write=True),
+    _Route("DELETE", "/workouts/<id>", api_delete_workout, write=True),
+    _Route("POST", "/meals", api_log_meal, write=True, status=201),
+    _Route("PATCH", "/meals/<id>", api_update_meal, write=True),
+    _Route("DELETE", "/meals/<id>", api_delete_meal, write=True),
+    _Route("POST", "/metrics", api_log_metric, write=True, status=201),
+    _Route("GET", "/summary/weekly", api_weekly),
+    _Route("GET", "/summary/monthly", api_monthly),
+    _Route("GET", "/summary/range", api_range),
+    _Route("GET", "/prs", api_prs),
+    _Route("GET", "/prs/exercises", api_exercise_records),
+    _Route("GET", "/load", api_load),
+    _Route("GET", "/calories", api_calories),
+    _Route("GET", "/macros", api_macros),
+    _Route("GET", "/metrics/summary", api_metrics_summary),
+    _Route("GET", "/metrics/history", api_metric_history),
+    _Route("GET", "/goal-progress", api_goal_progress),
+    _Route("GET", "/dashboard", api_dashboard),
+]
+
+
+def _match(method: str, path: str) -> tuple[_Route, dict]:
+    allowed = False
+    for route in ROUTES:
+        m = route.pattern.match(path)
+        if m is None:
+            continue
+        if route.method == method:
+            return route, m.groupdict()
+        allowed = True
+    raise HTTPError(405 if allowed else 404, f"{method} {path} is not a route.")
+
+
+async def serve(base_dir: str, mode: str = "json", host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                max_batch: int = MAX_BATCH, commit_delay: float = 0.0) -> None:
+    """Run until SIGINT/SIGTERM; the queued writes are saved before it returns."""
+    svc = Service(base_dir, mode, max_batch, commit_delay)
+    await svc.start()
+    server = await asyncio.start_server(svc.handle, host, port)
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop.set)
+        except (NotImplementedError, RuntimeError):  # Windows, or not the main thread
+            pass
+    bound = server.sockets[0].getsockname()
+    print(json.dumps({"listening": f"http://{bound[0]}:{bound[1]}", "mode": mode}), flush=True)
+    try:
+        async with server:
+            await stop.wait()
+    finally:
+        await svc.close()
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Serve the fitness tracker over HTTP/JSON.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="0 picks a free port")
+    parser.add_argument("--base-dir", default=DEFAULT_BASE_DIR)
+    parser.add_argument("--mode", choices=STORAGE_MODES, default=os.environ.get("FITNESS_STORAGE", "json"))
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH, help="most writes saved together")
+    parser.add_argument("--commit-delay", type=float, default=0.0,
+                        help="seconds the writer waits for more writes before saving a batch")
+    args = parser.parse_args(argv)
+    asyncio.run(serve(args.base_dir, args.mode, args.host, args.port, args.max_batch, args.commit_delay))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,340 @@
+from __future__ import annotations
+
+import json
+import mmap
+import os
+import struct
+
+from records import TrackedList, _TOMBSTONE
+
+# Binary snapshot of one collection, opened with mmap and decoded a record at
+# a time. Layout (little-endian):
+#
+#   MAGIC, uint32 header length, JSON header (fields, row count, offsets)
+#   rows     fixed-width: layout, extras and int-mask words, then one slot per
+#            field, float64 for numbers and a uint32 string number for strings
+#   offsets  uint64 * (strings + 1) into the blob
+#   blob     every distinct string, UTF-8
+#
+# "layout" names a string holding the record's keys in order, as JSON, so a
+# record decodes with the same keys in the same order it was saved with.
+# Values that do not fit their field's slot (nested lists and dicts, None,
+# bools, a number stored as text, ...) go to the "extras" string as JSON.
+# Bit i of the int mask marks field i as an int rather than a float.
+
+MAGIC = b"FTSNAP1\0"
+NO_STRING = 0xFFFFFFFF
+
+FIELDS = {
+    "users": (("id", "str"), ("name", "str"), ("email", "str"), ("pin", "str"), ("age", "num"),
+              ("height_cm", "num"), ("weight_kg", "num"), ("activity_level", "str")),
+    "workouts": (("id", "str"), ("user_id", "str"), ("date", "str"), ("type", "str"), ("duration_min", "num"),
+                 ("notes", "str")),
+    "nutrition": (("id", "str"), ("user_id", "str"), ("timestamp", "str"), ("meal_type", "str"), ("calories", "num")),
+    "metrics": (("id", "str"), ("user_id", "str"), ("date", "str"), ("type", "str"), ("value", "num")),
+}
+
+
+def _row_struct(fields) -> struct.Struct:
+    return struct.Struct("<III" + "".join("d" if kind == "num" else "I" for _, kind in fields))
+
+
+def _fits(kind: str, v) -> bool:
+    if kind == "str":
+        return isinstance(v, str)
+    if isinstance(v, int) and not isinstance(v, bool):
+        return abs(v) <= 2**53  # exact as a float64
+    return isinstance(v, float)
+
+
+class _Encoder:
+    """Rows and string table of a snapshot being written."""
+
+    def __init__(self, key: str):
+        self.key = key
+        self.fields = FIELDS[key]
+        self._slot = {name: i for i, (name, _) in enumerate(self.fields)}
+        self._row = _row_struct(self.fields)
+        self._strings: dict = {}
+        self._renumbered: dict = {}  # string number in the source snapshot -> ours
+        self.rows = bytearray()
+        self.n = 0
+
+    def _intern(self, s: str) -> int:
+        return self._strings.setdefault(s, len(self._strings))
+
+    def add(self, r: dict) -> None:
+        fields = self.fields
+        values = [0.0 if kind == "num" else NO_STRING for _, kind in fields]
+        extras, ints = {}, 0
+        for k, v in r.items():
+            i = self._slot.get(k)
+            if i is None or not _fits(fields[i][1], v):
+                extras[k] = v
+            elif fields[i][1] == "str":
+                values[i] = self._intern(v)
+            else:
+                values[i] = float(v)
+                if isinstance(v, int):
+                    ints |= 1 << i
+        layout = self._intern(json.dumps(list(r), ensure_ascii=False, separators=(",", ":")))
+        extra = self._intern(json.dumps(extras, ensure_ascii=False, separators=(",", ":"))) if extras else NO_STRING
+        self.rows += self._row.pack(layout, extra, ints, *values)
+        self.n += 1
+
+    def copy(self, snap: Snapshot, i: int) -> None:
+        """Append row ``i`` of ``snap`` without decoding it; only its strings are renumbered."""
+        if snap.fields != list(self.fields):  # written with an older field list
+            return self.add(snap.record(i))
+        renumbered = self._renumbered
+
+        def renumber(n: int) -> int:
+            if n == NO_STRING:
+                return n
+            out = renumbered.get(n)
+            if out is None:
+                out = renumbered[n] = self._intern(snap.string(n))
+            return out
+
+        layout, extra, ints, *values = snap._row.unpack_from(snap._mm, snap._rows_at + i * snap._row.size)
+        values = [renumber(v) if kind == "str" else v for v, (_, kind) in zip(values, self.fields)]
+        self.rows += self._row.pack(renumber(layout), renumber(extra), ints, *values)
+        self.n += 1
+
+    def write(self, path: str) -> None:
+        encoded = [s.encode("utf-8") for s in self._strings]
+        offsets = [0]
+        for b in encoded:
+            offsets.append(offsets[-1] + len(b))
+        header = {"key": self.key, "fields": [list(f) for f in self.fields], "rows": self.n, "strings": len(encoded)}
+        head = json.dumps(header).encode("utf-8")
+        with open(path, "wb") as f:
+            f.write(MAGIC + struct.pack("<I", len(head)) + head)
+            f.write(self.rows)
+            f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+            f.write(b"".join(encoded))
+
+
+def write_snapshot(path: str, key: str, records) -> int:
+    """Write ``records`` to ``path`` (atomically); returns the record count.
+
+    A SnapshotList mapping ``path`` is saved with ``SnapshotList.save``.
+    """
+    if isinstance(records, SnapshotList):
+        return records.save(path)
+    enc = _Encoder(key)
+    for r in records:
+        enc.add(r)
+    enc.write(path + ".tmp")
+    os.replace(path + ".tmp", path)
+    return enc.n
+
+
+def _unique_rows(ids: list) -> dict:
+    """Row number of every id that is not None and names exactly one row."""
+    rows, shared = {}, set()
+    for n, x in enumerate(ids):
+        if x in rows:
+            shared.add(x)
+        rows[x] = n
+    for x in shared:
+        del rows[x]
+    rows.pop(None, None)
+    return rows
+
+
+class Snapshot:
+    """A snapshot file mapped into memory; nothing is decoded until asked for."""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        mm = self._mm
+        if mm[: len(MAGIC)] != MAGIC:
+            mm.close()
+            raise ValueError(f"Not a snapshot file: {path}")
+        (length,) = struct.unpack_from("<I", mm, len(MAGIC))
+        start = len(MAGIC) + 4
+        header = json.loads(mm[start : start + length])
+        self.key = header["key"]
+        self.fields = [tuple(f) for f in header["fields"]]
+        self.rows = header["rows"]
+        self._row = _row_struct(self.fields)
+        self._slot = {name: n for n, (name, _) in enumerate(self.fields)}
+        self._slot_at = []  # byte offset of each field within a row
+        at = 12
+        for _, kind in self.fields:
+            self._slot_at.append(at)
+            at += 8 if kind == "num" else 4
+        self._rows_at = start + length
+        self._offsets_at = self._rows_at + self.rows * self._row.size
+        self._blob_at = self._offsets_at + 8 * (header["strings"] + 1)
+        self._layouts: dict = {}
+
+    def string(self, i: int) -> str:
+        lo, hi = struct.unpack_from("<QQ", self._mm, self._offsets_at + 8 * i)
+        return self._mm[self._blob_at + lo : self._blob_at + hi].decode("utf-8")
+
+    def ids(self) -> list:
+        """The id of every row, in order, without decoding the rest."""
+        off = self._rows_at + self._slot_at[self._slot["id"]]
+        size, unpack = self._row.size, struct.Struct("<I").unpack_from
+        out = []
+        for r in range(self.rows):
+            (s,) = unpack(self._mm, off + r * size)
+            out.append(None if s == NO_STRING else self.string(s))
+        return out
+
+    def record(self, i: int) -> dict:
+        layout, extra, ints, *values = self._row.unpack_from(self._mm, self._rows_at + i * self._row.size)
+        keys = self._layouts.get(layout)
+        if keys is None:
+            keys = self._layouts[layout] = tuple(json.loads(self.string(layout)))
+        extras = json.loads(self.string(extra)) if extra != NO_STRING else {}
+        slot = self._slot
+        out = {}
+        for k in keys:
+            if k in extras:
+                out[k] = extras[k]
+                continue
+            n = slot[k]
+            v = values[n]
+            if self.fields[n][1] == "str":
+                out[k] = self.string(v)
+            else:
+                out[k] = int(v) if ints >> n & 1 else v
+        return out
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+class SnapshotList(TrackedList):
+    """A TrackedList whose records stay in the snapshot until first touched.
+
+    Undecoded slots hold their row number. Iteration and ``by_id`` decode
+    as they go and keep the result; anything positional decodes everything
+    first and then behaves like a TrackedList.
+    """
+
+    def __init__(self, name: str, snap: Snapshot):
+        self._snap = snap
+        self._pending = snap.rows
+        self._ids = None
+        super().__init__(name, range(snap.rows))
+
+    def _reindex(self) -> None:
+        if not self._pending:
+            return super()._reindex()
+        if self._ids is None:
+            self._ids = self._snap.ids()
+        ids = self._ids
+        self._pos = {(ids[r] if type(r) is int else r.get("id")): i for i, r in enumerate(list.__iter__(self))}
+
+    def _decode(self, i: int, r):
+        if type(r) is not int:
+            return r
+        rec = self._snap.record(r)
+        list.__setitem__(self, i, rec)
+        self._pending -= 1
+        if not self._pending:
+            self._ids = None
+        return rec
+
+    def save(self, path: str) -> int:
+        """Write the list to ``path`` and map the new file in place of the old one.
+
+        Rows never decoded, and decoded records whose id is not in
+        ``dirty_ids``, are copied from the current snapshot as they are;
+        only the others are encoded, as is a decoded record whose id is
+        None or shared by several rows. Returns the record count.
+        """
+        self.compact()
+        snap = self._snap
+        enc = _Encoder(self.name)
+        rows = None  # unique id -> row in snap, for decoded records
+        for r in list.__iter__(self):
+            if type(r) is int:
+                enc.copy(snap, r)
+                continue
+            rid = r.get("id")
+            if rid not in self.dirty_ids:
+                if rows is None:
+                    rows = _unique_rows(snap.ids())
+                n = rows.get(rid)
+                if n is not None:
+                    enc.copy(snap, n)
+                    continue
+            enc.add(r)
+        enc.write(path + ".tmp")
+
+        # Row k of the new file is slot k now that the list is compact.
+        snap.close()
+        os.replace(path + ".tmp", path)
+        self._snap = Snapshot(path)
+        self._ids = None
+        for k, r in enumerate(list.__iter__(self)):
+            if type(r) is int:
+                list.__setitem__(self, k, k)
+        return enc.n
+
+    def close(self) -> None:
+        """Unmap the snapshot; records not decoded by now are no longer readable."""
+        self._snap.close()
+
+    def materialize(self) -> None:
+        if self._pending:
+            for i in range(list.__len__(self)):
+                self._decode(i, list.__getitem__(self, i))
+
+    def __iter__(self):
+        if not self._pending:
+            return super().__iter__()
+        return self._iter_decoding()
+
+    def _iter_decoding(self):
+        i = 0
+        while i < list.__len__(self):
+            r = list.__getitem__(self, i)
+            if r is not _TOMBSTONE:
+                yield self._decode(i, r)
+            i += 1
+
+    def by_id(self, record_id) -> dict | None:
+        i = self._pos.get(record_id)
+        return None if i is None else self._decode(i, list.__getitem__(self, i))
+
+    def discard(self, record_id) -> dict | None:
+        self.by_id(record_id)
+        return super().discard(record_id)
+
+    def __getitem__(self, i):
+        self.materialize()
+        return super().__getitem__(i)
+
+    def __reversed__(self):
+        self.materialize()
+        return super().__reversed__()
+
+    def __eq__(self, other):
+        self.materialize()
+        return super().__eq__(other)
+
+    def __repr__(self) -> str:
+        self.materialize()
+        return super().__repr__()
+
+
+def _materializing(name: str):
+    op = getattr(TrackedList, name)
+
+    def method(self, *args, **kwargs):
+        self.materialize()
+        return op(self, *args, **kwargs)
+
+    method.__name__ = name
+    return method
+
+
+for _name in ("__setitem__", "__delitem__", "__imul__", "insert", "pop", "remove", "clear", "sort", "reverse"):
+    setattr(SnapshotList, _name, _materializing(_name))
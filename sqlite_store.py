@@ -0,0 +1,244 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from dates import parse_date, parse_datetime
+from records import TrackedList
+
+# Every row keeps the full record as JSON in ``doc`` so load round-trips
+# exactly; the other columns are extracted copies used for filtering.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS users (
+    id TEXT PRIMARY KEY,
+    email TEXT,
+    doc TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS workouts (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    date TEXT,
+    type TEXT,
+    duration_min REAL,
+    doc TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS exercises (
+    workout_id TEXT NOT NULL,
+    user_id TEXT,
+    pos INTEGER NOT NULL,
+    name TEXT,
+    sets INTEGER,
+    reps INTEGER,
+    weight_kg REAL,
+    distance_km REAL,
+    time_min REAL,
+    minutes REAL
+);
+CREATE TABLE IF NOT EXISTS meals (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    timestamp TEXT,
+    day TEXT,
+    meal_type TEXT,
+    calories REAL,
+    protein_g REAL,
+    carbs_g REAL,
+    fat_g REAL,
+    doc TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS metrics (
+    id TEXT PRIMARY KEY,
+    user_id TEXT,
+    date TEXT,
+    type TEXT,
+    value REAL,
+    doc TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_users_email ON users (email);
+CREATE INDEX IF NOT EXISTS idx_workouts_user_date ON workouts (user_id, date);
+CREATE INDEX IF NOT EXISTS idx_workouts_user_type_date ON workouts (user_id, type, date);
+CREATE INDEX IF NOT EXISTS idx_exercises_workout ON exercises (workout_id);
+CREATE INDEX IF NOT EXISTS idx_meals_user_ts ON meals (user_id, timestamp);
+CREATE INDEX IF NOT EXISTS idx_meals_user_day ON meals (user_id, day);
+CREATE INDEX IF NOT EXISTS idx_metrics_user_date ON metrics (user_id, date);
+CREATE INDEX IF NOT EXISTS idx_metrics_user_type_date ON metrics (user_id, type, date);
+"""
+
+# collection name -> table
+TABLES = {"users": "users", "workouts": "workouts", "nutrition": "meals", "metrics": "metrics"}
+
+_WORKOUT_WEIGHTS = "CASE type WHEN 'strength' THEN 2.0 WHEN 'cardio' THEN 1.5 ELSE 1.0 END"
+
+
+def _num(v) -> float | None:
+    try:
+        return float(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def _day(s, parse=parse_date) -> str | None:
+    # Normalized so string comparison in SQL matches the date comparison
+    # the list-based code does after parsing.
+    try:
+        return parse(s).strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        return None
+
+
+def connect(path: str) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def copy(path: str, dest: str) -> None:
+    """Write the database at ``path`` as of its last commit to ``dest``.
+
+    Uses a connection of its own, so a write transaction open elsewhere is
+    neither included nor disturbed.
+    """
+    src = sqlite3.connect(path)
+    out = sqlite3.connect(dest)
+    try:
+        src.backup(out)
+    finally:
+        out.close()
+        src.close()
+
+
+def close(conn: sqlite3.Connection) -> None:
+    """Drop whatever was never saved and release the file."""
+    conn.rollback()
+    conn.close()
+
+
+def is_empty(conn: sqlite3.Connection) -> bool:
+    return all(conn.execute(f"SELECT 1 FROM {t} LIMIT 1").fetchone() is None for t in TABLES.values())
+
+
+def put(conn: sqlite3.Connection, key: str, r: dict) -> None:
+    doc = json.dumps(r, ensure_ascii=False)
+    if key == "users":
+        conn.execute(
+            "INSERT INTO users (id, email, doc) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET email = excluded.email, doc = excluded.doc",
+            (r.get("id"), r.get("email"), doc),
+        )
+    elif key == "workouts":
+        conn.execute(
+            "INSERT INTO workouts (id, user_id, date, type, duration_min, doc) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET user_id = excluded.user_id, date = excluded.date, type = excluded.type, "
+            "duration_min = excluded.duration_min, doc = excluded.doc",
+            (r.get("id"), r.get("user_id"), _day(r.get("date")), r.get("type"), _num(r.get("duration_min", 0)), doc),
+        )
+        conn.execute("DELETE FROM exercises WHERE workout_id = ?", (r.get("id"),))
+        conn.executemany(
+            "INSERT INTO exercises (workout_id, user_id, pos, name, sets, reps, weight_kg, distance_km, time_min, minutes) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (r.get("id"), r.get("user_id"), i, ex.get("name"), ex.get("sets"), ex.get("reps"),
+                 _num(ex.get("weight_kg")), _num(ex.get("distance_km")), _num(ex.get("time_min")), _num(ex.get("minutes")))
+                for i, ex in enumerate(r.get("exercises") or [])
+                if isinstance(ex, dict)
+            ],
+        )
+    elif key == "nutrition":
+        macros = r.get("macros") or {}
+        conn.execute(
+            "INSERT INTO meals (id, user_id, timestamp, day, meal_type, calories, protein_g, carbs_g, fat_g, doc) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET user_id = excluded.user_id, timestamp = excluded.timestamp, day = excluded.day, "
+            "meal_type = excluded.meal_type, calories = excluded.calories, protein_g = excluded.protein_g, "
+            "carbs_g = excluded.carbs_g, fat_g = excluded.fat_g, doc = excluded.doc",
+            (r.get("id"), r.get("user_id"), r.get("timestamp", ""), _day(r.get("timestamp"), parse_datetime),
+             r.get("meal_type"), _num(r.get("calories", 0)), _num(macros.get("protein_g", 0)),
+             _num(macros.get("carbs_g", 0)), _num(macros.get("fat_g", 0)), doc),
+        )
+    elif key == "metrics":
+        conn.execute(
+            "INSERT INTO metrics (id, user_id, date, type, value, doc) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET user_id = excluded.user_id, date = excluded.date, type = excluded.type, "
+            "value = excluded.value, doc = excluded.doc",
+            (r.get("id"), r.get("user_id"), _day(r.get("date")), r.get("type"), _num(r.get("value")), doc),
+        )
+
+
+def delete(conn: sqlite3.Connection, key: str, r: dict) -> None:
+    conn.execute(f"DELETE FROM {TABLES[key]} WHERE id = ?", (r.get("id"),))
+    if key == "workouts":
+        conn.execute("DELETE FROM exercises WHERE workout_id = ?", (r.get("id"),))
+
+
+def import_collections(conn: sqlite3.Connection, collections: dict) -> None:
+    for key, items in collections.items():
+        for r in items:
+            put(conn, key, r)
+    conn.commit()
+
+
+def load(conn: sqlite3.Connection) -> tuple[TrackedList, ...]:
+    def write_through(key: str, op: str, record: dict) -> None:
+        (delete if op == "del" else put)(conn, key, record)
+
+    out = []
+    for key, table in TABLES.items():
+        items = TrackedList(key, (json.loads(doc) for (doc,) in conn.execute(f"SELECT doc FROM {table} ORDER BY rowid")))
+        # Summary functions push their queries down to SQL when they find this.
+        items.db = conn
+        items.listeners.append(write_through)
+        out.append(items)
+    return tuple(out)
+
+
+def workout_totals(conn: sqlite3.Connection, user_id: str, start: str, end: str) -> tuple[int, float, float, dict]:
+    """Count, minutes, intensity score and per-type counts for ``start <= date < end``."""
+    count, minutes, intensity = conn.execute(
+        f"SELECT COUNT(*), TOTAL(duration_min), TOTAL(duration_min * {_WORKOUT_WEIGHTS}) "
+        "FROM workouts WHERE user_id = ? AND date >= ? AND date < ?",
+        (user_id, start, end),
+    ).fetchone()
+    by_type = dict(
+        conn.execute(
+            "SELECT type, COUNT(*) FROM workouts WHERE user_id = ? AND date >= ? AND date < ? GROUP BY type",
+            (user_id, start, end),
+        ).fetchall()
+    )
+    return count, minutes, intensity, by_type
+
+
+def calories_by_meal_type(conn: sqlite3.Connection, user_id: str, prefix: str) -> dict:
+    # Same match as timestamp.startswith(prefix); timestamps are ASCII.
+    return dict(
+        conn.execute(
+            "SELECT meal_type, TOTAL(calories) FROM meals "
+            "WHERE user_id = ? AND timestamp >= ? AND timestamp < ? GROUP BY meal_type",
+            (user_id, prefix, prefix + "\x7f"),
+        ).fetchall()
+    )
+
+
+def macro_totals(conn: sqlite3.Connection, user_id: str, start: str, end: str) -> tuple[float, float, float, float]:
+    """Calories, protein, carbs and fat for meals with ``start <= day <= end``."""
+    return conn.execute(
+        "SELECT TOTAL(calories), TOTAL(protein_g), TOTAL(carbs_g), TOTAL(fat_g) FROM meals "
+        "WHERE user_id = ? AND day >= ? AND day <= ?",
+        (user_id, start, end),
+    ).fetchone()
+
+
+def metric_values(conn: sqlite3.Connection, user_id: str, metric_type: str, start: str, end: str) -> list[tuple[str, float]]:
+    return conn.execute(
+        "SELECT date, value FROM metrics WHERE user_id = ? AND type = ? AND date >= ? AND date <= ? "
+        "AND value IS NOT NULL ORDER BY date, rowid",
+        (user_id, metric_type, start, end),
+    ).fetchall()
+
+
+def weight_endpoints(conn: sqlite3.Connection, user_id: str) -> tuple[tuple[str, float], tuple[str, float]] | None:
+    """First and last weight entries in date order (ties keep insertion order)."""
+    base = "SELECT date, value FROM metrics WHERE user_id = ? AND type = 'weight_kg' AND date IS NOT NULL AND value IS NOT NULL "
+    first = conn.execute(base + "ORDER BY date, rowid LIMIT 1", (user_id,)).fetchone()
+    if first is None:
+        return None
+    last = conn.execute(base + "ORDER BY date DESC, rowid DESC LIMIT 1", (user_id,)).fetchone()
+    return first, last
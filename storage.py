@@ -1,10 +1,22 @@
 from __future__ import annotations
 
+import contextlib
+import gc
 import json
 import os
-import shutil
+import threading
 from datetime import datetime, date
-from typing import Tuple
+
+try:
+    import fcntl
+except ImportError:  # not on Windows; saves there are not locked against other processes
+    fcntl = None
+
+import dates
+import instrument
+from indexes import NutritionRollups, meal_rollups, unique_index
+from instrument import timed
+from records import TrackedList, is_dirty, mark_clean
 
 
 DATA_FILES = {
@@ -14,6 +26,47 @@ DATA_FILES = {
     "metrics": "metrics.json",
 }
 
+# Journal mode: mutations append one line per change to data/<key>.journal and
+# save_state only folds the journals into the JSON checkpoints once they grow.
+JOURNAL_COMPACT_BYTES = 1_000_000
+
+_journal_lock = threading.Lock()
+
+# "json" rewrites changed files on save, "journal" appends each change as it
+# happens, "sqlite" keeps everything in data/fitness.db, "sharded" keeps one
+# directory per user (data/users/<user_id>/) loaded only after login,
+# "snapshot" keeps data/<key>.snap binary files that load_state maps in and
+# decodes a record at a time.
+STORAGE_MODES = ("json", "journal", "sqlite", "sharded", "snapshot")
+SQLITE_FILE = "fitness.db"
+SNAPSHOT_SUFFIX = ".snap"
+SHARD_KEYS = ("workouts", "nutrition", "metrics")
+
+# Per-day nutrition totals saved next to nutrition.json, stamped with that
+# file's size and mtime; a stamp that no longer matches means rebuild.
+ROLLUPS_FILE = "nutrition.rollups.json"
+
+# Parsed collections pickled after a cold JSON load, reused while every
+# source file still has the size and mtime, or failing that the sha256, it
+# had before that load read it; a json-mode save drops it. Only json and
+# journal mode parse JSON on start.
+WARM_START_FILE = "warm_start.pickle"
+WARM_START_MODES = ("json", "journal")
+
+# json mode: several processes may share data/. Each saved record carries a
+# REV_FIELD counter, bumped whenever a save writes a change to it. save_state
+# holds an flock on data/ while it backs up, reads, merges and replaces the
+# changed files: records this process changed are written over what is on
+# disk, everything else comes from disk, so other sessions' entries survive.
+REV_FIELD = "rev"
+
+# Fields that identify a duplicate entry, checked with prevent_duplicate.
+UNIQUE_KEYS = {
+    "workouts": ("user_id", "date", "type"),
+    "nutrition": ("user_id", "timestamp", "meal_type"),
+    "metrics": ("user_id", "date", "type"),
+}
+
 
 def _ensure_dirs(base_dir: str, backup_dir: str) -> None:
     os.makedirs(base_dir, exist_ok=True)
@@ -25,81 +78,803 @@ def _json_path(base_dir: str, key: str) -> str:
     return os.path.join(base_dir, "data", DATA_FILES[key])
 
 
+@timed()
 def _read_json(path: str) -> list:
     if not os.path.exists(path):
         return []
+    instrument.read_file(path)
     with open(path, "r", encoding="utf-8") as f:
         try:
             data = json.load(f)
-            return data if isinstance(data, list) else []
         except json.JSONDecodeError:
             return []
+    if not isinstance(data, list):
+        return []
+    instrument.scanned(len(data))
+    return data
 
 
+def iter_json(path: str, chunk_size: int = 1 << 16):
+    """Yield the records of a JSON array file one at a time.
+
+    Reads ``chunk_size`` characters at a time and decodes each record as soon
+    as it is complete, so memory is bounded by the largest record rather than
+    the file. Works on any formatting. A record that is malformed, or cut off
+    at the end of the file, raises ValueError giving its byte offset.
+    """
+    if not os.path.exists(path):
+        return
+    decode = json.JSONDecoder().raw_decode
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        buf, pos, eof = "", 0, False
+        skipped = 0  # characters dropped from the front of buf so far
+        while True:
+            while pos < len(buf) and buf[pos] in " \t\r\n[,":
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            if pos < len(buf):
+                try:
+                    value, end = decode(buf, pos)
+                except json.JSONDecodeError as exc:
+                    # Only a record still short of its end may parse once more
+                    # is read: its error is then at the end of the buffer, or
+                    # inside a string that has not closed yet.
+                    if eof or (exc.pos < len(buf) - 16 and not exc.msg.startswith("Unterminated string")):
+                        offset = _byte_offset(path, skipped + pos)
+                        raise ValueError(f"{path}: malformed record at byte {offset}: {exc.msg}") from None
+                else:
+                    # An object only decodes once its closing brace is in the buffer.
+                    if isinstance(value, dict):
+                        yield value
+                    pos = end
+                    continue
+            elif eof:
+                return
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            skipped += pos
+            buf, pos = buf[pos:] + chunk, 0
+
+
+def _byte_offset(path: str, chars: int) -> int:
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return len(f.read(chars).encode("utf-8"))
+
+
+@timed()
 def _write_json(path: str, data: list) -> None:
+    if isinstance(data, TrackedList):
+        data.compact()  # json.dump reads list slots directly
     with open(path, "w", encoding="utf-8") as f:
         json.dump(data, f, indent=2, ensure_ascii=False)
+    instrument.scanned(len(data))
+    instrument.wrote_file(path)
+
+
+def _journal_path(base_dir: str, key: str) -> str:
+    return os.path.join(base_dir, "data", f"{key}.journal")
 
 
-def backup_state(base_dir: str, backup_dir: str) -> list[str]:
+def _replay_journal(path: str, items: list) -> list:
+    if not os.path.exists(path):
+        return items
+    pos = {r.get("id"): i for i, r in enumerate(items)}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                op = json.loads(line)
+            except json.JSONDecodeError:
+                continue  # torn last line from a crash mid-append
+            if op.get("op") == "put":
+                rec = op["r"]
+                i = pos.get(rec.get("id"))
+                if i is None:
+                    pos[rec.get("id")] = len(items)
+                    items.append(rec)
+                else:
+                    items[i] = rec
+            elif op.get("op") == "del":
+                i = pos.pop(op.get("id"), None)
+                if i is not None:
+                    items[i] = None
+    return [r for r in items if r is not None]
+
+
+def _journal_changes(base_dir: str, key: str) -> dict:
+    # What _replay_journal does to each id the journals mention, without
+    # the checkpoint: id -> [final record, or None once deleted; whether it
+    # was deleted first, which sends it to the end; its place among those
+    # appended there].
+    changes: dict = {}
+    journal = _journal_path(base_dir, key)
+    n = 0
+    for path in (journal + ".compacting", journal):
+        if not os.path.exists(path):
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    op = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line from a crash mid-append
+                n += 1
+                if op.get("op") == "put":
+                    rec = op["r"]
+                    c = changes.get(rec.get("id"))
+                    if c is None:
+                        changes[rec.get("id")] = [rec, False, n]
+                    else:
+                        if c[0] is None:
+                            c[2] = n
+                        c[0] = rec
+                elif op.get("op") == "del":
+                    c = changes.setdefault(op.get("id"), [None, True, n])
+                    c[0], c[1] = None, True
+    return changes
+
+
+def attach_journal(base_dir: str, *collections: TrackedList) -> None:
+    def append(key: str, op: str, record: dict) -> None:
+        entry = {"op": "del", "id": record.get("id")} if op == "del" else {"op": "put", "r": record}
+        line = json.dumps(entry, separators=(",", ":"), ensure_ascii=False)
+        with _journal_lock:
+            with open(_journal_path(base_dir, key), "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+    for items in collections:
+        items.listeners.append(append)
+
+
+def journal_size(base_dir: str) -> int:
+    total = 0
+    for key in DATA_FILES:
+        path = _journal_path(base_dir, key)
+        if os.path.exists(path):
+            total += os.path.getsize(path)
+    return total
+
+
+def compact_journal(base_dir: str, background: bool = False) -> threading.Thread | None:
+    # Rotate the live journals aside so appends can continue, then fold the
+    # rotated ones into the checkpoints. Replay is idempotent, so a crash
+    # between replacing a checkpoint and removing its journal is harmless.
+    rotated = []
+    with _journal_lock:
+        for key in DATA_FILES:
+            live = _journal_path(base_dir, key)
+            folding = live + ".compacting"
+            if os.path.exists(live) and not os.path.exists(folding):
+                os.replace(live, folding)
+                rotated.append(key)
+
+    def fold() -> None:
+        backup_state(base_dir, os.path.join(base_dir, "backups"))
+        for key in rotated:
+            path = _json_path(base_dir, key)
+            folding = _journal_path(base_dir, key) + ".compacting"
+            items = _replay_journal(folding, _read_json(path))
+            _write_json(path + ".tmp", items)
+            os.replace(path + ".tmp", path)
+            os.remove(folding)
+
+    if not rotated:
+        return None
+    if not background:
+        fold()
+        return None
+    t = threading.Thread(target=fold, name="journal-compaction", daemon=False)
+    t.start()
+    return t
+
+
+@timed()
+def backup_state(base_dir: str, backup_dir: str, keys: list[str] | None = None) -> list[str]:
+    import backup_store
+
     _ensure_dirs(base_dir, backup_dir)
-    ts = datetime.now().strftime("%Y%m%d_%H%M%S")
-    created: list[str] = []
-    data_dir = os.path.join(base_dir, "data")
+    changed = None if keys is None else [DATA_FILES[k] for k in keys]
+    created = backup_store.snapshot(os.path.join(base_dir, "data"), backup_dir, list(DATA_FILES.values()), changed)
+    for path in created:
+        instrument.wrote_file(path)
+    return created
 
-    for fname in DATA_FILES.values():
-        src = os.path.join(data_dir, fname)
-        if os.path.exists(src):
-            dst = os.path.join(backup_dir, f"{fname}.{ts}.bak")
-            shutil.copy2(src, dst)
-            created.append(dst)
 
+def _backup_sqlite(base_dir: str, backup_dir: str) -> list[str]:
+    import tempfile
+
+    import backup_store
+    import sqlite_store
+
+    # The file itself may be mid-transaction, so snapshot a copy taken with
+    # the backup API instead.
+    path = os.path.join(base_dir, "data", SQLITE_FILE)
+    if not os.path.exists(path):
+        return []
+    os.makedirs(backup_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=backup_dir) as tmp:
+        sqlite_store.copy(path, os.path.join(tmp, SQLITE_FILE))
+        created = backup_store.snapshot(tmp, backup_dir, [SQLITE_FILE], [SQLITE_FILE])
+    for p in created:
+        instrument.wrote_file(p)
     return created
 
 
-def restore_latest_backup(base_dir: str, backup_dir: str) -> bool:
-    _ensure_dirs(base_dir, backup_dir)
-    restored_any = False
+def _restore_legacy_backups(base_dir: str, backup_dir: str) -> list[str]:
+    # Timestamped "<file>.<ts>.bak" copies written before the backup store existed.
+    import shutil
 
+    restored = []
     for fname in DATA_FILES.values():
         candidates = [f for f in os.listdir(backup_dir) if f.startswith(fname + ".") and f.endswith(".bak")]
         if not candidates:
             continue
-        candidates.sort(reverse=True)
-        newest = candidates[0]
-        src = os.path.join(backup_dir, newest)
-        dst = os.path.join(base_dir, "data", fname)
-        shutil.copy2(src, dst)
-        restored_any = True
+        newest = max(candidates)
+        shutil.copy2(os.path.join(backup_dir, newest), os.path.join(base_dir, "data", fname))
+        restored.append(fname)
+    return restored
+
+
+def restore_latest_backup(base_dir: str, backup_dir: str) -> bool:
+    import backup_store
+
+    _ensure_dirs(base_dir, backup_dir)
+    restored = backup_store.restore(backup_dir, os.path.join(base_dir, "data"))
+    if not restored:
+        restored = _restore_legacy_backups(base_dir, backup_dir)
+
+    for key, fname in DATA_FILES.items():
+        if fname not in restored:
+            continue
+        for jpath in (_journal_path(base_dir, key), _journal_path(base_dir, key) + ".compacting"):
+            if os.path.exists(jpath):
+                os.remove(jpath)
+    # A rollback journal left by the replaced database must not be applied to this one.
+    if SQLITE_FILE in restored and os.path.exists(os.path.join(base_dir, "data", SQLITE_FILE + "-journal")):
+        os.remove(os.path.join(base_dir, "data", SQLITE_FILE + "-journal"))
+
+    return bool(restored)
+
+
+def close_state(*collections: list) -> None:
+    """Release what load_state opened: the sqlite connection, with unsaved
+    changes rolled back, and the snapshot mappings.
+
+    Call it before loading again or restoring a backup in the same process.
+    """
+    conns = {id(c): c for c in (getattr(items, "db", None) for items in collections) if c is not None}
+    if conns:
+        import sqlite_store
+
+        for conn in conns.values():
+            sqlite_store.close(conn)
+    for items in collections:
+        if getattr(items, "db", None) is not None:
+            items.db = None
+        if hasattr(items, "close"):  # snapshot.SnapshotList
+            items.close()
+
+
+def _load_collection(base_dir: str, key: str) -> TrackedList:
+    items = _read_json(_json_path(base_dir, key))
+    journal = _journal_path(base_dir, key)
+    items = _replay_journal(journal + ".compacting", items)
+    items = _replay_journal(journal, items)
+    return TrackedList(key, items)
+
+
+def _snapshot_path(base_dir: str, key: str) -> str:
+    return os.path.join(base_dir, "data", key + SNAPSHOT_SUFFIX)
+
+
+def iter_collection(base_dir: str, key: str, mode: str = "json", user_id: str | None = None):
+    """Yield a collection's saved records lazily, without going through load_state.
+
+    With ``user_id`` sharded and SQLite storage only read that user's records;
+    other modes yield everyone's and leave filtering to the caller.
+    """
+    if mode not in STORAGE_MODES:
+        raise ValueError(f"Unknown storage mode: {mode}")
+    if mode == "sqlite":
+        path = os.path.join(base_dir, "data", SQLITE_FILE)
+        if not os.path.exists(path):
+            return
+        import sqlite_store
+
+        conn = sqlite_store.connect(path)
+        try:
+            sql, params = f"SELECT doc FROM {sqlite_store.TABLES[key]}", ()
+            if user_id is not None and key != "users":
+                sql, params = sql + " WHERE user_id = ?", (user_id,)
+            for (doc,) in conn.execute(sql + " ORDER BY rowid", params):
+                yield json.loads(doc)
+        finally:
+            conn.close()
+        return
+    if mode == "sharded" and key in SHARD_KEYS:
+        root = os.path.join(base_dir, "data", "users")
+        uids = [user_id] if user_id is not None else sorted(os.listdir(root)) if os.path.isdir(root) else []
+        for uid in uids:
+            yield from iter_json(_shard_path(base_dir, uid, key))
+        return
+
+    if mode == "snapshot" and os.path.exists(_snapshot_path(base_dir, key)):
+        import snapshot
+
+        snap = snapshot.Snapshot(_snapshot_path(base_dir, key))
+        try:
+            for i in range(snap.rows):
+                yield snap.record(i)
+        finally:
+            snap.close()
+        return
+
+    # The journals can change any record, so the checkpoint is patched with
+    # them on the way through; only the journalled records are held.
+    changes = _journal_changes(base_dir, key)
+    for r in iter_json(_json_path(base_dir, key)):
+        c = changes.get(r.get("id"))
+        if c is None:
+            yield r
+        elif c[0] is not None and not c[1]:
+            yield c[0]
+            c[0] = None  # done; not appended again below
+    yield from (c[0] for c in sorted(changes.values(), key=lambda c: c[2]) if c[0] is not None)
+
+
+def _rollups_path(base_dir: str) -> str:
+    return os.path.join(base_dir, "data", ROLLUPS_FILE)
+
+
+def _source_stamp(path: str) -> list:
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _write_rollups(base_dir: str, meals: list) -> None:
+    rollups = meal_rollups(meals)
+    if rollups is None:
+        return
+    data = {"source": _source_stamp(_json_path(base_dir, "nutrition")), **rollups.to_json()}
+    path = _rollups_path(base_dir)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(path + ".tmp", path)
+
+
+def _attach_rollups(base_dir: str, meals: TrackedList) -> None:
+    journal = _journal_path(base_dir, "nutrition")
+    if os.path.exists(journal) or os.path.exists(journal + ".compacting"):
+        return  # memory is ahead of nutrition.json
+    try:
+        with open(_rollups_path(base_dir), "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("source") != _source_stamp(_json_path(base_dir, "nutrition")):
+            return
+        meals.indexes["rollups"] = NutritionRollups.from_json(data)
+    except (OSError, ValueError, KeyError, TypeError):
+        return  # rebuilt from the meals on first use
+
+
+def _shard_path(base_dir: str, user_id: str, key: str) -> str:
+    uid = str(user_id)
+    if not uid or uid in (".", "..") or "/" in uid or os.sep in uid:
+        raise ValueError(f"Invalid user id for a shard: {user_id!r}")
+    return os.path.join(base_dir, "data", "users", uid, DATA_FILES[key])
+
+
+def _track_shard_owners(items: TrackedList) -> TrackedList:
+    items.loaded_users = set()
+    items.dirty_users = set()
+    # record id -> the user whose shard holds it. Records are changed in
+    # place, so this is the only way to know which shard a record that
+    # changed user_id has to leave.
+    items.shard_owners = {}
+
+    def track(key: str, op: str, record: dict) -> None:
+        rid = record.get("id")
+        items.dirty_users.add(items.shard_owners.pop(rid, None))
+        if op != "del":
+            items.dirty_users.add(record.get("user_id"))
+            items.shard_owners[rid] = record.get("user_id")
+
+    items.listeners.append(track)
+    return items
+
+
+def load_user_shard(base_dir: str, user_id: str, workouts: list, meals: list, metrics: list) -> None:
+    """Bring one user's records into memory; a no-op outside sharded mode."""
+    for key, items in zip(SHARD_KEYS, (workouts, meals, metrics)):
+        loaded = getattr(items, "loaded_users", None)
+        if loaded is None or user_id in loaded:
+            continue
+        records = _read_json(_shard_path(base_dir, user_id, key))
+        # list.extend: loading is not a change
+        items.extend(records)
+        items.shard_owners.update((r.get("id"), user_id) for r in records)
+        loaded.add(user_id)
+
+
+def _save_shards(base_dir: str, users: list, collections: dict) -> None:
+    import backup_store
+
+    fnames = []
+    if is_dirty(users):
+        fnames.append(DATA_FILES["users"])
+    owners = {key: {uid for uid in items.dirty_users if uid} for key, items in collections.items()}
+    for key, uids in owners.items():
+        fnames += [os.path.relpath(_shard_path(base_dir, uid, key), os.path.join(base_dir, "data")) for uid in uids]
+    if not fnames:
+        return
+
+    backup_store.snapshot(os.path.join(base_dir, "data"), os.path.join(base_dir, "backups"), fnames, fnames)
+    if is_dirty(users):
+        _write_json(_json_path(base_dir, "users"), users)
+    for key, uids in owners.items():
+        items = collections[key]
+        for uid in uids:
+            path = _shard_path(base_dir, uid, key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _write_json(path, [r for r in items if r.get("user_id") == uid])
+        items.dirty_users.clear()
+
+
+def migrate_to_sharded(base_dir: str) -> dict:
+    """Split the four-file layout into per-user shards; the old files are left in place."""
+    counts = {"users": 0, "records": 0, "skipped": 0}
+    owners = set()
+    for key in SHARD_KEYS:
+        by_user: dict = {}
+        for r in _read_json(_json_path(base_dir, key)):
+            if not r.get("user_id"):
+                counts["skipped"] += 1
+                continue
+            by_user.setdefault(r["user_id"], []).append(r)
+        for uid, records in by_user.items():
+            path = _shard_path(base_dir, uid, key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _write_json(path, records)
+            counts["records"] += len(records)
+        owners.update(by_user)
+    counts["users"] = len(owners)
+    return counts
+
+
+def _warm_start_path(base_dir: str) -> str:
+    return os.path.join(base_dir, "data", WARM_START_FILE)
+
+
+def _warm_sources(base_dir: str) -> list[str]:
+    paths = []
+    for key in DATA_FILES:
+        journal = _journal_path(base_dir, key)
+        paths += [_json_path(base_dir, key), journal, journal + ".compacting"]
+    return paths
+
+
+def _sha256(path: str) -> str:
+    import hashlib
+
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _file_stamp(path: str, with_hash: bool = True) -> list | None:
+    if not os.path.exists(path):
+        return None
+    st = os.stat(path)
+    return [st.st_size, st.st_mtime_ns, _sha256(path) if with_hash else None]
+
 
-    return restored_any
+def _warm_start_valid(stamps: dict) -> bool:
+    for path, old in stamps.items():
+        new = _file_stamp(path, with_hash=False)
+        if new is None or old is None:
+            if new != old:
+                return False
+        elif new[0] != old[0]:
+            return False
+        elif new[1] != old[1] and _sha256(path) != old[2]:
+            return False  # touched and really changed
+    return True
+
+
+def _warm_stamps(base_dir: str) -> dict:
+    return {path: _file_stamp(path) for path in _warm_sources(base_dir)}
+
+
+def write_warm_start(base_dir: str, users: list, workouts: list, meals: list, metrics: list, sources: dict) -> None:
+    """Pickle collections just read from disk, stamped with ``sources``.
+
+    ``sources`` must be _warm_stamps() taken before the collections were
+    read. A process's in-memory copy is never cached otherwise: collections
+    it did not save may be older than the files, and would pass the stamp
+    check. A file changed while it was being read no longer matches its
+    stamp, so that cache is simply never used.
+    """
+    import pickle
+
+    data = {"sources": sources, "collections": [list(c) for c in (users, workouts, meals, metrics)]}
+    path = _warm_start_path(base_dir)
+    with open(path + ".tmp", "wb") as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(path + ".tmp", path)
+
+
+def _drop_warm_start(base_dir: str) -> None:
+    try:
+        os.remove(_warm_start_path(base_dir))
+    except FileNotFoundError:
+        pass
+
+
+def _read_warm_start(base_dir: str) -> list | None:
+    import pickle
+
+    # The collector would rescan the growing lists on every few hundred new
+    # dicts; unpickling only creates acyclic data, so skip it meanwhile.
+    was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        with open(_warm_start_path(base_dir), "rb") as f:
+            data = pickle.load(f)
+        if data["sources"].keys() != set(_warm_sources(base_dir)) or not _warm_start_valid(data["sources"]):
+            return None
+        return data["collections"]
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError, TypeError, ValueError, AttributeError):
+        return None  # missing or unreadable: parse the JSON instead
+    finally:
+        if was_enabled:
+            gc.enable()
+
+
+def _load_sqlite(base_dir: str) -> tuple[list, list, list, list]:
+    import sqlite_store
+
+    conn = sqlite_store.connect(os.path.join(base_dir, "data", SQLITE_FILE))
+    if sqlite_store.is_empty(conn):
+        # First run on this backend: take over whatever the JSON files hold.
+        sqlite_store.import_collections(conn, {k: _load_collection(base_dir, k) for k in DATA_FILES})
+    return sqlite_store.load(conn)
 
 
-def load_state(base_dir: str) -> Tuple[list, list, list, list]:
+def _load_snapshot(base_dir: str, key: str) -> TrackedList:
+    import snapshot
+
+    path = _snapshot_path(base_dir, key)
+    if not os.path.exists(path):
+        # First run in this mode: take over whatever the JSON files hold.
+        items = _load_collection(base_dir, key)
+        snapshot.write_snapshot(path, key, items)
+        return items
+    return snapshot.SnapshotList(key, snapshot.Snapshot(path))
+
+
+def json_to_snapshot(base_dir: str) -> dict:
+    """Write data/<key>.snap from the JSON files (and journals); returns record counts."""
+    import snapshot
+
+    os.makedirs(os.path.join(base_dir, "data"), exist_ok=True)
+    return {key: snapshot.write_snapshot(_snapshot_path(base_dir, key), key, _load_collection(base_dir, key))
+            for key in DATA_FILES}
+
+
+def snapshot_to_json(base_dir: str) -> dict:
+    """Rewrite the JSON files from the snapshots, backing the old ones up first."""
+    import snapshot
+
+    keys = [key for key in DATA_FILES if os.path.exists(_snapshot_path(base_dir, key))]
+    if keys:
+        backup_state(base_dir, os.path.join(base_dir, "backups"), keys)
+    counts = {}
+    for key in keys:
+        snap = snapshot.Snapshot(_snapshot_path(base_dir, key))
+        try:
+            items = snapshot.SnapshotList(key, snap)
+            _write_json(_json_path(base_dir, key), items)
+            counts[key] = len(items)
+        finally:
+            snap.close()
+        for jpath in (_journal_path(base_dir, key), _journal_path(base_dir, key) + ".compacting"):
+            if os.path.exists(jpath):
+                os.remove(jpath)
+    return counts
+
+
+def _disk_stamp(path: str) -> list | None:
+    # Saves replace the file, so a new inode tells even when mtime is coarse.
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [st.st_size, st.st_mtime_ns, st.st_ino]
+
+
+@contextlib.contextmanager
+def _data_lock(base_dir: str):
+    # flock on the data directory itself: files there are replaced, not
+    # rewritten, so a lock on one would not outlive the save that took it.
+    if fcntl is None:
+        yield
+        return
+    fd = os.open(os.path.join(base_dir, "data"), os.O_RDONLY)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        yield
+    finally:
+        os.close(fd)  # releases the lock
+
+
+def _track_revisions(items: TrackedList) -> None:
+    # base_revs: id -> the revision a record had when this process first
+    # changed it since the last save; disk_stamp: the file as this process
+    # last wrote it. Nothing read at load time sets it: the records may have
+    # come from a cache or changed under the read, so the first save always
+    # merges against the revs actually on disk.
+    items.base_revs = {}
+    items.disk_stamp = None
+    items.listeners.append(lambda key, op, record: items.base_revs.setdefault(record.get("id"), record.get(REV_FIELD, 0)))
+
+
+def _three_way(items: TrackedList, theirs: list) -> tuple[list, int]:
+    """Merge the file's records with this process's changes; returns (records, conflicts).
+
+    When both sides changed a record ours wins; a record we deleted that was
+    changed on disk meanwhile is kept.
+    """
+    base = items.base_revs
+    merged, seen, conflicts = [], set(), 0
+    for t in theirs:
+        tid = t.get("id")
+        if tid not in base:
+            mine = items.by_id(tid)
+            merged.append(mine if mine == t else t)  # keep our object when nothing changed
+            continue
+        seen.add(tid)
+        mine = items.by_id(tid)
+        changed = t.get(REV_FIELD, 0) != base[tid]
+        conflicts += changed
+        if mine is not None:
+            mine[REV_FIELD] = max(t.get(REV_FIELD, 0), base[tid]) + 1
+            merged.append(mine)
+        elif changed:
+            merged.append(t)
+    for rid in base:
+        mine = items.by_id(rid)
+        if rid not in seen and mine is not None:
+            mine[REV_FIELD] = base[rid] + 1
+            merged.append(mine)
+    return merged, conflicts
+
+
+def _save_merged(base_dir: str, key: str, items: TrackedList) -> int:
+    """Write one json-mode collection, merging with the file unless it is
+    still the one this process last wrote; returns the conflict count. The
+    caller holds the data lock."""
+    path = _json_path(base_dir, key)
+    conflicts = 0
+    if _disk_stamp(path) == items.disk_stamp:
+        for rid, rev in items.base_revs.items():
+            r = items.by_id(rid)
+            if r is not None:
+                r[REV_FIELD] = rev + 1
+    else:
+        merged, conflicts = _three_way(items, _read_json(path))
+        if len(merged) != len(items) or any(a is not b for a, b in zip(merged, items)):
+            items[:] = merged  # positional: rebuilds the id index, drops the others
+    _write_json(path + ".tmp", items)
+    os.replace(path + ".tmp", path)
+    items.disk_stamp = _disk_stamp(path)
+    if key == "nutrition":
+        _write_rollups(base_dir, items)  # stamped with this exact file
+    items.base_revs.clear()
+    return conflicts
+
+
+@timed()
+def load_state(base_dir: str, mode: str = "json", warm_start: bool = False) -> tuple[list, list, list, list]:
+    """The four collections; ``warm_start`` uses (and refreshes) the pickled cache in json/journal mode."""
+    if mode not in STORAGE_MODES:
+        raise ValueError(f"Unknown storage mode: {mode}")
     os.makedirs(os.path.join(base_dir, "data"), exist_ok=True)
-    users = _read_json(_json_path(base_dir, "users"))
-    workouts = _read_json(_json_path(base_dir, "workouts"))
-    meals = _read_json(_json_path(base_dir, "nutrition"))
-    metrics = _read_json(_json_path(base_dir, "metrics"))
+    if mode == "sqlite":
+        return _load_sqlite(base_dir)
+    if mode == "sharded":
+        users = _load_collection(base_dir, "users")
+        return (users,) + tuple(_track_shard_owners(TrackedList(key)) for key in SHARD_KEYS)
+    if mode == "snapshot":
+        return tuple(_load_snapshot(base_dir, key) for key in DATA_FILES)
+
+    cached = _read_warm_start(base_dir) if warm_start else None
+    if cached is not None:
+        users, workouts, meals, metrics = (TrackedList(key, items) for key, items in zip(DATA_FILES, cached))
+    else:
+        sources = _warm_stamps(base_dir) if warm_start else None
+        users, workouts, meals, metrics = (_load_collection(base_dir, key) for key in DATA_FILES)
+        if warm_start:
+            write_warm_start(base_dir, users, workouts, meals, metrics, sources)
+    _attach_rollups(base_dir, meals)
+    if mode == "journal":
+        attach_journal(base_dir, users, workouts, meals, metrics)
+    else:
+        for items in (users, workouts, meals, metrics):
+            _track_revisions(items)
     return users, workouts, meals, metrics
 
 
-def save_state(base_dir: str, users: list, workouts: list, meals: list, metrics: list) -> None:
-    backup_dir = os.path.join(base_dir, "backups")
-    backup_state(base_dir, backup_dir)
+@timed()
+def save_state(base_dir: str, users: list, workouts: list, meals: list, metrics: list, mode: str = "json") -> None:
+    if mode == "sqlite":
+        # Mutations were written through as they happened; back up the
+        # last committed state, as the other modes do, then make them durable.
+        if any(is_dirty(items) for items in (users, workouts, meals, metrics)):
+            _backup_sqlite(base_dir, os.path.join(base_dir, "backups"))
+        users.db.commit()
+        mark_clean(users, workouts, meals, metrics)
+        return
+
+    if mode == "sharded":
+        _save_shards(base_dir, users, {"workouts": workouts, "nutrition": meals, "metrics": metrics})
+        mark_clean(users, workouts, meals, metrics)
+        return
+
+    if mode == "snapshot":
+        collections = {"users": users, "workouts": workouts, "nutrition": meals, "metrics": metrics}
+        changed = [k for k, items in collections.items() if is_dirty(items)]
+        if changed:
+            import backup_store
+            import snapshot
+
+            names = [key + SNAPSHOT_SUFFIX for key in DATA_FILES]
+            backup_store.snapshot(os.path.join(base_dir, "data"), os.path.join(base_dir, "backups"), names,
+                                  [key + SNAPSHOT_SUFFIX for key in changed])
+            for key in changed:
+                snapshot.write_snapshot(_snapshot_path(base_dir, key), key, collections[key])
+            mark_clean(*collections.values())
+        return
+
+    if mode == "journal":
+        # Every change is already on disk in the journals.
+        if journal_size(base_dir) >= JOURNAL_COMPACT_BYTES:
+            compact_journal(base_dir, background=True)
+        mark_clean(users, workouts, meals, metrics)
+        return
+
+    collections = {"users": users, "workouts": workouts, "nutrition": meals, "metrics": metrics}
+    # A leftover journal means the checkpoint is behind memory, so rewrite it too.
+    changed = [k for k, items in collections.items() if is_dirty(items) or os.path.exists(_journal_path(base_dir, k))]
+    if not changed:
+        return
 
-    _write_json(_json_path(base_dir, "users"), users)
-    _write_json(_json_path(base_dir, "workouts"), workouts)
-    _write_json(_json_path(base_dir, "nutrition"), meals)
-    _write_json(_json_path(base_dir, "metrics"), metrics)
+    os.makedirs(os.path.join(base_dir, "data"), exist_ok=True)
+    with _data_lock(base_dir):  # the backup store is shared too
+        # Rebuilt by the next cold load_state(warm_start=True), from the files.
+        _drop_warm_start(base_dir)
+        backup_state(base_dir, os.path.join(base_dir, "backups"), changed)
+        for key in changed:
+            items = collections[key]
+            if getattr(items, "base_revs", None) is not None:
+                _save_merged(base_dir, key, items)
+            else:
+                _write_json(_json_path(base_dir, key), items)
+                if key == "nutrition":
+                    _write_rollups(base_dir, items)
+            # The checkpoint now holds everything; a stale journal would replay old versions.
+            path = _journal_path(base_dir, key)
+            if os.path.exists(path):
+                os.remove(path)
+    mark_clean(*collections.values())
 
 
 def parse_date_yyyy_mm_dd(s: str) -> date:
-    return datetime.strptime(s, "%Y-%m-%d").date()
+    return dates.parse_date(s)
 
 
 def parse_datetime_yyyy_mm_dd_hhmm(s: str) -> datetime:
-    return datetime.strptime(s, "%Y-%m-%d %H:%M")
+    return dates.parse_datetime(s)
 
 
 def validate_workout_entry(entry: dict) -> bool:
@@ -182,7 +957,22 @@ def validate_metric_entry(entry: dict) -> bool:
 
 
 def prevent_duplicate(entries: list[dict], keys: list[str], candidate: dict) -> bool:
+    ix = unique_index(entries, keys)
+    if ix is not None:
+        try:
+            return candidate in ix
+        except TypeError:
+            pass  # unhashable key values; compare the slow way
     for e in entries:
         if all(e.get(k) == candidate.get(k) for k in keys):
             return True
     return False
+
+
+if __name__ == "__main__":
+    import sys
+
+    commands = {"migrate-sharded": migrate_to_sharded, "to-snapshot": json_to_snapshot, "to-json": snapshot_to_json}
+    if sys.argv[1:2] == [] or sys.argv[1] not in commands:
+        sys.exit("usage: python storage.py migrate-sharded|to-snapshot|to-json [BASE_DIR]")
+    print(commands[sys.argv[1]](sys.argv[2] if len(sys.argv) > 2 else os.path.dirname(os.path.abspath(__file__))))
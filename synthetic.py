@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import random
+import uuid
+from datetime import date, timedelta
+
+# Deterministic fake history for benchmarks and tests. The same arguments
+# always give the same records, ids included.
+
+METRIC_TYPES = ("weight_kg", "sleep_hours", "water_l", "mood", "waist_cm", "chest_cm")
+_MEAL_SLOTS = (("breakfast", 7), ("lunch", 12), ("dinner", 19), ("snack", 16))
+_LIFTS = ("Bench Press", "Squat", "Deadlift", "Overhead Press", "Row")
+_RUNS = ("Run", "Bike", "Row Erg")
+_METRIC_RANGES = {
+    "weight_kg": (60.0, 100.0),
+    "sleep_hours": (5.0, 9.0),
+    "water_l": (1.0, 4.0),
+    "mood": (1.0, 10.0),
+    "waist_cm": (70.0, 110.0),
+    "chest_cm": (85.0, 120.0),
+}
+
+
+def _id(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def _count(rng: random.Random, per_day: float, cap: int) -> int:
+    n = int(per_day) + (rng.random() < per_day - int(per_day))
+    return min(n, cap)
+
+
+def _exercises(rng: random.Random, wtype: str) -> list:
+    if wtype == "strength":
+        return [
+            {"name": name, "sets": rng.randint(3, 5), "reps": rng.randint(3, 12), "weight_kg": round(rng.uniform(20, 180), 1)}
+            for name in rng.sample(_LIFTS, rng.randint(1, 3))
+        ]
+    if wtype == "cardio":
+        dist = round(rng.uniform(2, 21), 2)
+        return [{"name": rng.choice(_RUNS), "distance_km": dist, "time_min": round(dist * rng.uniform(4, 7), 1)}]
+    return [{"name": "Yoga", "minutes": round(rng.uniform(10, 45), 1)}]
+
+
+def generate(
+    users: int = 10,
+    years: float = 1.0,
+    workouts_per_day: float = 0.7,
+    meals_per_day: float = 3.0,
+    metric_types=("weight_kg", "sleep_hours"),
+    end: str = "2025-01-01",
+    seed: int = 0,
+) -> tuple[list, list, list, list]:
+    """Users plus ``years`` of history ending at ``end``, shaped like load_state's output.
+
+    At most one workout per type and one meal per meal type a day, so nothing
+    trips the duplicate keys main checks.
+    """
+    rng = random.Random(seed)
+    last = date.fromisoformat(end)
+    days = [last - timedelta(days=i) for i in range(int(years * 365), -1, -1)]
+
+    user_list, workouts, meals, metrics = [], [], [], []
+    for n in range(users):
+        uid = _id(rng)
+        weight = round(rng.uniform(60, 100), 1)
+        user_list.append({
+            "id": uid,
+            "name": f"User {n}",
+            "email": f"user{n}@example.com",
+            "pin": "1234",
+            "age": rng.randint(18, 70),
+            "height_cm": round(rng.uniform(150, 200), 1),
+            "weight_kg": weight,
+            "activity_level": rng.choice(("low", "moderate", "high")),
+            "goal": {
+                "type": "weight_loss",
+                "target_weight_kg": round(weight - 5, 1),
+                "daily_calorie_goal": 2200.0,
+                "start_date": days[0].isoformat(),
+                "end_date": None,
+            },
+        })
+
+        for d in days:
+            ds = d.isoformat()
+            for wtype in rng.sample(("strength", "cardio", "flexibility"), _count(rng, workouts_per_day, 3)):
+                workouts.append({
+                    "user_id": uid,
+                    "date": ds,
+                    "type": wtype,
+                    "duration_min": float(rng.randint(15, 90)),
+                    "exercises": _exercises(rng, wtype),
+                    "notes": "",
+                    "allow_future": False,
+                    "pr_flags": [],
+                    "id": _id(rng),
+                })
+            for meal_type, hour in rng.sample(_MEAL_SLOTS, _count(rng, meals_per_day, 4)):
+                meals.append({
+                    "user_id": uid,
+                    "timestamp": f"{ds} {hour:02d}:{rng.randint(0, 59):02d}",
+                    "meal_type": meal_type,
+                    "items": [{"name": "Food", "grams": float(rng.randint(50, 400))}],
+                    "calories": float(rng.randint(100, 900)),
+                    "macros": {
+                        "protein_g": float(rng.randint(0, 60)),
+                        "carbs_g": float(rng.randint(0, 120)),
+                        "fat_g": float(rng.randint(0, 50)),
+                    },
+                    "allow_future": False,
+                    "id": _id(rng),
+                })
+            for mtype in metric_types:
+                lo, hi = _METRIC_RANGES[mtype]
+                value = weight if mtype == "weight_kg" else rng.uniform(lo, hi)
+                if mtype == "weight_kg":
+                    weight = round(min(hi, max(lo, weight + rng.uniform(-0.3, 0.25))), 1)
+                metrics.append({
+                    "user_id": uid,
+                    "date": ds,
+                    "type": mtype,
+                    "value": round(value, 1),
+                    "allow_future": False,
+                    "id": _id(rng),
+                })
+
+    return user_list, workouts, meals, metrics
+
+
+def records_per_user(years: float, workouts_per_day: float, meals_per_day: float, metric_types) -> float:
+    return (int(years * 365) + 1) * (min(workouts_per_day, 3) + min(meals_per_day, 4) + len(metric_types))
+
+
+def generate_records(total: int, **kwargs) -> tuple[list, list, list, list]:
+    """Roughly ``total`` workout/meal/metric records, adding users rather than history."""
+    defaults = {"years": 1.0, "workouts_per_day": 0.7, "meals_per_day": 3.0, "metric_types": ("weight_kg", "sleep_hours")}
+    defaults.update(kwargs)
+    per_user = records_per_user(defaults["years"], defaults["workouts_per_day"], defaults["meals_per_day"], defaults["metric_types"])
+    if total < per_user:
+        defaults["years"] = max(total / per_user * defaults["years"], 1 / 365)
+        per_user = records_per_user(defaults["years"], defaults["workouts_per_day"], defaults["meals_per_day"], defaults["metric_types"])
+    return generate(users=max(1, round(total / per_user)), **defaults)
@@ -0,0 +1,49 @@
+import os
+from datetime import datetime, timedelta
+
+import backup_store
+
+
+def _write(path, text):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
+
+def test_snapshot_dedupes_and_restores(tmp_path):
+    data, backups = str(tmp_path / "data"), str(tmp_path / "backups")
+    os.makedirs(data)
+    _write(os.path.join(data, "users.json"), "[]")
+    _write(os.path.join(data, "workouts.json"), "[1]")
+    fnames = ["users.json", "workouts.json"]
+
+    backup_store.snapshot(data, backups, fnames)
+    assert backup_store.snapshot(data, backups, fnames) == []
+
+    _write(os.path.join(data, "workouts.json"), "[1, 2]")
+    created = backup_store.snapshot(data, backups, fnames, changed=["workouts.json"])
+    assert len(created) == 2  # one new blob plus the manifest
+    assert len(os.listdir(os.path.join(backups, "manifests"))) == 2
+
+    _write(os.path.join(data, "workouts.json"), "broken")
+    assert sorted(backup_store.restore(backups, data)) == fnames
+    with open(os.path.join(data, "workouts.json"), encoding="utf-8") as f:
+        assert f.read() == "[1, 2]"
+
+
+def test_prune_keeps_hourly_then_daily(tmp_path):
+    backups = str(tmp_path)
+    mdir = os.path.join(backups, "manifests")
+    os.makedirs(mdir)
+    os.makedirs(os.path.join(backups, "objects"))
+    now = datetime(2025, 3, 1, 12, 0)
+    stamps = [now - timedelta(minutes=20 * i) for i in range(6)]  # two hours, three per hour
+    stamps += [now - timedelta(days=d, hours=h) for d in (3, 4) for h in (0, 5)]
+    stamps.append(now - timedelta(days=60))
+    for ts in stamps:
+        _write(os.path.join(mdir, ts.strftime("%Y%m%d_%H%M%S_%f") + ".json"), '{"files": {}}')
+
+    backup_store.prune(backups, keep_last=1, now=now)
+    kept = sorted(os.listdir(mdir))
+    # newest per hour today (3 hours touched), newest per day for days 3 and 4, nothing from 60 days ago
+    assert len(kept) == 5
+    assert (now - timedelta(days=60)).strftime("%Y%m%d") not in "".join(kept)
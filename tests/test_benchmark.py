@@ -0,0 +1,27 @@
+import benchmark
+import synthetic
+from storage import validate_workout_entry, validate_meal_entry, validate_metric_entry
+
+
+def test_synthetic_data_is_deterministic_and_valid():
+    a = synthetic.generate(users=2, years=0.1, seed=7)
+    assert a == synthetic.generate(users=2, years=0.1, seed=7)
+    assert a != synthetic.generate(users=2, years=0.1, seed=8)
+
+    users, workouts, meals, metrics = a
+    assert len(users) == 2
+    assert all(validate_workout_entry(w) for w in workouts)
+    assert all(validate_meal_entry(m) for m in meals)
+    assert all(validate_metric_entry(e) for e in metrics)
+
+
+def test_benchmark_report_covers_every_op():
+    report = benchmark.run([300], repeat=1)
+    ops = {r["op"] for r in report["results"]}
+    assert {"load_state", "save_state", "backup_state", "weekly_workout_summary", "goal_progress", "dashboard"} <= ops
+    assert benchmark.compare(report, report) == []
+
+
+def test_sharded_benchmark_times_a_loaded_user():
+    report = benchmark.run([300], repeat=1, mode="sharded")
+    assert "weekly_workout_summary" in {r["op"] for r in report["results"]}
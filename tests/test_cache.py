@@ -0,0 +1,56 @@
+import cache
+from metrics import log_metric, goal_progress
+from nutrition import log_meal, update_meal, daily_calorie_summary
+from profiles import update_goal
+from records import TrackedList
+
+
+def _meal(uid, ts, cal):
+    return {"user_id": uid, "timestamp": ts, "meal_type": "lunch", "items": [], "calories": cal, "macros": {}}
+
+
+def test_results_cached_until_that_user_changes():
+    cache.cache_clear()
+    meals = TrackedList("nutrition")
+    m = log_meal(meals, _meal("u1", "2025-01-01 12:00", 500))
+    first = daily_calorie_summary(meals, "u1", "2025-01-01")
+    assert daily_calorie_summary(meals, "u1", "2025-01-01") is first
+    assert cache.cache_info()["hits"] == 1
+
+    log_meal(meals, _meal("u2", "2025-01-01 12:00", 900))
+    assert daily_calorie_summary(meals, "u1", "2025-01-01") is first
+    update_meal(meals, m["id"], {"calories": 650})
+    assert daily_calorie_summary(meals, "u1", "2025-01-01")["total_calories"] == 650.0
+    update_meal(meals, m["id"], {"user_id": "u2"})
+    assert daily_calorie_summary(meals, "u1", "2025-01-01")["total_calories"] == 0.0
+
+    meals.sort(key=lambda r: r["calories"])  # positional edits start a new epoch
+    assert daily_calorie_summary(meals, "u2", "2025-01-01")["total_calories"] == 1550.0
+    assert daily_calorie_summary(list(meals), "u2", "2025-01-01") is not daily_calorie_summary(list(meals), "u2", "2025-01-01")
+
+
+def test_goal_progress_follows_users_and_metrics():
+    cache.cache_clear()
+    users = TrackedList("users", [{"id": "u1", "goal": {"type": "weight_loss", "target_weight_kg": 70, "start_date": "2025-01-01"}}])
+    metrics = TrackedList("metrics")
+    log_metric(metrics, {"user_id": "u1", "date": "2025-01-01", "type": "weight_kg", "value": 80})
+    log_metric(metrics, {"user_id": "u1", "date": "2025-01-10", "type": "weight_kg", "value": 78})
+    assert goal_progress(users, metrics, "u1")["target_weight_kg"] == 70.0
+    update_goal(users, "u1", {"type": "weight_loss", "target_weight_kg": 75})
+    assert goal_progress(users, metrics, "u1")["target_weight_kg"] == 75.0
+
+
+def test_disable_and_eviction(monkeypatch):
+    cache.cache_clear()
+    meals = TrackedList("nutrition")
+    monkeypatch.setattr(cache, "CACHE_SIZE", 2)
+    for d in ("2025-01-01", "2025-01-02", "2025-01-03"):
+        daily_calorie_summary(meals, "u1", d)
+    assert cache.cache_info()["evictions"] == 1 and cache.cache_info()["size"] == 2
+
+    cache.set_enabled(False)
+    try:
+        daily_calorie_summary(meals, "u1", "2025-01-03")
+        assert cache.cache_info()["hits"] == 0 and cache.cache_info()["size"] == 0
+    finally:
+        cache.set_enabled(True)
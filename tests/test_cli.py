@@ -0,0 +1,66 @@
+import io
+import json
+
+import cli
+from storage import load_state, save_state
+
+
+def _setup(tmp_path):
+    base = str(tmp_path)
+    users = [{"id": "u1", "email": "a@b.c", "name": "A", "goal": {"type": "weight_loss", "target_weight_kg": 70}}]
+    save_state(base, users, [], [], [])
+    return base
+
+
+def test_batch_runs_many_ops_with_one_save(tmp_path, capsys, monkeypatch):
+    base = _setup(tmp_path)
+    lines = [
+        json.dumps({"op": "log-workout", "user": "a@b.c", "date": "2025-01-06", "type": "strength", "duration": 40,
+                    "exercise": {"name": "Squat", "weight_kg": 100}}),
+        json.dumps(["log-metric", "--user", "u1", "--date", "2025-01-01", "--type", "weight_kg", "--value", "80"]),
+        "log-metric --user u1 --date 2025-01-08 --type weight_kg --value 79",
+        "log-metric --user u1 --date 2025-01-08 --type weight_kg --value 79",
+        json.dumps({"op": "log-meal", "user": "u1", "json": {"timestamp": "2025-01-06 12:00", "meal_type": "lunch", "calories": 600,
+                                                          "macros": {"protein_g": 40, "carbs_g": 60, "fat_g": 20}}}),
+        "# comment",
+        json.dumps({"op": "summary weekly", "user": "u1", "week_start": "2025-01-06"}),
+        "goal-progress --user nobody@x.y",
+    ]
+    monkeypatch.setattr("sys.stdin", io.StringIO("\n".join(lines) + "\n"))
+    assert cli.main(["--base-dir", base, "batch"]) == 1
+    out = [json.loads(x) for x in capsys.readouterr().out.splitlines()]
+    assert [o["ok"] for o in out] == [True, True, True, False, True, True, False]
+    assert out[0]["result"]["pr_flags"] and "Duplicate" in out[3]["error"]
+    assert out[5]["result"]["total_workouts"] == 1
+
+    users, workouts, meals, metrics = load_state(base)
+    assert len(workouts) == 1 and len(meals) == 1 and len(metrics) == 2
+
+
+def test_batch_lists_repeat_options_and_argparse_output_stays_json(tmp_path, capsys, monkeypatch):
+    base = _setup(tmp_path)
+    lines = [
+        json.dumps({"op": "log-workout", "user": "u1", "date": "2025-01-06", "type": "strength", "duration": 40,
+                    "exercise": [{"name": "Squat", "weight_kg": 100}, {"name": "Bench", "weight_kg": 60}]}),
+        "log-metric --user u1 --value heavy",
+        "summary --help",
+    ]
+    monkeypatch.setattr("sys.stdin", io.StringIO("\n".join(lines) + "\n"))
+    assert cli.main(["--base-dir", base, "batch"]) == 1
+    captured = capsys.readouterr()
+    out = [json.loads(x) for x in captured.out.splitlines()]
+    assert [e["name"] for e in out[0]["result"]["exercises"]] == ["Squat", "Bench"]
+    assert out[1] == {"line": 2, "ok": False, "error": "main.py log-metric: error: argument --value: invalid float value: 'heavy'"}
+    assert not out[2]["ok"] and out[2]["error"].startswith("usage: main.py summary")
+    assert captured.err == ""
+
+
+def test_single_command_prints_json(tmp_path, capsys):
+    base = _setup(tmp_path)
+    assert cli.main(["--base-dir", base, "log-meal", "--user", "u1", "--timestamp", "2025-01-02 08:00", "--meal-type", "breakfast",
+                     "--calories", "300", "--protein", "10", "--item", "Oats:80"]) == 0
+    assert json.loads(capsys.readouterr().out)["items"] == [{"name": "Oats", "grams": 80.0}]
+    assert cli.main(["--base-dir", base, "macros", "--user", "u1", "--start", "2025-01-01", "--end", "2025-01-31"]) == 0
+    assert json.loads(capsys.readouterr().out)["calories"] == 300.0
+    assert cli.main(["--base-dir", base, "export", "--user", "a@b.c", "--collections", "nutrition"]) == 0
+    assert len(json.loads(capsys.readouterr().out)["nutrition"]) == 1
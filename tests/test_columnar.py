@@ -0,0 +1,37 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from columnar import metric_columns
+from metrics import log_metric, metrics_summary, goal_progress, metric_history, moving_average
+from records import TrackedList, emit
+
+
+def test_columns_match_list_summaries():
+    users = [{"id": "u1", "goal": {"type": "weight_loss", "target_weight_kg": 70}}]
+    metrics = TrackedList("metrics")
+    entries = [("2025-01-20", 78.5), ("2025-01-01", 80), ("2025-01-10", 79), ("2025-01-10", 79.4), ("2025-01-25", 78)]
+    for i in range(20):
+        entries.append((f"2024-12-{i + 1:02d}", 81 - i / 10))
+    for d, v in entries:
+        log_metric(metrics, {"user_id": "u1", "date": d, "type": "weight_kg", "value": v})
+    log_metric(metrics, {"user_id": "u1", "date": "bad", "type": "weight_kg", "value": 1})
+    cols = metric_columns(metrics)
+    assert len(cols.series(("u1", "weight_kg"))) == len(entries)
+
+    moved = metrics[0]
+    moved["date"] = "2024-11-30"
+    emit(metrics, "put", moved)
+
+    plain = list(metrics)
+    for period in (("2025-01-01", "2025-01-31"), ("2024-11-01", "2025-01-10"), ("2026-01-01", "2026-02-01")):
+        assert metrics_summary(metrics, "u1", "weight_kg", period) == metrics_summary(plain, "u1", "weight_kg", period)
+    assert goal_progress(users, metrics, "u1") == goal_progress(users, plain, "u1")
+    assert metric_history(metrics, "u1", "weight_kg", last=5) == metric_history(plain, "u1", "weight_kg", last=5)
+    assert metric_history(metrics, "u1", "mood") == []
+
+
+def test_vectorized_moving_average():
+    values = [float(i % 13) for i in range(200)]
+    expected = [sum(values[max(0, i - 6) : i + 1]) / len(values[max(0, i - 6) : i + 1]) for i in range(200)]
+    assert moving_average(values, 7) == pytest.approx(expected)
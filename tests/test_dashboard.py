@@ -0,0 +1,54 @@
+from datetime import date
+
+from dashboard import dashboard_model
+from metrics import goal_progress, log_metric
+from nutrition import log_meal
+from records import TrackedList
+from workouts import delete_workout, log_workout, update_workout
+
+TODAY = date(2025, 3, 10)
+
+
+def _model(user, users, workouts, meals, metrics):
+    indexed = dashboard_model(user, users, workouts, meals, metrics, today=TODAY)
+    plain = dashboard_model(user, list(users), list(workouts), list(meals), list(metrics), today=TODAY)
+    assert indexed == plain
+    return indexed
+
+
+def test_dashboard_model_follows_mutations():
+    user = {"id": "u1", "name": "A", "goal": {"type": "weight_loss", "target_weight_kg": 70, "daily_calorie_goal": 2000}}
+    users, workouts, meals, metrics = TrackedList("users", [user]), TrackedList("workouts"), TrackedList("nutrition"), TrackedList("metrics")
+    m = _model(user, users, workouts, meals, metrics)
+    assert m["todays_workouts"] == [] and m["last_workout_date"] is None and m["goal_progress"]["progress_pct"] is None
+
+    a = log_workout(workouts, {"user_id": "u1", "date": "2025-03-01", "type": "cardio", "duration_min": 30, "exercises": []})
+    b = log_workout(workouts, {"user_id": "u1", "date": "2025-03-10", "type": "strength", "duration_min": 40, "exercises": []})
+    c = log_workout(workouts, {"user_id": "u1", "date": "2025-03-10", "type": "cardio", "duration_min": 20, "exercises": []})
+    log_workout(workouts, {"user_id": "u2", "date": "2025-03-11", "type": "cardio", "duration_min": 20, "exercises": []})
+    update_workout(workouts, b["id"], {"duration_min": 45})
+    m = _model(user, users, workouts, meals, metrics)
+    assert [w["id"] for w in m["todays_workouts"]] == [b["id"], c["id"]] and m["last_workout_date"] == TODAY
+
+    # Moving an older workout onto a day that already has workouts keeps list order.
+    update_workout(workouts, a["id"], {"date": "2025-03-10"})
+    m = _model(user, users, workouts, meals, metrics)
+    assert [w["id"] for w in m["todays_workouts"]] == [a["id"], b["id"], c["id"]]
+    update_workout(workouts, a["id"], {"date": "2025-03-01"})
+
+    update_workout(workouts, b["id"], {"date": "2025-03-05"})
+    delete_workout(workouts, c["id"])
+    m = _model(user, users, workouts, meals, metrics)
+    assert m["todays_workouts"] == [] and m["last_workout_date"] == date(2025, 3, 5)
+    delete_workout(workouts, b["id"])
+    assert _model(user, users, workouts, meals, metrics)["last_workout_date"] == date(2025, 3, 1)
+    delete_workout(workouts, a["id"])
+    assert _model(user, users, workouts, meals, metrics)["last_workout_date"] is None
+
+    log_meal(meals, {"user_id": "u1", "timestamp": "2025-03-10 08:00", "meal_type": "breakfast", "items": [], "calories": 450, "macros": {}})
+    for d, v in (("2025-01-01", 80), ("2025-02-20", "bad"), ("2025-02-25", 78), ("2025-03-09", 76), ("2025-03-09", 75.5)):
+        log_metric(metrics, {"user_id": "u1", "date": d, "type": "weight_kg", "value": v})
+    m = _model(user, users, workouts, meals, metrics)
+    assert m["calories"]["total_calories"] == 450.0
+    assert m["goal_progress"] == goal_progress.uncached(list(users), list(metrics), "u1")
+    assert m["goal_progress"]["current_weight_kg"] == 75.5 and m["goal_progress"]["projected_end_date"]
@@ -0,0 +1,27 @@
+from datetime import datetime
+
+import pytest
+
+import dates
+
+
+def test_parsers_are_memoized_and_strict():
+    dates.parse_date.cache_clear()
+    assert dates.parse_date("2025-03-01") is dates.parse_date("2025-03-01")
+    assert dates.cache_info()["date"]["hits"] == 1
+
+    with pytest.raises(ValueError):
+        dates.parse_date("2025-02-30")
+    assert dates.day_ordinal("nope") is None
+    assert dates.timestamp_ordinal("2025-03-01 07:30") == dates.day_ordinal("2025-03-01")
+    assert dates.minute_of_day("2025-03-01 07:30") == 450
+
+
+def test_fast_path_agrees_with_strptime():
+    for s in ("2025-03-01", "2024-02-29", "2025-1-5", "0001-01-01"):
+        assert dates.parse_date(s) == datetime.strptime(s, "%Y-%m-%d").date()
+    for s in ("2025-03-01 07:30", "2025-3-1 7:05"):
+        assert dates.parse_datetime(s) == datetime.strptime(s, "%Y-%m-%d %H:%M")
+    for bad in ("2025-02-30", "0000-01-01", "2025-03-01T07:30", "2025-03-01 24:00"):
+        with pytest.raises(ValueError):
+            dates.parse_date(bad) if len(bad) == 10 else dates.parse_datetime(bad)
@@ -0,0 +1,103 @@
+import json
+import os
+
+import pytest
+
+import exporter
+import importer
+from records import TrackedList
+from storage import iter_collection, iter_json, load_state, save_state, migrate_to_sharded
+from workouts import log_workout, update_workout, delete_workout
+from nutrition import log_meal
+from metrics import log_metric
+
+
+def _setup(base):
+    users = [{"id": "u1", "email": "a@b.c"}, {"id": "u2", "email": "d@e.f"}]
+    workouts, meals, metrics = [], [], []
+    log_workout(workouts, {"user_id": "u1", "date": "2025-01-02", "type": "strength", "duration_min": 40,
+                           "exercises": [{"name": "Squat", "weight_kg": 100}], "notes": "légères, \"heavy\""})
+    log_meal(meals, {"user_id": "u1", "timestamp": "2025-01-02 08:05", "meal_type": "breakfast", "items": [{"name": "Oats"}],
+                     "calories": 300, "macros": {"protein_g": 10, "carbs_g": 50, "fat_g": 5}})
+    for uid, day, v in (("u1", "2025-01-01", 80), ("u1", "2025-01-05", 79.5), ("u2", "2025-01-03", 60), ("u1", "bad", 1)):
+        log_metric(metrics, {"user_id": uid, "date": day, "type": "weight_kg", "value": v})
+    save_state(base, users, workouts, meals, metrics)
+    return workouts, meals, metrics
+
+
+def test_iter_json_streams_any_layout(tmp_path):
+    path = tmp_path / "x.json"
+    records = [{"id": i, "s": "a]b,{" * i} for i in range(50)]
+    path.write_text(json.dumps(records, indent=2))
+    assert list(iter_json(str(path), chunk_size=7)) == records
+    path.write_text("[]")
+    assert list(iter_json(str(path))) == []
+
+    text = json.dumps(records, indent=2).replace('"id": 20', '"id": 20x', 1)
+    path.write_text(text)
+    seen = []
+    start = text.rindex("{", 0, text.index('"id": 20x'))
+    with pytest.raises(ValueError, match=f"at byte {start}:"):
+        seen.extend(iter_json(str(path), chunk_size=64))
+    assert len(seen) == 20  # stopped at the bad record, not at the end of the file
+    path.write_text(json.dumps(records)[:-30])
+    with pytest.raises(ValueError, match="malformed record"):
+        list(iter_json(str(path)))
+
+
+def test_journal_mode_streams_the_checkpoint_patched_by_the_journal(tmp_path):
+    base = str(tmp_path)
+    _setup(base)
+    users, workouts, meals, metrics = load_state(base, "journal")
+    first = workouts[0]
+    w = {"user_id": "u1", "type": "cardio", "duration_min": 20, "exercises": []}
+    second = log_workout(workouts, dict(w, date="2025-01-03"))
+    third = log_workout(workouts, dict(w, date="2025-01-04"))
+    update_workout(workouts, first["id"], {"duration_min": 45})
+    delete_workout(workouts, second["id"])
+    log_workout(workouts, dict(w, date="2025-01-05"))
+    log_workout(workouts, dict(second, duration_min=25))  # deleted, then back under the same id: now last
+    delete_workout(workouts, third["id"])
+
+    streamed = list(iter_collection(base, "workouts", "journal"))
+    assert streamed == list(load_state(base, "journal")[1])
+    assert [x["duration_min"] for x in streamed] == [45, 20, 25]
+
+
+def test_export_filters_and_round_trips(tmp_path):
+    base = str(tmp_path)
+    workouts, meals, metrics = _setup(base)
+
+    rows = list(exporter.iter_records(base, "metrics", user_id="u1", start="2025-01-01", end="2025-01-04"))
+    assert [r["value"] for r in rows] == [80]
+    assert len(list(exporter.iter_records(base, "metrics", user_id="u1"))) == 3
+
+    out = str(tmp_path / "m.ftc")
+    report = exporter.export(base, "metrics", out, "columnar")
+    assert report["records"] == 4 and report["bytes"] == os.path.getsize(out)
+    back = list(exporter.read_columnar(out))
+    assert [(r["id"], r["date"], r["value"]) for r in back] == [(m["id"], m["date"] if m["date"] != "bad" else None, m["value"]) for m in metrics]
+
+    with open(tmp_path / "n.ftc", "wb") as f:
+        exporter.write_columnar("nutrition", meals, f, block_rows=1)
+    (meal,) = exporter.read_columnar(str(tmp_path / "n.ftc"))
+    assert meal["timestamp"] == "2025-01-02 08:05" and meal["protein_g"] == 10.0 and meal["items"] == [{"name": "Oats"}]
+
+    exporter.export(base, "workouts", str(tmp_path / "w.csv"), "csv")
+    exporter.export(base, "nutrition", str(tmp_path / "n.ndjson"), "ndjson")
+    users = TrackedList("users", [{"id": "u1"}])
+    ws, ms = TrackedList("workouts"), TrackedList("nutrition")
+    assert importer.import_rows("workouts", importer.read_rows(str(tmp_path / "w.csv")), users, ws)["imported"] == 1
+    assert importer.import_rows("nutrition", importer.read_rows(str(tmp_path / "n.ndjson")), users, ms)["imported"] == 1
+    assert ws[0]["exercises"] == workouts[0]["exercises"] and ws[0]["notes"] == workouts[0]["notes"]
+    assert ms[0] == meals[0]
+
+
+def test_export_from_sharded_and_sqlite(tmp_path):
+    base = str(tmp_path)
+    _setup(base)
+    migrate_to_sharded(base)
+    assert [r["value"] for r in exporter.iter_records(base, "metrics", "sharded", user_id="u2")] == [60]
+    load_state(base, "sqlite")[0].db.close()
+    assert exporter.find_user_id(base, "D@E.F", "sqlite") == "u2"
+    assert len(list(exporter.iter_records(base, "metrics", "sqlite", user_id="u1"))) == 3
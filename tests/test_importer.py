@@ -0,0 +1,71 @@
+import json
+
+import importer
+from records import TrackedList
+
+
+def test_csv_and_ndjson_import_with_rejections_and_duplicates(tmp_path):
+    users = TrackedList("users", [{"id": "u1", "email": "a@b.c"}])
+    metrics = TrackedList("metrics")
+    csv_path = tmp_path / "weights.csv"
+    csv_path.write_text(
+        "date,type,value\n"
+        "2025-01-01,weight_kg,80\n"
+        "2025-01-02,weight_kg,79.6\n"
+        "2025-01-02,weight_kg,79.6\n"
+        "2025-13-01,weight_kg,79\n"
+        "2025-01-03,weight_kg,heavy\n"
+        "2999-01-01,weight_kg,70\n"
+        ",weight_kg,70\n"
+    )
+    commits = []
+    report = importer.import_rows("metrics", importer.read_rows(str(csv_path)), users, metrics, user_id="u1",
+                                  batch_size=1, commit=lambda: commits.append(len(metrics)))
+    assert (report["rows"], report["imported"], report["duplicates"], report["rejected"]) == (7, 2, 1, 4)
+    assert [r["reason"] for r in report["rejections"]] == ["bad date", "value is not a number", "date in the future", "missing date"]
+    assert [r["row"] for r in report["rejections"]] == [5, 6, 7, 8]
+    assert commits == [1, 2] and report["records_per_second"] > 0
+
+    meals = TrackedList("nutrition")
+    nd = tmp_path / "meals.ndjson"
+    rows = [
+        {"user_id": "u1", "timestamp": "2025-01-01 08:00", "meal_type": "breakfast", "calories": 300, "protein_g": 10},
+        {"user_id": "u2", "timestamp": "2025-01-01 08:00", "meal_type": "breakfast", "calories": 300},
+        {"user_id": "u1", "timestamp": "2025-01-01 12:30", "meal_type": "lunch", "calories": "550",
+         "macros": {"protein_g": 30, "carbs_g": 50, "fat_g": 20}, "items": [{"name": "Rice"}]},
+    ]
+    nd.write_text("\n".join(json.dumps(r) for r in rows) + "\nnot json\n")
+    report = importer.import_rows("nutrition", importer.read_rows(str(nd)), users, meals, workers=2)
+    assert report["imported"] == 2 and [r["reason"] for r in report["rejections"]] == ["unknown user u2", "not a JSON object"]
+    assert meals[0]["macros"] == {"protein_g": 10.0, "carbs_g": 0.0, "fat_g": 0.0} and meals[1]["calories"] == 550.0
+
+
+def test_macros_that_are_not_an_object_are_rejected(tmp_path):
+    users = TrackedList("users", [{"id": "u1"}])
+    meals = TrackedList("nutrition")
+    nd = tmp_path / "meals.ndjson"
+    meal = {"user_id": "u1", "timestamp": "2025-01-01 08:00", "meal_type": "breakfast", "calories": 300}
+    nd.write_text(json.dumps({**meal, "macros": [1]}) + "\n")
+    csv_path = tmp_path / "meals.csv"
+    csv_path.write_text("user_id,timestamp,meal_type,calories,macros\nu1,2025-01-01 08:00,breakfast,300,5\n")
+
+    for path in (nd, csv_path):
+        report = importer.import_rows("nutrition", importer.read_rows(str(path)), users, meals)
+        assert report["imported"] == 0 and [r["reason"] for r in report["rejections"]] == ["macros is not an object"]
+
+
+def test_workouts_get_pr_flags_and_odd_user_ids_are_rejected(tmp_path):
+    users = TrackedList("users", [{"id": "u1"}])
+    workouts = TrackedList("workouts")
+    nd = tmp_path / "workouts.ndjson"
+    lift = {"user_id": "u1", "type": "strength", "duration_min": 40}
+    rows = [
+        {**lift, "date": "2025-01-01", "exercises": [{"name": "Squat", "weight_kg": 100}]},
+        {**lift, "date": "2025-01-02", "exercises": [{"name": "Squat", "weight_kg": 90}]},
+        {**lift, "date": "2025-01-03", "user_id": ["u1"]},
+        {**lift, "date": "2025-01-04", "user_id": {"id": "u1"}},
+    ]
+    nd.write_text("\n".join(json.dumps(r) for r in rows) + "\n")
+    report = importer.import_rows("workouts", importer.read_rows(str(nd)), users, workouts)
+    assert report["imported"] == 2 and [r["reason"] for r in report["rejections"]] == ["user_id is not a string"] * 2
+    assert [w["pr_flags"] for w in workouts] == [["PR: Heaviest lift 100.0 kg (Squat)"], []]
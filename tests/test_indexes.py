@@ -0,0 +1,53 @@
+from indexes import date_index, unique_index
+from storage import prevent_duplicate, UNIQUE_KEYS
+from records import TrackedList
+from workouts import log_workout, update_workout, delete_workout, weekly_workout_summary
+from nutrition import log_meal, daily_calorie_summary, macro_breakdown
+from metrics import log_metric, metrics_summary
+
+
+def test_date_index_follows_mutations():
+    ws = TrackedList("workouts")
+    a = log_workout(ws, {"user_id": "u1", "date": "2025-01-06", "type": "strength", "duration_min": 40, "exercises": []})
+    log_workout(ws, {"user_id": "u2", "date": "2025-01-07", "type": "cardio", "duration_min": 20, "exercises": []})
+    ix = date_index(ws)
+    b = log_workout(ws, {"user_id": "u1", "date": "2025-01-20", "type": "cardio", "duration_min": 30, "exercises": []})
+    assert [w["id"] for w in ix.range("u1", 0, 10**7)] == [a["id"], b["id"]]
+
+    update_workout(ws, b["id"], {"date": "2025-01-08"})
+    s = weekly_workout_summary(ws, "u1", "2025-01-06")
+    assert s["total_workouts"] == 2 and s["by_type"] == {"strength": 1, "cardio": 1, "flexibility": 0}
+    assert s == weekly_workout_summary(list(ws), "u1", "2025-01-06")
+
+    delete_workout(ws, a["id"])
+    assert weekly_workout_summary(ws, "u1", "2025-01-06")["total_minutes"] == 30.0
+
+
+def test_meal_and_metric_summaries_match_scans():
+    meals, metrics = TrackedList("nutrition"), TrackedList("metrics")
+    for ts, mt, cal in (("2025-01-01 08:00", "breakfast", 300), ("2025-01-01 19:30", "dinner", 650), ("2025-01-02 12:00", "lunch", 500)):
+        log_meal(meals, {"user_id": "u1", "timestamp": ts, "meal_type": mt, "items": [], "calories": cal, "macros": {"protein_g": 10, "carbs_g": 20, "fat_g": 5}})
+    for d, v in (("2025-01-03", 7), ("2025-01-01", 6.5), ("2025-01-03", 8)):
+        log_metric(metrics, {"user_id": "u1", "date": d, "type": "sleep_hours", "value": v})
+
+    assert daily_calorie_summary(meals, "u1", "2025-01-01") == daily_calorie_summary(list(meals), "u1", "2025-01-01")
+    assert daily_calorie_summary(meals, "u1", "2025-01-01")["total_calories"] == 950.0
+    rng = ("2025-01-02", "2025-01-05")
+    assert macro_breakdown(meals, "u1", rng) == macro_breakdown(list(meals), "u1", rng)
+    period = ("2025-01-01", "2025-01-31")
+    assert metrics_summary(metrics, "u1", "sleep_hours", period) == metrics_summary(list(metrics), "u1", "sleep_hours", period)
+
+
+def test_prevent_duplicate_uses_unique_index():
+    ws = TrackedList("workouts")
+    keys = UNIQUE_KEYS["workouts"]
+    entry = {"user_id": "u1", "date": "2025-01-06", "type": "strength", "duration_min": 40, "exercises": []}
+    assert not prevent_duplicate(ws, keys, entry)
+    w = log_workout(ws, entry)
+    assert prevent_duplicate(ws, keys, dict(entry))
+    assert unique_index(ws, keys) is ws.indexes[("unique",) + keys]
+
+    update_workout(ws, w["id"], {"type": "cardio"})
+    assert not prevent_duplicate(ws, keys, entry)
+    delete_workout(ws, w["id"])
+    assert not prevent_duplicate(ws, keys, {**entry, "type": "cardio"})
@@ -0,0 +1,76 @@
+import logging
+import os
+import pstats
+
+import cli
+import instrument
+from storage import load_state, save_state
+from workouts import weekly_workout_summary
+
+
+def _fresh(monkeypatch):
+    monkeypatch.setattr(instrument, "_enabled", False)
+    monkeypatch.setattr(instrument, "_slow_ms", None)
+    monkeypatch.setattr(instrument, "_ops", {})
+
+
+def _workouts():
+    return [{"id": f"w{i}", "user_id": "u1", "date": f"2025-01-0{i + 1}", "type": "cardio", "duration_min": 30} for i in range(5)]
+
+
+def test_nothing_is_recorded_while_disabled(tmp_path, monkeypatch):
+    _fresh(monkeypatch)
+    save_state(str(tmp_path), [{"id": "u1"}], [], [], [])
+    weekly_workout_summary(_workouts(), "u1", "2025-01-01")
+    assert instrument.as_json()["ops"] == {}
+
+
+def test_counts_latency_records_and_bytes(tmp_path, monkeypatch):
+    _fresh(monkeypatch)
+    instrument.enable()
+    base = str(tmp_path)
+    save_state(base, [{"id": "u1"}], _workouts(), [], [])
+    load_state(base)
+    assert weekly_workout_summary(_workouts(), "u1", "2025-01-01")["total_workouts"] == 5
+
+    ops = instrument.as_json()["ops"]
+    size = os.path.getsize(os.path.join(base, "data", "workouts.json"))
+    assert ops["storage.save_state"]["calls"] == 1 and ops["storage.save_state"]["bytes_written"] >= size
+    # load_state counts what its _read_json calls read.
+    assert ops["storage.load_state"]["bytes_read"] == ops["storage._read_json"]["bytes_read"] >= size
+    assert ops["storage.load_state"]["records_scanned"] == 6
+    assert ops["workouts.weekly_workout_summary"]["records_scanned"] == 5
+    assert sum(ops["storage._read_json"]["histogram_ms"].values()) == ops["storage._read_json"]["calls"]
+
+    text = instrument.prometheus()
+    assert 'fitness_op_seconds_count{op="storage.load_state"} 1' in text
+    assert 'fitness_op_seconds_bucket{op="storage.load_state",le="+Inf"} 1' in text
+    assert 'fitness_records_scanned_total{op="workouts.weekly_workout_summary"} 5' in text
+
+
+def test_slow_calls_are_logged(monkeypatch, caplog):
+    _fresh(monkeypatch)
+    instrument.enable(slow_ms=1e-9)
+    with caplog.at_level(logging.WARNING, logger="fitness.slow"):
+        weekly_workout_summary(_workouts(), "u1", "2025-01-01")
+    assert "workouts.weekly_workout_summary" in caplog.text and "scanned 5 records" in caplog.text
+
+
+def test_cli_profile_and_stats(tmp_path, monkeypatch, capsys):
+    _fresh(monkeypatch)
+    base = str(tmp_path)
+    save_state(base, [{"id": "u1", "email": "a@b.c"}], _workouts(), [], [])
+    out = str(tmp_path / "week.prof")
+    assert cli.main(["--base-dir", base, "--profile", out, "--stats", "prometheus",
+                     "summary", "weekly", "--user", "u1", "--week-start", "2025-01-01"]) == 0
+    assert pstats.Stats(out).total_calls > 0
+    assert 'fitness_op_seconds_count{op="workouts.weekly_workout_summary"} 1' in capsys.readouterr().err
+
+
+def test_bad_slow_ms_setting_warns_instead_of_failing(monkeypatch, caplog):
+    monkeypatch.setenv("FITNESS_SLOW_MS", "fast")
+    with caplog.at_level(logging.WARNING, logger="fitness.slow"):
+        assert instrument._env_slow_ms() is None
+    assert "FITNESS_SLOW_MS='fast'" in caplog.text
+    monkeypatch.setenv("FITNESS_SLOW_MS", "250")
+    assert instrument._env_slow_ms() == 250.0
@@ -1,4 +1,6 @@
-from nutrition import log_meal, daily_calorie_summary
+from nutrition import log_meal, update_meal, delete_meal, daily_calorie_summary, macro_breakdown, meal_rollups
+from records import TrackedList
+from storage import load_state, save_state
 
 
 def test_daily_calorie_summary():
@@ -27,3 +29,27 @@ def test_daily_calorie_summary():
     assert s["total_calories"] == 900.0
     assert s["by_meal_type"]["breakfast"] == 300.0
     assert s["by_meal_type"]["lunch"] == 600.0
+
+
+def test_rollups_follow_updates_and_survive_reload(tmp_path):
+    meals = TrackedList("nutrition")
+    macros = {"protein_g": 10, "carbs_g": 20, "fat_g": 5}
+    a = log_meal(meals, {"user_id": "u1", "timestamp": "2025-01-01 08:00", "meal_type": "breakfast", "items": [], "calories": 300, "macros": macros})
+    b = log_meal(meals, {"user_id": "u1", "timestamp": "2025-01-01 19:00", "meal_type": "dinner", "items": [], "calories": 700, "macros": macros})
+    log_meal(meals, {"user_id": "u1", "timestamp": "2025-01-03 12:00", "meal_type": "lunch", "items": [], "calories": 500, "macros": macros})
+    assert daily_calorie_summary(meals, "u1", "2025-01-01")["total_calories"] == 1000.0
+
+    update_meal(meals, b["id"], {"timestamp": "2025-01-02 19:00"})
+    delete_meal(meals, a["id"])
+    plain = list(meals)
+    for d in ("2025-01-01", "2025-01-02", "2025-01"):
+        assert daily_calorie_summary(meals, "u1", d) == daily_calorie_summary(plain, "u1", d)
+    rng = ("2025-01-01", "2025-01-02")
+    assert macro_breakdown(meals, "u1", rng) == macro_breakdown(plain, "u1", rng)
+
+    base = str(tmp_path)
+    save_state(base, [], [], meals, [])
+    _, _, loaded, _ = load_state(base)
+    assert "rollups" in loaded.indexes
+    assert daily_calorie_summary(loaded, "u1", "2025-01-02") == daily_calorie_summary(plain, "u1", "2025-01-02")
+    assert meal_rollups(loaded).days("u1", 0, 10**7) == meal_rollups(meals).days("u1", 0, 10**7)
@@ -0,0 +1,24 @@
+import records
+from records import TrackedList
+from workouts import log_workout, update_workout, delete_workout
+
+
+def test_tracked_list_tombstones_and_compaction(monkeypatch):
+    monkeypatch.setattr(records, "COMPACT_MIN_TOMBSTONES", 3)
+    ws = TrackedList("workouts")
+    ids = [log_workout(ws, {"user_id": "u1", "date": "2025-01-01", "type": "cardio", "duration_min": i + 1, "exercises": []})["id"] for i in range(10)]
+
+    update_workout(ws, ids[4], {"duration_min": 99})
+    assert ws.by_id(ids[4])["duration_min"] == 99
+
+    assert delete_workout(ws, ids[0]) and delete_workout(ws, ids[5])
+    assert not delete_workout(ws, ids[0])
+    assert len(ws) == 8 and list.__len__(ws) == 10  # tombstoned, not shifted
+    assert [w["id"] for w in ws] == ids[1:5] + ids[6:]
+    assert ws[0]["id"] == ids[1] and list.__len__(ws) == 8  # positional access compacts
+
+    for i in (1, 2, 3):
+        delete_workout(ws, ids[i])
+    assert list.__len__(ws) == 5  # third tombstone triggered compaction
+    assert [w["duration_min"] for w in ws] == [99, 7, 8, 9, 10]
+    assert ws.by_id(ids[9])["duration_min"] == 10
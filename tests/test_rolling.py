@@ -0,0 +1,44 @@
+import random
+from datetime import date, timedelta
+
+import pytest
+
+import rolling
+from metrics import moving_average
+
+
+def _naive(values, window, fn):
+    return [fn(values[max(0, i - window + 1) : i + 1]) for i in range(len(values))]
+
+
+def test_count_windows_match_naive():
+    rng = random.Random(3)
+    values = [round(rng.uniform(50, 90), 1) for _ in range(300)]
+    for w in (1, 3, 7, 30):
+        assert rolling.sma(values, w) == pytest.approx(_naive(values, w, lambda c: sum(c) / len(c)))
+        assert rolling.rolling_min(values, w) == _naive(values, w, min)
+        assert rolling.rolling_max(values, w) == _naive(values, w, max)
+    assert moving_average(values[:20], 7) == pytest.approx(_naive(values[:20], 7, lambda c: sum(c) / len(c)))
+
+
+def test_streams_and_ewma():
+    s = rolling.sma_stream(2)
+    assert [s.send(v) for v in (2.0, 4.0, 8.0)] == [2.0, 3.0, 6.0]
+    e = rolling.ewma([10.0, 20.0, 20.0], rolling.span_alpha(3))
+    assert e == pytest.approx([10.0, 15.0, 17.5])
+    with pytest.raises(ValueError):
+        rolling.sma_stream(0)
+    with pytest.raises(ValueError):
+        rolling.ewma([1.0], 0)
+
+
+def test_time_windows_use_calendar_days():
+    d0 = date(2025, 1, 1)
+    points = [(d0, 80.0), (d0 + timedelta(days=1), 79.0), (d0 + timedelta(days=10), 70.0), ("2025-01-12", 72.0)]
+    assert rolling.time_sma(points, 7) == [80.0, 79.5, 70.0, 71.0]
+    assert rolling.time_max(points, 7) == [80.0, 80.0, 70.0, 72.0]
+    assert rolling.time_min(points, 2) == [80.0, 79.0, 70.0, 70.0]
+    assert rolling.time_min(points, 1)[-1] == 72.0
+    assert moving_average([80.0, 70.0], 7, dates=["2025-01-01", "2025-01-20"]) == [80.0, 70.0]
+    with pytest.raises(ValueError):
+        rolling.time_sma([(d0 + timedelta(days=1), 1.0), (d0, 2.0)], 7)
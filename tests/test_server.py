@@ -0,0 +1,112 @@
+import asyncio
+import json
+
+import server
+from loadtest import Client
+from server import Service
+from storage import load_state
+
+PROFILE = {"name": "ann", "email": "ann@example.com", "pin": "1234", "age": 30, "height_cm": 170, "weight_kg": 70}
+
+
+def _serve(base, scenario):
+    async def go():
+        svc = Service(base, "json")
+        await svc.start()
+        server = await asyncio.start_server(svc.handle, "127.0.0.1", 0)
+        client = await Client("127.0.0.1", server.sockets[0].getsockname()[1]).connect()
+        try:
+            return await scenario(svc, client)
+        finally:
+            await client.close()
+            server.close()
+            await server.wait_closed()
+            await svc.close()
+
+    return asyncio.run(go())
+
+
+def test_routes_answer_json_and_writes_are_saved(tmp_path):
+    base = str(tmp_path)
+
+    async def scenario(svc, c):
+        assert (await c.request("GET", "/prs"))[0] == 401
+        status, out = await c.request("POST", "/register", PROFILE)
+        assert status == 201 and "pin" not in out["user"]
+        c.token = out["token"]
+
+        w = {"date": "2025-01-06", "type": "strength", "duration_min": 40,
+             "exercises": [{"name": "Squat", "sets": 3, "reps": 5, "weight_kg": 100}]}
+        status, logged = await c.request("POST", "/workouts", w)
+        assert status == 201 and logged["pr_flags"]
+        assert (await c.request("POST", "/workouts", w))[0] == 400  # duplicate
+        # Acknowledged means saved.
+        assert [x["id"] for x in load_state(base)[1]] == [logged["id"]]
+
+        status, week = await c.request("GET", "/summary/weekly?week_start=2025-01-06")
+        assert status == 200 and week["total_workouts"] == 1
+        assert (await c.request("PATCH", f"/workouts/{logged['id']}", {"duration_min": 50}))[1]["duration_min"] == 50
+        assert (await c.request("GET", "/summary/range?start=2025-01-01"))[0] == 400
+        assert (await c.request("GET", "/nope"))[0] == 404
+        assert (await c.request("PUT", "/workouts"))[0] == 405
+
+        other = Client(c.host, c.port)
+        await other.connect()
+        _, out = await other.request("POST", "/register", {**PROFILE, "email": "bob@example.com"})
+        other.token = out["token"]
+        assert (await other.request("DELETE", f"/workouts/{logged['id']}"))[0] == 404
+        await other.close()
+
+        assert (await c.request("DELETE", f"/workouts/{logged['id']}"))[1] == {"deleted": True}
+        _, out = await c.request("POST", "/login", {"email": "ann@example.com", "pin": "1234"})
+        assert out["user"]["name"] == "Ann"
+        assert "ops" in (await c.request("GET", "/stats"))[1]
+        return svc.stats
+
+    stats = _serve(base, scenario)
+    assert stats["commits"] <= stats["writes"]
+    assert load_state(base)[1] == [] and len(load_state(base)[0]) == 2
+
+
+def test_queued_writes_share_one_save(tmp_path):
+    base = str(tmp_path)
+
+    async def scenario(svc, c):
+        _, out = await c.request("POST", "/register", PROFILE)
+        headers = {"authorization": "Bearer " + out["token"]}
+        before = svc.stats["commits"]
+        posts = [
+            svc.dispatch("POST", "/metrics", headers, json.dumps({"date": f"2025-01-{d:02d}", "type": "weight_kg", "value": 70}).encode())
+            for d in range(1, 21)
+        ]
+        results = await asyncio.gather(*posts)
+        assert [status for status, _ in results] == [201] * 20
+        return svc.stats["commits"] - before
+
+    assert _serve(base, scenario) == 1
+    assert len(load_state(base)[3]) == 20
+
+
+def test_failed_save_answers_500_and_later_writes_go_through(tmp_path, monkeypatch):
+    base = str(tmp_path)
+    real_save = server.save_state
+    calls = []
+
+    def flaky_save(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise RuntimeError("disk on fire")
+        real_save(*args)
+
+    monkeypatch.setattr(server, "save_state", flaky_save)
+
+    async def scenario(svc, c):
+        status, out = await asyncio.wait_for(c.request("POST", "/register", PROFILE), 5)
+        assert status == 500 and "disk on fire" in out["error"]
+        # The writer task survived: the next batch saves, the first user included.
+        status, out = await asyncio.wait_for(c.request("POST", "/register", {**PROFILE, "email": "bob@example.com"}), 5)
+        assert status == 201
+        return svc.stats
+
+    assert _serve(base, scenario)["commits"] == 2
+    assert sorted(u["email"] for u in load_state(base)[0]) == ["ann@example.com", "bob@example.com"]
@@ -0,0 +1,103 @@
+import os
+
+import pytest
+
+import snapshot
+from storage import load_state, save_state, close_state, json_to_snapshot, snapshot_to_json, iter_collection, _read_json
+from workouts import log_workout, update_workout, delete_workout, weekly_workout_summary
+
+
+def _records():
+    users = [{"id": "u1", "name": "Ayşe", "email": "a@b.c", "pin": "1234", "age": 30, "height_cm": 170.5,
+              "weight_kg": 70.0, "activity_level": "high", "goal": {"type": "weight_loss", "target_weight_kg": 65}}]
+    workouts = []
+    log_workout(workouts, {"user_id": "u1", "date": "2025-01-06", "type": "strength", "duration_min": 40,
+                           "exercises": [{"name": "Squat", "weight_kg": 100}], "notes": "leg day"})
+    log_workout(workouts, {"user_id": "u1", "date": "2025-01-07", "type": "cardio", "duration_min": "30.5",
+                           "exercises": [], "notes": None, "big": 2**60, "flag": True})
+    return users, workouts
+
+
+def test_snapshot_round_trips_records_exactly(tmp_path):
+    users, workouts = _records()
+    path = str(tmp_path / "workouts.snap")
+    assert snapshot.write_snapshot(path, "workouts", workouts) == 2
+    snap = snapshot.Snapshot(path)
+    assert snap.ids() == [w["id"] for w in workouts]
+    back = [snap.record(i) for i in range(snap.rows)]
+    assert back == workouts and [list(r) for r in back] == [list(w) for w in workouts]
+    assert type(back[0]["duration_min"]) is int and back[1]["duration_min"] == "30.5"
+    snap.close()
+
+
+def test_snapshot_mode_decodes_lazily_and_saves(tmp_path):
+    base = str(tmp_path)
+    users, workouts = _records()
+    save_state(base, users, workouts, [], [])
+    assert json_to_snapshot(base) == {"users": 1, "workouts": 2, "nutrition": 0, "metrics": 0}
+
+    users, workouts, meals, metrics = load_state(base, "snapshot")
+    assert isinstance(workouts, snapshot.SnapshotList) and workouts._pending == 2
+    wid = [w["id"] for w in _read_json(os.path.join(base, "data", "workouts.json"))]
+    update_workout(workouts, wid[0], {"duration_min": 45})
+    assert workouts._pending == 1
+    assert weekly_workout_summary(workouts, "u1", "2025-01-06")["total_workouts"] == 2
+    assert workouts._pending == 0
+    delete_workout(workouts, wid[1])
+    log_workout(workouts, {"user_id": "u1", "date": "2025-01-08", "type": "flexibility", "duration_min": 20, "exercises": []})
+    save_state(base, users, workouts, meals, metrics, "snapshot")
+
+    _, ws, _, _ = load_state(base, "snapshot")
+    assert [w["duration_min"] for w in ws] == [45, 20] and ws[0]["exercises"] == [{"name": "Squat", "weight_kg": 100}]
+    assert len(list(iter_collection(base, "workouts", "snapshot"))) == 2
+    assert len(_read_json(os.path.join(base, "data", "workouts.json"))) == 2  # untouched until converted
+    assert snapshot_to_json(base)["workouts"] == 2
+    assert [w["duration_min"] for w in _read_json(os.path.join(base, "data", "workouts.json"))] == [45, 20]
+
+
+def test_saving_copies_unchanged_rows_and_maps_the_new_file(tmp_path, monkeypatch):
+    base = str(tmp_path)
+    users, workouts = _records()
+    for d in range(10, 30):
+        log_workout(workouts, {"user_id": "u1", "date": f"2025-01-{d}", "type": "cardio", "duration_min": d, "exercises": []})
+    save_state(base, users, workouts, [], [])
+    json_to_snapshot(base)
+
+    users, workouts, meals, metrics = load_state(base, "snapshot")
+    before = list(_read_json(os.path.join(base, "data", "workouts.json")))
+    by_id = {w["id"]: w for w in before}
+    assert workouts.by_id(before[5]["id"]) == before[5]  # decoded, unchanged
+    update_workout(workouts, before[3]["id"], {"duration_min": 99})
+    delete_workout(workouts, before[4]["id"])
+    added = log_workout(workouts, {"user_id": "u1", "date": "2025-02-01", "type": "cardio", "duration_min": 5, "exercises": []})
+    assert workouts._pending == len(before) - 3
+    old = workouts._snap
+
+    encoded = []
+    real_add = snapshot._Encoder.add
+    monkeypatch.setattr(snapshot._Encoder, "add", lambda self, r: (encoded.append(r["id"]), real_add(self, r)))
+    save_state(base, users, workouts, meals, metrics, "snapshot")
+    assert encoded == [before[3]["id"], added["id"]]
+    with pytest.raises(ValueError):
+        old.record(0)  # unmapped
+    assert workouts._snap is not old and workouts[3]["duration_min"] == 99
+
+    _, ws, _, _ = load_state(base, "snapshot")
+    expected = [dict(by_id[w["id"]], duration_min=99) if w is before[3] else by_id[w["id"]] for w in before if w is not before[4]]
+    assert list(ws) == expected + [added]
+    close_state(*load_state(base, "snapshot"))
+
+
+def test_saving_keeps_rows_that_share_an_id_or_have_none(tmp_path):
+    path = str(tmp_path / "workouts.snap")
+    rows = [{"id": "w1", "duration_min": 1}, {"id": "w1", "duration_min": 2},
+            {"id": None, "duration_min": 3}, {"duration_min": 4}, {"id": "w2", "duration_min": 5}]
+    snapshot.write_snapshot(path, "workouts", rows)
+    ws = snapshot.SnapshotList("workouts", snapshot.Snapshot(path))
+    assert list(ws) == rows  # decoded, none of them dirty
+    assert ws.save(path) == len(rows)
+    assert list(ws) == rows
+    ws.close()
+    ws = snapshot.SnapshotList("workouts", snapshot.Snapshot(path))
+    assert list(ws) == rows
+    ws.close()
@@ -0,0 +1,64 @@
+import os
+
+from storage import load_state, save_state, close_state, restore_latest_backup
+from profiles import register_user, update_goal
+from workouts import log_workout, delete_workout, weekly_workout_summary
+from nutrition import log_meal, daily_calorie_summary, macro_breakdown
+from metrics import log_metric, metrics_summary, goal_progress
+
+
+def _fill(users, workouts, meals, metrics):
+    uid = register_user(users, {"email": "a@b.c", "pin": "1234", "age": 30, "height_cm": 180, "weight_kg": 80})["id"]
+    update_goal(users, uid, {"type": "weight_loss", "target_weight_kg": 70})
+    log_workout(workouts, {"user_id": uid, "date": "2025-01-06", "type": "strength", "duration_min": 45, "exercises": [{"name": "Squat", "weight_kg": 100}]})
+    log_workout(workouts, {"user_id": uid, "date": "2025-01-08", "type": "cardio", "duration_min": 30, "exercises": []})
+    gone = log_workout(workouts, {"user_id": uid, "date": "2025-01-09", "type": "cardio", "duration_min": 20, "exercises": []})
+    delete_workout(workouts, gone["id"])
+    log_meal(meals, {"user_id": uid, "timestamp": "2025-01-06 08:00", "meal_type": "breakfast", "items": [], "calories": 400, "macros": {"protein_g": 20, "carbs_g": 50, "fat_g": 10}})
+    log_meal(meals, {"user_id": uid, "timestamp": "2025-01-07 19:00", "meal_type": "dinner", "items": [], "calories": 700, "macros": {"protein_g": 40, "carbs_g": 60, "fat_g": 25}})
+    for d, v in (("2025-01-01", 80), ("2025-01-10", 79), ("2025-01-14", 78.2)):
+        log_metric(metrics, {"user_id": uid, "date": d, "type": "weight_kg", "value": v})
+
+
+def _summaries(users, workouts, meals, metrics):
+    uid = users[0]["id"]
+    return (
+        weekly_workout_summary(workouts, uid, "2025-01-06"),
+        daily_calorie_summary(meals, uid, "2025-01-06"),
+        macro_breakdown(meals, uid, ("2025-01-01", "2025-01-31")),
+        metrics_summary(metrics, uid, "weight_kg", ("2025-01-05", "2025-01-31")),
+        goal_progress(users, metrics, uid),
+    )
+
+
+def test_sqlite_backend_matches_list_scans(tmp_path):
+    state = load_state(str(tmp_path), "sqlite")
+    assert getattr(state[1], "db", None) is not None
+    _fill(*state)
+
+    # Same data as plain lists, so the summaries take the scanning path.
+    plain = ([dict(r) for r in items] for items in state)
+    assert _summaries(*state) == _summaries(*plain)
+
+    save_state(str(tmp_path), *state, "sqlite")
+    reloaded = load_state(str(tmp_path), "sqlite")
+    assert [w["id"] for w in reloaded[1]] == [w["id"] for w in state[1]]
+    assert _summaries(*reloaded) == _summaries(*state)
+
+
+def test_sqlite_restore_brings_back_the_database(tmp_path):
+    base = str(tmp_path)
+    state = load_state(base, "sqlite")
+    _fill(*state)
+    save_state(base, *state, "sqlite")
+    log_metric(state[3], {"user_id": state[0][0]["id"], "date": "2025-01-20", "type": "weight_kg", "value": 77})
+    save_state(base, *state, "sqlite")  # backs up the database as it was before this save
+    assert len(load_state(base, "sqlite")[3]) == 4
+
+    # Unsaved write, as after logging out without saving.
+    log_metric(state[3], {"user_id": state[0][0]["id"], "date": "2025-01-21", "type": "weight_kg", "value": 76})
+    close_state(*state)
+    assert restore_latest_backup(base, os.path.join(base, "backups"))
+    restored = load_state(base, "sqlite")
+    assert [m["value"] for m in restored[3]] == [80, 79, 78.2]
+    assert _summaries(*restored)[0]["total_workouts"] == 2
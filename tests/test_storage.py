@@ -0,0 +1,213 @@
+import os
+import subprocess
+import sys
+
+from storage import load_state, save_state, close_state, compact_journal, load_user_shard, migrate_to_sharded, _read_json
+from workouts import log_workout, update_workout, delete_workout, detect_and_flag_prs
+from nutrition import log_meal
+from records import emit
+
+
+def test_journal_replay_and_compaction(tmp_path):
+    base = str(tmp_path)
+    users, workouts, meals, metrics = load_state(base, "journal")
+
+    w1 = log_workout(workouts, {"user_id": "u1", "date": "2025-01-01", "type": "cardio", "duration_min": 30, "exercises": []})
+    w2 = log_workout(workouts, {"user_id": "u1", "date": "2025-01-02", "type": "strength", "duration_min": 40, "exercises": []})
+    update_workout(workouts, w1["id"], {"duration_min": 35})
+    delete_workout(workouts, w2["id"])
+    log_meal(meals, {"user_id": "u1", "timestamp": "2025-01-01 08:00", "meal_type": "breakfast", "items": [], "calories": 300, "macros": {}})
+    save_state(base, users, workouts, meals, metrics, "journal")
+
+    assert _read_json(os.path.join(base, "data", "workouts.json")) == []
+    _, ws, ms, _ = load_state(base)
+    assert [(w["id"], w["duration_min"]) for w in ws] == [(w1["id"], 35)]
+    assert len(ms) == 1
+
+    compact_journal(base)
+    assert not os.path.exists(os.path.join(base, "data", "workouts.journal"))
+    assert [w["id"] for w in _read_json(os.path.join(base, "data", "workouts.json"))] == [w1["id"]]
+    _, ws, _, _ = load_state(base)
+    assert [w["duration_min"] for w in ws] == [35]
+
+
+def test_save_state_skips_untouched_collections(tmp_path):
+    base = str(tmp_path)
+    users, workouts, meals, metrics = load_state(base)
+    log_workout(workouts, {"user_id": "u1", "date": "2025-01-01", "type": "cardio", "duration_min": 30, "exercises": []})
+    save_state(base, users, workouts, meals, metrics)
+    data_files = sorted(os.listdir(os.path.join(base, "data")))
+    assert data_files == ["workouts.json"]
+    workouts_mtime = os.stat(os.path.join(base, "data", "workouts.json")).st_mtime_ns
+
+    log_meal(meals, {"user_id": "u1", "timestamp": "2025-01-01 08:00", "meal_type": "breakfast", "items": [], "calories": 300, "macros": {}})
+    assert not workouts.dirty_ids and meals.dirty_ids
+    save_state(base, users, workouts, meals, metrics)
+    assert os.stat(os.path.join(base, "data", "workouts.json")).st_mtime_ns == workouts_mtime
+    assert not any(b.startswith("workouts.json.") for b in os.listdir(os.path.join(base, "backups")))
+    assert sorted(os.listdir(os.path.join(base, "data"))) == ["nutrition.json", "nutrition.rollups.json", "workouts.json"]
+    assert not meals.dirty_ids
+
+
+def test_sharded_layout_loads_one_user_at_a_time(tmp_path):
+    base = str(tmp_path)
+    users, workouts = [], []
+    for uid in ("u1", "u2"):
+        users.append({"id": uid})
+        log_workout(workouts, {"user_id": uid, "date": "2025-01-01", "type": "cardio", "duration_min": 30, "exercises": []})
+    save_state(base, users, workouts, [], [])
+    assert migrate_to_sharded(base) == {"users": 2, "records": 2, "skipped": 0}
+
+    users, workouts, meals, metrics = load_state(base, "sharded")
+    assert len(users) == 2 and len(workouts) == 0
+    load_user_shard(base, "u1", workouts, meals, metrics)
+    load_user_shard(base, "u1", workouts, meals, metrics)
+    assert [w["user_id"] for w in workouts] == ["u1"]
+
+    log_meal(meals, {"user_id": "u1", "timestamp": "2025-01-01 08:00", "meal_type": "breakfast", "items": [], "calories": 300, "macros": {}})
+    save_state(base, users, workouts, meals, metrics, "sharded")
+    assert _read_json(os.path.join(base, "data", "users", "u1", "nutrition.json"))[0]["calories"] == 300
+    assert not os.path.exists(os.path.join(base, "data", "users", "u2", "nutrition.json"))
+
+    # A record moved to another user leaves its old shard too.
+    load_user_shard(base, "u2", workouts, meals, metrics)
+    update_workout(workouts, workouts[0]["id"], {"user_id": "u2"})
+    save_state(base, users, workouts, meals, metrics, "sharded")
+    assert _read_json(os.path.join(base, "data", "users", "u1", "workouts.json")) == []
+    assert [w["user_id"] for w in _read_json(os.path.join(base, "data", "users", "u2", "workouts.json"))] == ["u2", "u2"]
+
+
+def test_warm_start_cache_follows_the_json_files(tmp_path):
+    base = str(tmp_path)
+    save_state(base, [{"id": "u1"}], [], [], [])
+    load_state(base, warm_start=True)
+    cache_path = os.path.join(base, "data", "warm_start.pickle")
+    written = os.stat(cache_path).st_mtime_ns
+
+    # Same content with a new mtime still matches by hash, so the cache is used as is.
+    path = os.path.join(base, "data", "users.json")
+    os.utime(path, ns=(1, 1))
+    assert load_state(base, warm_start=True)[0] == [{"id": "u1"}]
+    assert os.stat(cache_path).st_mtime_ns == written
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write('[{"id": "u2"}]')
+    users = load_state(base, warm_start=True)[0]
+    assert users == [{"id": "u2"}] and users.by_id("u2")
+
+
+def test_concurrent_sessions_merge_instead_of_overwriting(tmp_path):
+    base = str(tmp_path)
+    save_state(base, [{"id": "u1"}], [], [], [])
+    a = load_state(base)
+    b = load_state(base)
+
+    wa = log_workout(a[1], {"user_id": "u1", "date": "2025-01-01", "type": "cardio", "duration_min": 30, "exercises": []})
+    save_state(base, *a)
+    wb = log_workout(b[1], {"user_id": "u1", "date": "2025-01-02", "type": "strength", "duration_min": 40, "exercises": []})
+    b[0][0]["name"] = "B"
+    emit(b[0], "put", b[0][0])
+    save_state(base, *b)
+    # b saw a's workout arrive on save
+    assert [w["id"] for w in b[1]] == [wa["id"], wb["id"]] and b[1].by_id(wa["id"])
+
+    update_workout(a[1], wa["id"], {"duration_min": 35})
+    save_state(base, *a)
+    delete_workout(b[1], wa["id"])  # changed on disk since b read it: kept
+    delete_workout(b[1], wb["id"])
+    save_state(base, *b)
+
+    _, ws, _, _ = load_state(base)
+    assert [(w["id"], w["duration_min"], w["rev"]) for w in ws] == [(wa["id"], 35, 2)]
+    assert load_state(base)[0][0]["name"] == "B"
+
+
+def _log_many(base, worker):
+    for i in range(15):
+        users, workouts, meals, metrics = load_state(base)
+        log_meal(meals, {"user_id": "u1", "timestamp": f"2025-01-{i + 1:02d} 0{worker}:00", "meal_type": "snack",
+                         "items": [], "calories": 100, "macros": {}})
+        save_state(base, users, workouts, meals, metrics)
+
+
+def test_parallel_writers_lose_nothing(tmp_path):
+    import multiprocessing
+
+    base = str(tmp_path)
+    save_state(base, [{"id": "u1"}], [], [], [])
+    procs = [multiprocessing.Process(target=_log_many, args=(base, n)) for n in range(4)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+    assert len(load_state(base)[2]) == 60
+
+
+def test_warm_start_never_caches_another_process_stale_copy(tmp_path, monkeypatch):
+    import main
+
+    base = str(tmp_path)
+    monkeypatch.setattr(main, "BASE_DIR", base)
+    monkeypatch.setattr(main, "WARM_START", True)
+    save_state(base, [{"id": "u1", "name": "orig"}], [], [], [])
+    a = main.open_state()
+    b = main.open_state()
+    b[0][0]["name"] = "fromB"
+    emit(b[0], "put", b[0][0])
+    main.persist_state(*b)
+
+    # a never saw B's rename; its save must not hand "orig" to the next warm start.
+    log_workout(a[1], {"user_id": "u1", "date": "2025-01-01", "type": "cardio", "duration_min": 30, "exercises": []})
+    main.persist_state(*a)
+    c = main.open_state()
+    assert c[0][0]["name"] == "fromB" and len(c[1]) == 1
+    assert main.open_state()[0][0]["name"] == "fromB"  # now from the rebuilt cache
+
+
+def test_save_merges_even_when_the_loaded_copy_was_stale(tmp_path):
+    import storage
+
+    base = str(tmp_path)
+    save_state(base, [{"id": "u1", "name": "orig"}, {"id": "u2", "name": "two"}], [], [], [])
+    stale = load_state(base)
+    b = load_state(base)
+    b[0][0]["name"] = "fromB"
+    emit(b[0], "put", b[0][0])
+    save_state(base, *b)
+    # A cache holding the old records but stamped with the current files.
+    storage.write_warm_start(base, *stale, storage._warm_stamps(base))
+
+    c = load_state(base, warm_start=True)
+    assert c[0][0]["name"] == "orig"
+    c[0][1]["name"] = "fromC"
+    emit(c[0], "put", c[0][1])
+    save_state(base, *c)
+    assert [u["name"] for u in load_state(base)[0]] == ["fromB", "fromC"]
+    assert c[0][0]["name"] == "fromB"
+
+
+def test_importing_main_leaves_the_feature_modules_unloaded():
+    here = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    lazy = ("nutrition", "workouts", "metrics", "sqlite3", "pickle", "hashlib", "snapshot", "backup_store")
+    code = f"import sys, main; print([m for m in {lazy!r} if m in sys.modules])"
+    out = subprocess.run([sys.executable, "-c", code], cwd=here, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
+
+
+def test_pr_detection_on_an_unlogged_workout_saves_nothing(tmp_path):
+    entry = {"user_id": "u1", "type": "strength", "duration_min": 40, "exercises": [{"name": "Squat", "weight_kg": 100}]}
+    for mode in ("journal", "sqlite"):
+        base = str(tmp_path / mode)
+        users, workouts, meals, metrics = load_state(base, mode)
+        logged = log_workout(workouts, dict(entry, date="2025-01-01"))
+        detect_and_flag_prs(workouts, "u1", logged)
+        detect_and_flag_prs(workouts, "u1", dict(entry, id="preview", date="2025-01-02", exercises=[{"name": "Squat", "weight_kg": 150}]))
+        save_state(base, users, workouts, meals, metrics, mode)
+        if mode == "journal":
+            with open(os.path.join(base, "data", "workouts.journal"), encoding="utf-8") as f:
+                assert len(f.readlines()) == 2  # the log and its PR flags
+        close_state(users, workouts, meals, metrics)
+
+        state = load_state(base, mode)
+        assert [w["id"] for w in state[1]] == [logged["id"]] and state[1][0]["pr_flags"]
+        close_state(*state)
@@ -1,4 +1,20 @@
-from workouts import log_workout, detect_and_flag_prs, personal_records
+import random
+from datetime import date, timedelta
+
+from records import TrackedList
+from workouts import (
+    log_workout,
+    update_workout,
+    delete_workout,
+    detect_and_flag_prs,
+    personal_records,
+    exercise_records,
+    weekly_workout_summary,
+    workout_range_summary,
+    monthly_workout_summary,
+    rolling_load,
+    acute_chronic_ratio,
+)
 
 
 def test_personal_record_strength():
@@ -28,3 +44,66 @@ def test_personal_record_strength():
     prs = personal_records(workouts, user_id)
     assert prs["max_lift_kg"] == 60.0
     assert prs["max_lift_exercise"] == "Bench Press"
+
+
+def test_pr_tracker_rolls_back_on_delete():
+    workouts = TrackedList("workouts")
+    heavy = log_workout(workouts, {"user_id": "u1", "date": "2025-01-01", "type": "strength", "duration_min": 45,
+                                   "exercises": [{"name": "Squat", "weight_kg": 120}, {"name": "Bench Press", "weight_kg": 80}]})
+    personal_records(workouts, "u1")  # builds the tracker; later changes are incremental
+    light = log_workout(workouts, {"user_id": "u1", "date": "2025-01-02", "type": "strength", "duration_min": 45,
+                                   "exercises": [{"name": "Squat", "weight_kg": 100}, {"name": "Bench Press", "weight_kg": 85}]})
+    detect_and_flag_prs(workouts, "u1", light)
+    assert light["pr_flags"] == []
+    run = log_workout(workouts, {"user_id": "u1", "date": "2025-01-03", "type": "cardio", "duration_min": 30,
+                                 "exercises": [{"name": "Run", "distance_km": 5, "time_min": 25}]})
+    detect_and_flag_prs(workouts, "u1", run)
+    assert any("Fastest pace" in f for f in run["pr_flags"])
+
+    recs = exercise_records(workouts, "u1")
+    assert recs["lifts"]["Squat"]["weight_kg"] == 120.0
+    assert recs["lifts"]["Bench Press"]["weight_kg"] == 85.0
+    assert recs["paces"]["5k"]["pace_min_per_km"] == 5.0
+
+    delete_workout(workouts, heavy["id"])
+    assert personal_records(workouts, "u1")["max_lift_kg"] == 100.0
+    assert exercise_records(workouts, "u1")["lifts"]["Squat"]["workout_id"] == light["id"]
+    update_workout(workouts, run["id"], {"type": "flexibility"})
+    assert personal_records(workouts, "u1") == personal_records(list(workouts), "u1")
+    assert personal_records(workouts, "u1")["best_cardio"] is None
+
+
+def test_load_prefix_sums_match_scans():
+    rng = random.Random(5)
+    ws = TrackedList("workouts")
+    d0 = date(2024, 10, 1)
+    logged = []
+    for i in range(150):
+        d = d0 + timedelta(days=rng.randint(0, 120))
+        logged.append(log_workout(ws, {"user_id": rng.choice(("u1", "u2")), "date": d.isoformat(),
+                                       "type": rng.choice(("strength", "cardio", "flexibility", "other")),
+                                       "duration_min": rng.randint(10, 90), "exercises": []}))
+        if i == 60:
+            assert weekly_workout_summary(ws, "u1", "2024-11-04")  # builds the index part way through
+    update_workout(ws, logged[3]["id"], {"date": "2024-09-20", "duration_min": 33})
+    update_workout(ws, logged[80]["id"], {"type": "cardio"})
+    delete_workout(ws, logged[10]["id"])
+    plain = list(ws)
+
+    for week in ("2024-09-16", "2024-10-07", "2024-12-30", "2025-03-03"):
+        assert weekly_workout_summary(ws, "u1", week) == weekly_workout_summary(plain, "u1", week)
+    assert monthly_workout_summary(ws, "u2", "2024-11") == monthly_workout_summary(plain, "u2", "2024-11")
+    rng_ = ("2024-09-01", "2025-01-31")
+    assert workout_range_summary(ws, "u1", rng_) == workout_range_summary(plain, "u1", rng_)
+    assert rolling_load(ws, "u1", "2025-01-15") == rolling_load(plain, "u1", "2025-01-15")
+    assert acute_chronic_ratio(ws, "u2", "2024-12-01") == acute_chronic_ratio(plain, "u2", "2024-12-01")
+
+
+def test_acute_chronic_ratio():
+    ws = []
+    for day in range(1, 29):
+        log_workout(ws, {"user_id": "u1", "date": f"2025-02-{day:02d}", "type": "flexibility", "duration_min": 10 if day <= 21 else 20, "exercises": []})
+    acwr = acute_chronic_ratio(ws, "u1", "2025-02-28")
+    assert acwr["acute_load"] == 140.0 and acwr["chronic_load"] == 87.5 and acwr["ratio"] == 1.6
+    assert acute_chronic_ratio(ws, "u1", "2024-01-01")["ratio"] is None
+    assert rolling_load(ws, "u1", "2025-02-28", weeks=(4,))["load_4w"] == 87.5
@@ -1,7 +1,15 @@
 from __future__ import annotations
 
 import uuid
-from datetime import datetime, timedelta
+from bisect import bisect_left, insort
+from datetime import date, timedelta
+
+import instrument
+import sqlite_store
+from cache import cached
+from dates import day_ordinal, parse_date
+from instrument import timed
+from records import TrackedList, emit, find_record, remove_record
 
 
 def log_workout(workouts: list, workout_data: dict) -> dict:
@@ -11,58 +19,165 @@ def log_workout(workouts: list, workout_data: dict) -> dict:
     workout.setdefault("allow_future", False)
     workout.setdefault("pr_flags", [])
     workouts.append(workout)
+    emit(workouts, "put", workout)
     return workout
 
 
 def update_workout(workouts: list, workout_id: str, updates: dict) -> dict:
-    w = next((x for x in workouts if x.get("id") == workout_id), None)
+    w = find_record(workouts, workout_id)
     if not w:
         raise ValueError("Workout not found.")
     w.update(updates)
+    emit(workouts, "put", w)
     return w
 
 
 def delete_workout(workouts: list, workout_id: str) -> bool:
-    idx = next((i for i, x in enumerate(workouts) if x.get("id") == workout_id), None)
-    if idx is None:
+    w = remove_record(workouts, workout_id)
+    if w is None:
         return False
-    workouts.pop(idx)
+    emit(workouts, "del", w)
     return True
 
 
-def _parse_date(s: str) -> datetime:
-    return datetime.strptime(s, "%Y-%m-%d")
+def _parse_date(s: str) -> date:
+    return parse_date(s)
 
 
-def weekly_workout_summary(workouts: list, user_id: str, week_start: str) -> dict:
-    start = _parse_date(week_start)
-    end = start + timedelta(days=7)
+_TYPES = ("strength", "cardio", "flexibility")
+_INTENSITY = {"strength": 2.0, "cardio": 1.5, "flexibility": 1.0}
+_ZERO = (0, 0.0, 0.0, 0, 0, 0)  # count, minutes, intensity, then a count per type
+
+
+def _load_row(w: dict) -> tuple:
+    minutes = float(w.get("duration_min", 0))
+    t = w.get("type")
+    return (1, minutes, _INTENSITY.get(t, 1.0) * minutes) + tuple(int(t == k) for k in _TYPES)
+
+
+def _add_rows(a: tuple, b: tuple) -> tuple:
+    return tuple(x + y for x, y in zip(a, b))
+
+
+class WorkoutLoad:
+    """Per-user daily workout totals with prefix sums over them.
+
+    prefix[i] holds the totals for days origin .. origin + i - 1, so any date
+    range is two lookups and a subtraction. A change on some day drops the
+    prefix sums from that day on; they are rebuilt up to the day a query
+    needs, which for the usual case of logging today's workout is one day.
+    """
+
+    def __init__(self):
+        self._users: dict = {}  # user_id -> {"days": {day: {id: row}}, "origin", "last", "prefix"}
+        self._where: dict = {}  # workout id -> (user_id, day)
+
+    def build(self, items) -> WorkoutLoad:
+        for w in items:
+            self.update("put", w)
+        return self
+
+    def update(self, op: str, w: dict) -> None:
+        wid = w.get("id")
+        old = self._where.pop(wid, None)
+        if old is not None:
+            u = self._users[old[0]]
+            day_rows = u["days"][old[1]]
+            del day_rows[wid]
+            if not day_rows:
+                del u["days"][old[1]]
+            self._invalidate(u, old[1])
+        if op == "del":
+            return
+
+        day = day_ordinal(w.get("date", ""))
+        try:
+            row = _load_row(w)
+        except (TypeError, ValueError):
+            return
+        if day is None:
+            return
+        u = self._users.setdefault(w.get("user_id"), {"days": {}, "origin": day, "last": day, "prefix": [_ZERO]})
+        u["days"].setdefault(day, {})[wid] = row
+        u["last"] = max(u["last"], day)
+        self._where[wid] = (w.get("user_id"), day)
+        self._invalidate(u, day)
+
+    def _invalidate(self, u: dict, day: int) -> None:
+        if day < u["origin"]:
+            u["origin"], u["prefix"] = day, [_ZERO]
+        else:
+            del u["prefix"][day - u["origin"] + 1 :]
+
+    def _prefix(self, u: dict, day: int) -> tuple:
+        i = min(max(day - u["origin"], 0), u["last"] - u["origin"] + 1)
+        p = u["prefix"]
+        while len(p) <= i:
+            day_rows = u["days"].get(u["origin"] + len(p) - 1)
+            p.append(p[-1] if not day_rows else _add_rows(p[-1], [sum(col) for col in zip(*day_rows.values())]))
+        return p[i]
+
+    def totals(self, user_id, lo: int, hi: int) -> tuple:
+        """Totals for ``lo <= day < hi``, in _ZERO's layout."""
+        u = self._users.get(user_id)
+        if u is None or hi <= lo:
+            return _ZERO
+        a, b = self._prefix(u, lo), self._prefix(u, hi)
+        return tuple(y - x for x, y in zip(a, b))
+
+
+def workout_load(workouts: list) -> WorkoutLoad | None:
+    """The collection's daily load prefix sums, built on first use; None for plain lists."""
+    if not isinstance(workouts, TrackedList):
+        return None
+    ix = workouts.indexes.get("load")
+    if ix is None:
+        instrument.scanned(len(workouts))
+        ix = workouts.indexes["load"] = WorkoutLoad().build(workouts)
+    return ix
 
-    user_ws = [w for w in workouts if w.get("user_id") == user_id]
-    in_week = []
-    for w in user_ws:
+
+def _workout_totals(workouts: list, user_id: str, start: date, end: date) -> tuple[int, float, float, dict]:
+    """Count, minutes, intensity score and per-type counts for ``start <= date < end``."""
+    by_type = dict.fromkeys(_TYPES, 0)
+
+    db = getattr(workouts, "db", None)
+    if db is not None:
+        total_workouts, total_minutes, intensity_score, counts = sqlite_store.workout_totals(
+            db, user_id, start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+        )
+        by_type.update((t, n) for t, n in counts.items() if t in by_type)
+        return total_workouts, total_minutes, intensity_score, by_type
+
+    load = workout_load(workouts)
+    if load is not None:
+        total_workouts, total_minutes, intensity_score, *counts = load.totals(user_id, start.toordinal(), end.toordinal())
+        by_type.update(zip(_TYPES, counts))
+        return total_workouts, total_minutes, intensity_score, by_type
+
+    instrument.scanned(len(workouts))
+    in_range = []
+    for w in workouts:
+        if w.get("user_id") != user_id:
+            continue
         try:
             d = _parse_date(w.get("date", ""))
             if start <= d < end:
-                in_week.append(w)
+                in_range.append(w)
         except Exception:
             continue
 
-    total_workouts = len(in_week)
-    total_minutes = sum(float(w.get("duration_min", 0)) for w in in_week)
-
-    weights = {"strength": 2.0, "cardio": 1.5, "flexibility": 1.0}
-    intensity_score = sum(weights.get(w.get("type"), 1.0) * float(w.get("duration_min", 0)) for w in in_week)
-
-    by_type = {"strength": 0, "cardio": 0, "flexibility": 0}
-    for w in in_week:
+    total_minutes = sum(float(w.get("duration_min", 0)) for w in in_range)
+    intensity_score = sum(_INTENSITY.get(w.get("type"), 1.0) * float(w.get("duration_min", 0)) for w in in_range)
+    for w in in_range:
         t = w.get("type")
         if t in by_type:
             by_type[t] += 1
+    return len(in_range), total_minutes, intensity_score, by_type
+
 
+def _summary(total_workouts: int, total_minutes: float, intensity_score: float, by_type: dict) -> dict:
     return {
-        "week_start": week_start,
-        "week_end": (end - timedelta(days=1)).strftime("%Y-%m-%d"),
         "total_workouts": total_workouts,
         "total_minutes": round(total_minutes, 1),
         "intensity_score": round(intensity_score, 1),
@@ -70,122 +185,269 @@ def weekly_workout_summary(workouts: list, user_id: str, week_start: str) -> dic
     }
 
 
-def personal_records(workouts: list, user_id: str) -> dict:
-    user_ws = [w for w in workouts if w.get("user_id") == user_id]
-    max_lift = 0.0
-    max_lift_ex = None
-    best_pace = None
-    best_cardio = None
+@timed()
+@cached()
+def weekly_workout_summary(workouts: list, user_id: str, week_start: str) -> dict:
+    start = _parse_date(week_start)
+    end = start + timedelta(days=7)
+    return {
+        "week_start": week_start,
+        "week_end": (end - timedelta(days=1)).strftime("%Y-%m-%d"),
+        **_summary(*_workout_totals(workouts, user_id, start, end)),
+    }
+
+
+@timed()
+@cached()
+def workout_range_summary(workouts: list, user_id: str, date_range: tuple[str, str]) -> dict:
+    """Totals for workouts dated ``start`` through ``end`` inclusive."""
+    start, end = date_range
+    totals = _workout_totals(workouts, user_id, _parse_date(start), _parse_date(end) + timedelta(days=1))
+    return {"range": {"start": start, "end": end}, **_summary(*totals)}
+
 
-    for w in user_ws:
+@timed()
+@cached()
+def monthly_workout_summary(workouts: list, user_id: str, month: str) -> dict:
+    """Totals for a calendar month given as YYYY-MM."""
+    first = _parse_date(f"{month}-01")
+    nxt = (first + timedelta(days=32)).replace(day=1)
+    return {"month": month, **_summary(*_workout_totals(workouts, user_id, first, nxt))}
+
+
+def _load(workouts: list, user_id: str, end: date, days: int) -> float:
+    # Intensity score over the ``days`` days ending on ``end``.
+    return _workout_totals(workouts, user_id, end - timedelta(days=days - 1), end + timedelta(days=1))[2]
+
+
+@timed()
+@cached(daily=True)
+def rolling_load(workouts: list, user_id: str, end: str | None = None, weeks: tuple[int, ...] = (4, 12)) -> dict:
+    """Average weekly intensity score over the last few weeks up to ``end`` (default today)."""
+    end_d = _parse_date(end) if end else date.today()
+    out = {"end": end_d.strftime("%Y-%m-%d")}
+    for n in weeks:
+        out[f"load_{n}w"] = round(_load(workouts, user_id, end_d, 7 * n) / n, 1)
+    return out
+
+
+@timed()
+@cached(daily=True)
+def acute_chronic_ratio(workouts: list, user_id: str, end: str | None = None, acute_days: int = 7, chronic_days: int = 28) -> dict:
+    """Acute:chronic workload ratio on intensity score.
+
+    Acute is the load of the last ``acute_days``; chronic is the load of the
+    last ``chronic_days`` scaled to the same length. Around 0.8-1.3 is the
+    usual "sweet spot"; above 1.5 means load rose much faster than usual.
+    """
+    if acute_days < 1 or chronic_days < acute_days:
+        raise ValueError("Need 1 <= acute_days <= chronic_days.")
+    end_d = _parse_date(end) if end else date.today()
+    acute = _load(workouts, user_id, end_d, acute_days)
+    chronic = _load(workouts, user_id, end_d, chronic_days) * acute_days / chronic_days
+    return {
+        "end": end_d.strftime("%Y-%m-%d"),
+        "acute_load": round(acute, 1),
+        "chronic_load": round(chronic, 1),
+        "ratio": round(acute / chronic, 2) if chronic else None,
+    }
+
+
+# Upper distance bound (km, exclusive) and name of each pace bucket.
+PACE_BUCKETS = ((3.0, "under_3k"), (7.5, "5k"), (15.0, "10k"), (30.0, "half_marathon"), (float("inf"), "marathon"))
+
+
+def _pace_bucket(dist: float) -> str:
+    return next(name for limit, name in PACE_BUCKETS if dist < limit)
+
+
+def _lift_entries(w: dict) -> list:
+    out = []
+    for pos, ex in enumerate(w.get("exercises", [])):
+        try:
+            weight = float(ex.get("weight_kg", 0))
+        except Exception:
+            continue
+        if weight > 0:
+            out.append((weight, pos, ex.get("name")))
+    return out
+
+
+def _pace_entries(w: dict) -> list:
+    out = []
+    for pos, ex in enumerate(w.get("exercises", [])):
+        try:
+            dist = float(ex.get("distance_km", 0))
+            tmin = float(ex.get("time_min", 0))
+        except Exception:
+            continue
+        if dist > 0 and tmin > 0:
+            out.append((tmin / dist, pos, ex.get("name"), dist, tmin))
+    return out
+
+
+class PRTracker:
+    """Per-user personal records kept up to date one workout at a time.
+
+    Lifts and paces sit in sorted lists (best first, ties broken by workout
+    order then exercise position, the order a scan of the list would meet
+    them), overall and per exercise / per distance bucket. A delete or update
+    removes exactly the entries that workout contributed, so the next best
+    record takes over without a rescan.
+    """
+
+    def __init__(self):
+        self._users: dict = {}
+        self._where: dict = {}  # workout id -> [(sorted list, entry)]
+        self._seq: dict = {}  # workout id -> position in logging order
+        self._next = 0
+
+    def build(self, items) -> PRTracker:
+        for w in items:
+            self.update("put", w)
+        return self
+
+    def _user(self, user_id) -> dict:
+        return self._users.setdefault(user_id, {"lifts": [], "by_exercise": {}, "paces": [], "by_bucket": {}})
+
+    def update(self, op: str, w: dict) -> None:
+        wid = w.get("id")
+        for lst, entry in self._where.pop(wid, ()):
+            del lst[bisect_left(lst, entry)]
+        if op == "del":
+            self._seq.pop(wid, None)
+            return
+
+        if wid not in self._seq:
+            self._seq[wid] = self._next
+            self._next += 1
+        seq = self._seq[wid]
+        u = self._user(w.get("user_id"))
+        placed = []
         if w.get("type") == "strength":
-            for ex in w.get("exercises", []):
-                try:
-                    weight = float(ex.get("weight_kg", 0))
-                    if weight > max_lift:
-                        max_lift = weight
-                        max_lift_ex = ex.get("name")
-                except Exception:
-                    pass
-
-        if w.get("type") == "cardio":
-            for ex in w.get("exercises", []):
-                try:
-                    dist = float(ex.get("distance_km", 0))
-                    tmin = float(ex.get("time_min", 0))
-                    if dist > 0 and tmin > 0:
-                        pace = tmin / dist
-                        if best_pace is None or pace < best_pace:
-                            best_pace = pace
-                            best_cardio = {
-                                "name": ex.get("name"),
-                                "distance_km": dist,
-                                "time_min": tmin,
-                                "pace_min_per_km": pace,
-                            }
-                except Exception:
-                    pass
+            for weight, pos, name in _lift_entries(w):
+                entry = (-weight, seq, pos, wid, name)
+                for lst in (u["lifts"], u["by_exercise"].setdefault(name, [])):
+                    insort(lst, entry)
+                    placed.append((lst, entry))
+        elif w.get("type") == "cardio":
+            for pace, pos, name, dist, tmin in _pace_entries(w):
+                entry = (pace, seq, pos, wid, name, dist, tmin)
+                for lst in (u["paces"], u["by_bucket"].setdefault(_pace_bucket(dist), [])):
+                    insort(lst, entry)
+                    placed.append((lst, entry))
+        self._where[wid] = placed
 
+    @staticmethod
+    def _best(entries: list, exclude=None):
+        # Skips at most the excluded workout's own entries.
+        return next((e for e in entries if e[3] != exclude), None)
+
+    def best_lift(self, user_id, exclude=None):
+        """(weight, name) of the heaviest lift, or None."""
+        e = self._best(self._users.get(user_id, {}).get("lifts", ()), exclude)
+        return None if e is None else (-e[0], e[4])
+
+    def best_pace(self, user_id, exclude=None):
+        """(pace, name, distance_km, time_min) of the fastest cardio effort, or None."""
+        e = self._best(self._users.get(user_id, {}).get("paces", ()), exclude)
+        return None if e is None else (e[0], e[4], e[5], e[6])
+
+    def per_exercise(self, user_id) -> dict:
+        u = self._users.get(user_id)
+        if not u:
+            return {"lifts": {}, "paces": {}}
+        lifts = {name: lst[0] for name, lst in u["by_exercise"].items() if lst}
+        paces = {b: lst[0] for b, lst in u["by_bucket"].items() if lst}
+        return {
+            "lifts": {
+                name: {"weight_kg": round(-e[0], 1), "workout_id": e[3]}
+                for name, e in sorted(lifts.items(), key=lambda kv: str(kv[0]))
+            },
+            "paces": {
+                b: {"name": e[4], "distance_km": round(e[5], 2), "time_min": round(e[6], 1), "pace_min_per_km": round(e[0], 2), "workout_id": e[3]}
+                for b, e in ((name, paces[name]) for _, name in PACE_BUCKETS if name in paces)
+            },
+        }
+
+
+def _pr_tracker(workouts: list, user_id: str) -> PRTracker:
+    if isinstance(workouts, TrackedList):
+        ix = workouts.indexes.get("prs")
+        if ix is None:
+            instrument.scanned(len(workouts))
+            ix = workouts.indexes["prs"] = PRTracker().build(workouts)
+        return ix
+    instrument.scanned(len(workouts))
+    return PRTracker().build(w for w in workouts if w.get("user_id") == user_id)
+
+
+@timed()
+@cached()
+def personal_records(workouts: list, user_id: str) -> dict:
+    tracker = _pr_tracker(workouts, user_id)
+    lift = tracker.best_lift(user_id)
+    pace = tracker.best_pace(user_id)
     return {
-        "max_lift_kg": round(max_lift, 1) if max_lift_ex else None,
-        "max_lift_exercise": max_lift_ex,
+        "max_lift_kg": round(lift[0], 1) if lift and lift[1] else None,
+        "max_lift_exercise": lift[1] if lift else None,
         "best_cardio": (
             None
-            if best_cardio is None
+            if pace is None
             else {
-                "name": best_cardio["name"],
-                "distance_km": round(best_cardio["distance_km"], 2),
-                "time_min": round(best_cardio["time_min"], 1),
-                "pace_min_per_km": round(best_cardio["pace_min_per_km"], 2),
+                "name": pace[1],
+                "distance_km": round(pace[2], 2),
+                "time_min": round(pace[3], 1),
+                "pace_min_per_km": round(pace[0], 2),
             }
         ),
     }
 
 
+@timed()
+@cached()
+def exercise_records(workouts: list, user_id: str) -> dict:
+    """Heaviest lift per exercise and fastest pace per distance bucket."""
+    return _pr_tracker(workouts, user_id).per_exercise(user_id)
+
+
+@timed()
 def detect_and_flag_prs(workouts: list, user_id: str, new_workout: dict) -> dict:
     flags = []
+    tracker = _pr_tracker(workouts, user_id)
 
     if new_workout.get("type") == "strength":
-        prev_max = 0.0
-        for w in workouts:
-            if w.get("user_id") != user_id or w.get("id") == new_workout.get("id"):
-                continue
-            if w.get("type") != "strength":
-                continue
-            for ex in w.get("exercises", []):
-                try:
-                    prev_max = max(prev_max, float(ex.get("weight_kg", 0)))
-                except Exception:
-                    pass
+        prev = tracker.best_lift(user_id, exclude=new_workout.get("id"))
+        prev_max = prev[0] if prev else 0.0
 
         new_max = 0.0
         new_max_name = None
-        for ex in new_workout.get("exercises", []):
-            try:
-                wkg = float(ex.get("weight_kg", 0))
-                if wkg > new_max:
-                    new_max = wkg
-                    new_max_name = ex.get("name")
-            except Exception:
-                pass
+        for wkg, _, name in _lift_entries(new_workout):
+            if wkg > new_max:
+                new_max = wkg
+                new_max_name = name
 
         if new_max_name and new_max > prev_max:
             flags.append(f"PR: Heaviest lift {new_max} kg ({new_max_name})")
 
     if new_workout.get("type") == "cardio":
-        prev_best_pace = None
-        for w in workouts:
-            if w.get("user_id") != user_id or w.get("id") == new_workout.get("id"):
-                continue
-            if w.get("type") != "cardio":
-                continue
-            for ex in w.get("exercises", []):
-                try:
-                    dist = float(ex.get("distance_km", 0))
-                    tmin = float(ex.get("time_min", 0))
-                    if dist > 0 and tmin > 0:
-                        pace = tmin / dist
-                        if prev_best_pace is None or pace < prev_best_pace:
-                            prev_best_pace = pace
-                except Exception:
-                    pass
+        prev = tracker.best_pace(user_id, exclude=new_workout.get("id"))
+        prev_best_pace = prev[0] if prev else None
 
         new_best_pace = None
         new_best_desc = None
-        for ex in new_workout.get("exercises", []):
-            try:
-                dist = float(ex.get("distance_km", 0))
-                tmin = float(ex.get("time_min", 0))
-                if dist > 0 and tmin > 0:
-                    pace = tmin / dist
-                    if new_best_pace is None or pace < new_best_pace:
-                        new_best_pace = pace
-                        new_best_desc = f"{ex.get('name')} {dist}km in {tmin}min (pace {pace:.2f} min/km)"
-            except Exception:
-                pass
+        for pace, _, name, dist, tmin in _pace_entries(new_workout):
+            if new_best_pace is None or pace < new_best_pace:
+                new_best_pace = pace
+                new_best_desc = f"{name} {dist}km in {tmin}min (pace {pace:.2f} min/km)"
 
         if new_best_pace is not None and (prev_best_pace is None or new_best_pace < prev_best_pace):
             flags.append(f"PR: Fastest pace — {new_best_desc}")
 
+    changed = new_workout.get("pr_flags") != flags
     new_workout["pr_flags"] = flags
+    # Only a logged workout is saved; a preview or candidate dict must not
+    # reach the journal, the database or the indexes.
+    if changed and find_record(workouts, new_workout.get("id")) is new_workout:
+        emit(workouts, "put", new_workout)
     return new_workout